@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the memory used per node of the memory maps of the map files
+bundled with the tests.
+
+    $ python benchmarks/node_memory.py [MAPFILE ...]
+
+Two figures are reported for each map. ``layout`` is the size of the node
+objects themselves, along with their instance dictionaries and the
+containers they own, averaged over the nodes. ``retained`` is everything
+allocated while parsing the map which is still alive afterwards, divided
+by the number of nodes, and so also includes strings, regions and indices.
+"""
+
+import os
+import sys
+import glob
+import logging
+import argparse
+import tracemalloc
+
+from fpvgcc.fpv import process_map_file
+
+
+_here = os.path.dirname(os.path.abspath(__file__))
+_default_maps = sorted(glob.glob(os.path.join(_here, '..', 'tests', 'maps',
+                                              '*.map')))
+
+
+def _attribute_values(node):
+    values = list(getattr(node, '__dict__', {}).values())
+    for cls in type(node).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            try:
+                values.append(getattr(node, slot))
+            except AttributeError:
+                pass
+    return values
+
+
+def node_layout_size(node):
+    size = sys.getsizeof(node)
+    if hasattr(node, '__dict__'):
+        size += sys.getsizeof(node.__dict__)
+    for value in _attribute_values(node):
+        if isinstance(value, (list, dict, set)):
+            size += sys.getsizeof(value)
+    return size
+
+
+def measure(fname):
+    tracemalloc.start()
+    sm = process_map_file(fname, profile='auto')
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = sm.memory_map.root.all_nodes()
+    layout = sum(node_layout_size(node) for node in nodes)
+    return len(nodes), layout / len(nodes), retained / len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mapfiles', nargs='*', default=_default_maps)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    print("{0:<40}{1:>8}{2:>12}{3:>12}".format(
+        'MAPFILE', 'NODES', 'LAYOUT', 'RETAINED'))
+    for fname in args.mapfiles:
+        count, layout, retained = measure(fname)
+        print("{0:<40}{1:>8}{2:>10.0f} B{3:>10.0f} B".format(
+            os.path.basename(fname), count, layout, retained))
+
+
+if __name__ == '__main__':
+    main()
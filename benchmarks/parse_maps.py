@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time the parsing of the map files bundled with the tests.
+
+    $ python benchmarks/parse_maps.py [-n REPEAT] [MAPFILE ...]
+"""
+
+import os
+import glob
+import time
+import logging
+import argparse
+
+from fpvgcc.fpv import process_map_file
+
+
+_here = os.path.dirname(os.path.abspath(__file__))
+_default_maps = sorted(glob.glob(os.path.join(_here, '..', 'tests', 'maps',
+                                              '*.map')))
+
+
+def time_parse(fname, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process_map_file(fname, profile='auto')
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mapfiles', nargs='*', default=_default_maps)
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    total = 0
+    for fname in args.mapfiles:
+        with open(fname) as f:
+            lines = sum(1 for _ in f)
+        best = time_parse(fname, args.repeat)
+        total += best
+        print("{0:<45}{1:>8} lines {2:>10.2f} ms".format(
+            os.path.basename(fname), lines, best * 1000))
+    print("{0:<59}{1:>10.2f} ms".format('TOTAL', total * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark the parser and the reports on synthetic map files.
+
+    $ python benchmarks/suite.py [--sizes 10k,100k,1M] [--save FILE]
+                                 [--compare FILE] [--threshold PERCENT]
+
+A map of each size is generated with ``synthmap.py``, and kept in the map
+directory so that later runs can reuse it. Each map is then parsed in a
+process of its own, which reports the time taken to parse it, the peak
+memory of the process, and the time taken to produce each of the reports
+of the command line interface from the parsed map. The reports are
+produced one after another from the same parsed map, so whatever they
+share, such as the footprints of the map, is counted in the first of them
+which needs it.
+
+Results are written as JSON with ``--save``. With ``--compare``, they are
+compared with the results of an earlier run with the same maps, and the
+exit status is 1 if any of the times or peak memory grew by more than the
+threshold. Times shorter than ``--min-time`` are not checked.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from prettytable import PrettyTable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from fpvgcc.fpv import process_map_file
+from fpvgcc.cli import run_report
+from fpvgcc.stats import ParseStats
+
+from synthmap import MapGenerator
+
+
+RESULTS_FORMAT = 1
+
+REPORTS = [
+    ('sar', None),
+    ('sobj', 'all'),
+    ('ssym', 'all'),
+    ('ssec', None),
+    ('lmap', 'root'),
+    ('uf', None),
+    ('uarf', None),
+    ('uobjf', None),
+    ('uregions', None),
+    ('usections', None),
+    ('lfa', None),
+    ('la', None),
+]
+
+_multipliers = {'': 1, 'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}
+
+
+def parse_size(text):
+    """
+    Parse a number of lines, with an optional ``k`` or ``M`` suffix.
+    """
+    unit = text[-1:] if text[-1:] in _multipliers else ''
+    return int(float(text[:len(text) - len(unit)]) * _multipliers[unit])
+
+
+def map_path(mapdir, lines, params):
+    """
+    The synthetic map with about ``lines`` lines generated with the
+    ``MapGenerator`` parameters ``params``, which is generated if it is
+    not already in ``mapdir``.
+    """
+    key = '-'.join('{0}{1}'.format(k, params[k]) for k in sorted(params))
+    fname = os.path.join(mapdir, 'synth-{0}-{1}.map'.format(lines, key))
+    if not os.path.exists(fname):
+        if not os.path.exists(mapdir):
+            os.makedirs(mapdir)
+        partial = fname + '.partial'
+        with open(partial, 'w') as f:
+            MapGenerator(lines=lines, **params).write(f)
+        os.replace(partial, fname)
+    return fname
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(fname, repeat=1, reports=REPORTS, stats=False):
+    """
+    Measure the parsing of a map file, and the reports produced from it.
+    Meant to be run in a fresh process, so that the peak memory is that of
+    the parse.
+    """
+    logging.disable(logging.CRITICAL)
+    with open(fname, 'rb') as f:
+        lines = sum(1 for _ in f)
+    rss_before = _peak_rss()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sm = process_map_file(fname, profile='auto')
+        timings.append(time.perf_counter() - start)
+    result = {
+        'lines': lines,
+        'bytes': os.path.getsize(fname),
+        'nodes': len(sm.memory_map.index.all_nodes),
+        'parse': min(timings),
+        'peak_rss': _peak_rss(),
+        'rss_before': rss_before,
+        'reports': {},
+    }
+    with open(os.devnull, 'w') as null:
+        with redirect_stdout(null):
+            for report, arg in reports:
+                start = time.perf_counter()
+                run_report(sm, report, arg)
+                result['reports'][report] = time.perf_counter() - start
+    if stats:
+        parse_stats = ParseStats()
+        process_map_file(fname, profile='auto', stats=parse_stats)
+        result['stats'] = parse_stats.as_dict()
+    return result
+
+
+def run_suite(sizes, mapdir, params, repeat=1, stats=False):
+    results = {
+        'format': RESULTS_FORMAT,
+        'created': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'maps': [],
+    }
+    # Each map is measured in a new process.
+    ctx = multiprocessing.get_context('spawn')
+    for lines in sizes:
+        fname = map_path(mapdir, lines, params)
+        with ctx.Pool(1) as pool:
+            result = pool.apply(measure, (fname, repeat, REPORTS, stats))
+        result['size'] = lines
+        results['maps'].append(result)
+        print_result(result)
+    return results
+
+
+def print_result(result):
+    rtime = sum(result['reports'].values())
+    print("{0:>10} lines {1:>9} nodes  parse {2:>9.2f} s  reports "
+          "{3:>8.2f} s  peak {4}".format(
+              result['lines'], result['nodes'], result['parse'], rtime,
+              _format_bytes(result['peak_rss'])))
+
+
+def _format_bytes(value):
+    if value is None:
+        return '-'
+    return '{0:.1f} MiB'.format(value / 1048576)
+
+
+def _metrics(result):
+    yield 'parse', result['parse']
+    for report, elapsed in sorted(result['reports'].items()):
+        yield report, elapsed
+    yield 'peak_rss', result['peak_rss']
+
+
+def compare(baseline, results, threshold=10, min_time=0.01):
+    """
+    Print a comparison of the results with the baseline, returning the
+    number of measurements which grew by more than ``threshold`` percent.
+    Times shorter than ``min_time`` seconds are too noisy to be counted.
+    """
+    if baseline.get('params') != results['params']:
+        print("Warning : the maps were generated with different parameters")
+    before = dict((r['size'], r) for r in baseline['maps'])
+    tbl = PrettyTable(['SIZE', 'MEASUREMENT', 'BEFORE', 'AFTER', 'CHANGE',
+                       ''])
+    tbl.align['MEASUREMENT'] = 'l'
+    for heading in ('SIZE', 'BEFORE', 'AFTER', 'CHANGE'):
+        tbl.align[heading] = 'r'
+    regressions = 0
+    for result in results['maps']:
+        old = before.get(result['size'])
+        if old is None:
+            continue
+        old_metrics = dict(_metrics(old))
+        for name, value in _metrics(result):
+            old_value = old_metrics.get(name)
+            if value is None or not old_value:
+                continue
+            change = (value - old_value) * 100 / old_value
+            flag = ''
+            if change > threshold and \
+                    (name == 'peak_rss' or value >= min_time):
+                flag = 'REGRESSION'
+                regressions += 1
+            if name == 'peak_rss':
+                values = [_format_bytes(old_value), _format_bytes(value)]
+            else:
+                values = ['{0:.3f} s'.format(old_value),
+                          '{0:.3f} s'.format(value)]
+            tbl.add_row([result['size'], name] + values +
+                        ['{0:+.1f}%'.format(change), flag])
+    print(tbl.get_string())
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10k,100k,1M',
+                        help='Comma separated numbers of lines of the maps, '
+                             'with optional k or M suffixes.')
+    parser.add_argument('--map-dir', default=os.path.join(
+                            tempfile.gettempdir(), 'fpvgcc-benchmarks'),
+                        help='Directory in which the generated maps are '
+                             'kept.')
+    parser.add_argument('-n', '--repeat', type=int, default=1,
+                        help='Number of times each map is parsed, of which '
+                             'the fastest is reported.')
+    parser.add_argument('--stats', action='store_true',
+                        help='Include the parser statistics of each map in '
+                             'the results.')
+    parser.add_argument('--save', metavar='FILE', default=None)
+    parser.add_argument('--compare', metavar='FILE', default=None)
+    parser.add_argument('--threshold', metavar='PERCENT', type=float,
+                        default=10)
+    parser.add_argument('--min-time', metavar='SECONDS', type=float,
+                        default=0.01)
+    parser.add_argument('--sections', type=int, default=8)
+    parser.add_argument('--objects-per-archive', type=int, default=8)
+    parser.add_argument('--fill-density', type=float, default=0.1)
+    parser.add_argument('--alias-density', type=float, default=0.2)
+    parser.add_argument('--long-names', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    params = {
+        'sections': args.sections,
+        'objects_per_archive': args.objects_per_archive,
+        'fill_density': args.fill_density,
+        'alias_density': args.alias_density,
+        'long_names': args.long_names,
+        'seed': args.seed,
+    }
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    results = run_suite(sizes, args.map_dir, params, repeat=args.repeat,
+                        stats=args.stats)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline is not None:
+        if compare(baseline, results, args.threshold, args.min_time):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
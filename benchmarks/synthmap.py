@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Generate synthetic GCC map files of any size.
+
+    $ python benchmarks/synthmap.py [-n LINES] [options] OUTFILE
+
+The maps follow the layout of the maps produced by GCC for an ARM target,
+with all of the regions of the map file, and are meant to exercise the
+parser the way large real maps do. The linker map has the usual ``.text``,
+``.rodata``, ``.data`` and ``.bss`` sections along with any number of other
+sections, each filled with input sections from the object files of a number
+of archives.
+
+Every object file contributes its plain ``.text``, ``.data`` and ``.bss``
+input sections, which leads to the duplicate names real maps have. Input
+sections are otherwise named after a symbol, and names which do not fit in
+the name column are wrapped onto a line of their own, as GCC does. Input
+sections come in runs, each following a wildcard pattern line. Some runs
+are of input sections with another prefix, such as ``.sbss`` in ``.bss``,
+which the parser handles as aliases. Padding between input sections is
+written as ``*fill*`` lines.
+
+The map is written as it is generated, and the same parameters and seed
+always produce the same map.
+"""
+
+import sys
+import random
+import argparse
+
+
+# Output sections which are always present, with their regions and the
+# share of the input sections they get.
+_standard_sections = [
+    ('.text', 'FLASH', 6),
+    ('.rodata', 'FLASH', 2),
+    ('.data', 'RAM', 1),
+    ('.bss', 'RAM', 2),
+]
+
+# Prefixes of input sections which are placed in each output section
+# without being named for it.
+_aliases = {
+    '.text': ['.text.unlikely', '.text.startup', '.glue_7'],
+    '.rodata': ['.rodata.str1.1', '.rodata.cst4'],
+    '.data': ['.data.rel.ro', '.sdata'],
+    '.bss': ['.sbss', 'COMMON'],
+}
+
+_words = ['init', 'read', 'write', 'handler', 'buffer', 'config', 'state',
+          'process', 'update', 'table', 'callback', 'timer', 'uart', 'usb',
+          'crypto', 'parse', 'encode', 'decode', 'queue', 'event', 'driver']
+
+# Memory regions, as (name, origin, length, attributes).
+_regions = [
+    ('FLASH', 0x08000000, 0x18000000, 'xr'),
+    ('RAM', 0x20000000, 0x20000000, 'xrw'),
+]
+
+
+class MapGenerator(object):
+    """
+    A synthetic map file with about ``lines`` lines.
+
+    ``sections`` is the number of output sections in the linker map, which
+    is at least the four standard ones. ``archives`` is the number of
+    archives, which by default grows with the size of the map, each with
+    ``objects_per_archive`` object files. ``fill_density`` is the fraction
+    of input sections followed by a ``*fill*``, ``alias_density`` the
+    fraction of runs of input sections named for another section, and
+    ``long_names`` the fraction of symbol names too long to share a line
+    with the address and size of their input section.
+    """
+    def __init__(self, lines=100000, sections=8, archives=None,
+                 objects_per_archive=8, fill_density=0.1,
+                 alias_density=0.2, long_names=0.5, seed=0):
+        self.lines = lines
+        self.sections = max(sections, len(_standard_sections))
+        if archives is None:
+            archives = max(2, lines // 2000)
+        self.archives = archives
+        self.objects_per_archive = objects_per_archive
+        self.fill_density = fill_density
+        self.alias_density = alias_density
+        self.long_names = long_names
+        self.seed = seed
+        self.objects = [
+            ('/opt/build/lib/lib{0}{1}.a'.format(_words[a % len(_words)], a),
+             '{0}_{1}.c.obj'.format(_words[o % len(_words)], o))
+            for a in range(archives) for o in range(objects_per_archive)
+        ]
+        self.output_sections = list(_standard_sections) + [
+            ('.sec{0}'.format(idx), 'FLASH', 1)
+            for idx in range(self.sections - len(_standard_sections))
+        ]
+        # Lines which are not input sections, roughly.
+        overhead = 4 * len(self.objects) + 60 + 8 * self.sections
+        per_input = 2 + self.long_names + self.fill_density
+        inputs = max(len(self.objects), (lines - overhead) / per_input)
+        weights = sum(w for _, _, w in self.output_sections)
+        self._inputs = [int(inputs * w / weights)
+                        for _, _, w in self.output_sections]
+
+    def _rng(self, *key):
+        return random.Random('{0}:{1}'.format(self.seed, key))
+
+    def _symbol(self, rng, idx):
+        if rng.random() < self.long_names:
+            return '{0}_{1}_{2}_{3}'.format(rng.choice(_words),
+                                            rng.choice(_words),
+                                            rng.choice(_words), idx)
+        return 's{0:x}'.format(idx)
+
+    def _input_sections(self, sidx):
+        # Yields (pattern, name, size, object file, symbol, fill) for each
+        # input section of an output section. The same input sections are
+        # produced every time, so that the size of the output section can
+        # be found before it is written.
+        section = self.output_sections[sidx][0]
+        rng = self._rng('inputs', sidx)
+        count = self._inputs[sidx]
+        aliases = _aliases.get(section, [])
+        objects = self.objects
+        nobj = len(objects)
+        emitted = 0
+        # The plain input sections of each object file.
+        for obj in objects:
+            if section in ('.text', '.data', '.bss'):
+                yield section, section, rng.choice((0, 0, 0, 4)), obj, None, 0
+                emitted += 1
+        idx = 0
+        while emitted < count:
+            prefix = section
+            if aliases and rng.random() < self.alias_density:
+                prefix = rng.choice(aliases)
+            for _ in range(rng.randint(1, 50)):
+                symbol = self._symbol(rng, sidx * 100000000 + idx)
+                idx += 1
+                if prefix == 'COMMON':
+                    # Common symbols are allocated in a single input
+                    # section of each object file, named for its kind.
+                    name = prefix
+                else:
+                    name = prefix + '.' + symbol
+                size = rng.randint(1, 64) * 2
+                fill = 0
+                if rng.random() < self.fill_density:
+                    fill = rng.randint(1, 3)
+                yield (prefix, name, size,
+                       objects[rng.randrange(nobj)], symbol, fill)
+                emitted += 1
+                if emitted >= count:
+                    break
+
+    def _section_size(self, sidx):
+        return sum(size + fill for _, _, size, _, _, fill
+                   in self._input_sections(sidx))
+
+    def write(self, f):
+        """
+        Write the map to the text stream ``f``, returning the number of
+        lines written.
+        """
+        out = _LineWriter(f)
+        self._write_dependencies(out)
+        self._write_common_symbols(out)
+        self._write_discarded(out)
+        self._write_memory_configuration(out)
+        self._write_linker_map(out)
+        out.write('OUTPUT(firmware.elf elf32-littlearm)')
+        self._write_unallocated(out)
+        return out.count
+
+    def _write_dependencies(self, out):
+        out.write('Archive member included to satisfy reference by file '
+                  '(symbol)')
+        out.write('')
+        rng = self._rng('dependencies')
+        for arfile, objfile in self.objects:
+            out.write('{0}({1})'.format(arfile, objfile))
+            out.write('{0:30}main.c.obj ({1})'.format(
+                '', self._symbol(rng, rng.randrange(1 << 20))))
+        out.write('')
+
+    def _write_common_symbols(self, out):
+        out.write('Allocating common symbols')
+        out.write('Common symbol       size              file')
+        out.write('')
+        rng = self._rng('common')
+        for idx, (arfile, objfile) in enumerate(self.objects[::4]):
+            symbol = self._symbol(rng, idx)
+            detail = '0x{0:<16x}{1}({2})'.format(rng.randint(1, 64),
+                                                 arfile, objfile)
+            if len(symbol) > 19:
+                out.write(symbol)
+                out.write('{0:20}{1}'.format('', detail))
+            else:
+                out.write('{0:<20}{1}'.format(symbol, detail))
+        out.write('')
+
+    def _write_discarded(self, out):
+        out.write('Discarded input sections')
+        out.write('')
+        for arfile, objfile in self.objects:
+            out.write(' {0:<14} 0x{1:016x} {2:>10} {3}({4})'.format(
+                '.text', 0, '0x0', arfile, objfile))
+        out.write('')
+
+    def _write_memory_configuration(self, out):
+        out.write('Memory Configuration')
+        out.write('')
+        out.write('Name             Origin             Length'
+                  '             Attributes')
+        for name, origin, length, attribs in _regions:
+            out.write('{0:<16} 0x{1:016x} 0x{2:016x} {3}'.format(
+                name, origin, length, attribs))
+        out.write('*default*        0x0000000000000000 0xffffffffffffffff')
+        out.write('')
+
+    def _write_linker_map(self, out):
+        out.write('Linker script and memory map')
+        out.write('')
+        out.write('LOAD crt0.o')
+        for arfile in sorted(set(arfile for arfile, _ in self.objects)):
+            out.write('LOAD {0}'.format(arfile))
+        for idx in range(16):
+            address = 0x20001000 + idx * 0x40
+            out.write('{0:16}0x{1:016x}{2:16}__reserved{3} = 0x{1:x}'.format(
+                '', address, '', idx))
+        out.write('')
+        cursors = dict((name, origin) for name, origin, _, _ in _regions)
+        for sidx, (name, region, _) in enumerate(self.output_sections):
+            size = self._section_size(sidx)
+            address = cursors[region]
+            heading = '{0:<15} 0x{1:016x} {2:>10}'.format(name, address,
+                                                          hex(size))
+            if name == '.data':
+                # Initialized data is loaded from flash.
+                heading += ' load address 0x{0:016x}'.format(
+                    cursors['FLASH'])
+                cursors['FLASH'] += size
+            out.write(heading)
+            out.write('{0:16}0x{1:016x}{2:16}. = ALIGN (0x4)'.format(
+                '', address, ''))
+            self._write_inputs(out, sidx, address)
+            cursors[region] = address + size
+            out.write('')
+
+    def _write_inputs(self, out, sidx, address):
+        pattern = None
+        for prefix, name, size, obj, symbol, fill in \
+                self._input_sections(sidx):
+            if prefix != pattern:
+                if prefix == 'COMMON':
+                    out.write(' *(COMMON)')
+                else:
+                    out.write(' *({0} {0}.*)'.format(prefix))
+                pattern = prefix
+            detail = '0x{0:016x} {1:>10} {2}({3})'.format(
+                address, hex(size), obj[0], obj[1])
+            if len(name) > 14:
+                out.write(' ' + name)
+                out.write('{0:16}{1}'.format('', detail))
+            else:
+                out.write(' {0:<14} {1}'.format(name, detail))
+            if symbol is not None:
+                out.write('{0:16}0x{1:016x}{2:16}{3}'.format(
+                    '', address, '', symbol))
+            address += size
+            if fill:
+                out.write(' *fill*         0x{0:016x} {1:>10} '.format(
+                    address, hex(fill)))
+                address += fill
+
+    def _write_unallocated(self, out):
+        # Sections which are not loaded, which GCC lists after the OUTPUT
+        # line at address 0.
+        out.write('')
+        for name in ('.ARM.attributes', '.comment'):
+            size = 0x10 * len(self.objects)
+            if len(name) > 14:
+                out.write(name)
+                out.write('{0:16}0x{1:016x} {2:>10}'.format('', 0,
+                                                            hex(size)))
+            else:
+                out.write('{0:<15} 0x{1:016x} {2:>10}'.format(name, 0,
+                                                              hex(size)))
+            for arfile, objfile in self.objects:
+                detail = '0x{0:016x} {1:>10} {2}({3})'.format(
+                    0, '0x10', arfile, objfile)
+                if len(name) > 14:
+                    out.write(' ' + name)
+                    out.write('{0:16}{1}'.format('', detail))
+                else:
+                    out.write(' {0:<14} {1}'.format(name, detail))
+            out.write('')
+
+
+class _LineWriter(object):
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, line):
+        self.f.write(line + '\n')
+        self.count += 1
+
+
+def write_map(fname, **kwargs):
+    """
+    Write a synthetic map file, returning the number of lines written.
+    The keyword arguments are those of ``MapGenerator``.
+    """
+    with open(fname, 'w') as f:
+        return MapGenerator(**kwargs).write(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('outfile', help="Map file to write, or '-' for "
+                                        "stdout.")
+    parser.add_argument('-n', '--lines', type=int, default=100000)
+    parser.add_argument('--sections', type=int, default=8)
+    parser.add_argument('--archives', type=int, default=None)
+    parser.add_argument('--objects-per-archive', type=int, default=8)
+    parser.add_argument('--fill-density', type=float, default=0.1)
+    parser.add_argument('--alias-density', type=float, default=0.2)
+    parser.add_argument('--long-names', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generator = MapGenerator(
+        lines=args.lines, sections=args.sections, archives=args.archives,
+        objects_per_archive=args.objects_per_archive,
+        fill_density=args.fill_density, alias_density=args.alias_density,
+        long_names=args.long_names, seed=args.seed
+    )
+    if args.outfile == '-':
+        count = generator.write(sys.stdout)
+    else:
+        with open(args.outfile, 'w') as f:
+            count = generator.write(f)
+    sys.stderr.write("{0} lines\n".format(count))
+
+
+if __name__ == '__main__':
+    main()
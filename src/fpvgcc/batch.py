@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Analysis of a number of map files in one go.
+
+Each map file is parsed in a worker process, and reduced there to a
+``MapSummary``. Only the summaries, which are small and picklable, are
+sent back to the calling process.
+"""
+
+import os
+import glob
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from .fpv import process_map_file
+from .cache import MapCache
+from .profiles import get_profile
+from .profiles.guess import guess_profile
+
+
+class MapSummary(object):
+    """
+    Compact summary of the footprint of a single map file.
+
+    ``region_totals`` and ``section_totals`` line up with ``regions`` and
+    ``sections``, and hold the same totals reported by the ``--sar`` and
+    ``--ssec`` reports respectively. If the map could not be analyzed,
+    ``error`` describes the problem and the rest of the summary is empty.
+    """
+    def __init__(self, fname, profile=None, regions=None, region_totals=None,
+                 sections=None, section_totals=None, error=None):
+        self.fname = fname
+        self.profile = profile
+        self.regions = regions or []
+        self.region_totals = region_totals or []
+        self.sections = sections or []
+        self.section_totals = section_totals or []
+        self.error = error
+
+    @property
+    def region_fp(self):
+        return dict(zip(self.regions, self.region_totals))
+
+    @property
+    def section_fp(self):
+        return dict(zip(self.sections, self.section_totals))
+
+    @property
+    def total(self):
+        return sum(self.region_totals)
+
+    def __repr__(self):
+        if self.error:
+            return "<MapSummary {0} ERROR {1}>".format(self.fname, self.error)
+        return "<MapSummary {0} {1}>".format(
+            self.fname, ' '.join('{0}={1}'.format(r, s)
+                                 for r, s in zip(self.regions,
+                                                 self.region_totals))
+        )
+
+
+def _sum_rows(rows, width):
+    totals = [0] * width
+    for row in rows:
+        totals = [t + x for t, x in zip(totals, row)]
+    return totals
+
+
+def summarize_map(sm, fname=None):
+    mm = sm.memory_map
+    objfiles, arfiles = mm.used_files
+    region_rows = [mm.get_objfile_fp(f) for f in objfiles] + \
+                  [mm.get_arfile_fp(f) for f in arfiles]
+    section_rows = [mm.get_objfile_fp_secs(f) for f in mm.used_objfiles]
+    return MapSummary(
+        fname,
+        profile=getattr(sm.ctx, 'id', 'default'),
+        regions=mm.used_regions,
+        region_totals=_sum_rows(region_rows, len(mm.used_regions)),
+        sections=mm.used_sections,
+        section_totals=_sum_rows(section_rows, len(mm.used_sections)),
+    )
+
+
+def analyze_map(fname, profile='auto', cache=None):
+    """
+    Parse a single map file and summarize it. ``profile`` is the name of
+    a profile or 'auto', and ``cache``, if provided, is the ``MapCache``
+    to parse the map through.
+
+    Errors are reported in the summary rather than raised, so that one
+    unreadable map does not abort a batch.
+    """
+    try:
+        if profile == 'auto':
+            profile = guess_profile(fname)
+        ctx = get_profile(profile)
+        if cache is not None:
+            sm = cache.process_map_file(fname, profile=ctx)
+        else:
+            sm = process_map_file(fname, profile=ctx)
+        return summarize_map(sm, fname)
+    except Exception as e:
+        logging.error("Could not analyze {0} : {1}".format(fname, e))
+        return MapSummary(fname, error='{0}: {1}'.format(
+            type(e).__name__, e))
+
+
+def expand_map_paths(patterns):
+    """
+    Expand a list of map file paths and glob patterns into a list of
+    paths, in the order given and without duplicates. Patterns which do
+    not match anything are kept as they are, so that they are reported
+    as errors rather than silently dropped.
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) \
+            else [pattern]
+        if not matches:
+            logging.warning("No map files match : {0}".format(pattern))
+            matches = [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def process_map_files(fnames, profile='auto', jobs=None, cache=None):
+    """
+    Analyze a number of map files in parallel, returning a ``MapSummary``
+    for each of them in the order in which they were provided.
+
+    The maps are parsed by a pool of ``jobs`` worker processes, which
+    defaults to the number of CPUs. With ``jobs=1``, or a single map, they
+    are parsed in the calling process instead.
+    """
+    if isinstance(fnames, str):
+        fnames = [fnames]
+    fnames = expand_map_paths(fnames)
+    if cache is True:
+        cache = MapCache()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(fnames))
+    if jobs <= 1:
+        return [analyze_map(fname, profile, cache) for fname in fnames]
+    # Maps vary a great deal in size, so they are handed out one at a
+    # time rather than in chunks.
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(analyze_map, fnames,
+                                 [profile] * len(fnames),
+                                 [cache] * len(fnames)))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Footprint budgets.
+
+A budget is a list of rules, each limiting the footprint of a region, or
+of the sections, archives, object files or symbols matching a pattern.
+Rules are read from a budget file, one per line, as::
+
+    KIND PATTERN LIMIT [REGION]
+
+``KIND`` is one of ``region``, ``section``, ``arfile``, ``objfile`` or
+``symbol``. The pattern is a glob, except for symbols, where it is a regular
+expression which need only match part of the name. Every item matching the
+pattern is held to the limit on its own.
+
+``LIMIT`` is a number of bytes, with an optional ``K`` or ``M`` suffix for
+multiples of 1024, or a percentage of the size of a memory region. If a
+``REGION`` is given, only the footprint in that region is limited, and it
+is the region percentages refer to. Percentages in region rules refer to
+the region itself. Anything following a ``#`` is ignored.
+
+All the rules are checked against the footprints of the memory map, which
+are accumulated in a single walk over its tree. Rules which match nothing
+in the map, usually because of a mistyped pattern or region, are reported
+as unmatched, and fail the check if it is strict.
+"""
+
+import re
+from fnmatch import fnmatchcase
+from collections import OrderedDict
+
+from .diff import map_totals
+
+
+KINDS = ('region', 'section', 'arfile', 'objfile', 'symbol')
+
+re_limit = re.compile(r'^(?P<value>0x[0-9a-fA-F]+|[0-9]+(?:\.[0-9]*)?)'
+                      r'(?P<unit>[kKmM%]?)$')
+
+_UNITS = {'': 1, 'k': 1024, 'K': 1024, 'm': 1024 * 1024, 'M': 1024 * 1024}
+
+
+def parse_limit(text):
+    """
+    Parse a limit, returning the number of bytes and False, or the
+    percentage and True.
+    """
+    match = re_limit.match(text)
+    if not match:
+        raise ValueError("Malformed limit : {0}".format(text))
+    value, unit = match.group('value'), match.group('unit')
+    value = int(value, 16) if value.startswith('0x') else float(value)
+    if unit == '%':
+        return value, True
+    return int(value * _UNITS[unit]), False
+
+
+class BudgetRule(object):
+    def __init__(self, kind, pattern, limit, percent=False, region=None,
+                 text=None, line=None):
+        if kind not in KINDS:
+            raise ValueError("Unknown budget rule kind : {0}".format(kind))
+        if kind in ('region', 'section') and region is not None:
+            raise ValueError("{0} rules cannot be restricted to a region"
+                             "".format(kind))
+        if percent and kind != 'region' and region is None:
+            raise ValueError("Percentage limits need a region, except in "
+                             "region rules")
+        self.kind = kind
+        self.pattern = pattern
+        self.limit = limit
+        self.percent = percent
+        self.region = region
+        self.text = text
+        self.line = line
+        if kind == 'symbol':
+            self._regex = re.compile(pattern)
+
+    def matches(self, name):
+        if self.kind == 'symbol':
+            return self._regex.search(name) is not None
+        return fnmatchcase(name, self.pattern)
+
+    def as_dict(self):
+        return OrderedDict([
+            ('rule', self.text),
+            ('line', self.line),
+            ('kind', self.kind),
+            ('pattern', self.pattern),
+            ('region', self.region),
+        ])
+
+    def __repr__(self):
+        return "<BudgetRule {0}>".format(self.text or ' '.join(
+            str(x) for x in (self.kind, self.pattern, self.limit,
+                             self.region) if x is not None
+        ))
+
+
+def read_budget_rules(f):
+    """
+    Read the rules of a budget file. Errors are raised as ValueError,
+    naming the offending line.
+    """
+    rules = []
+    for lineno, line in enumerate(f, 1):
+        text = line.split('#')[0].strip()
+        if not text:
+            continue
+        tokens = text.split()
+        if len(tokens) not in (3, 4):
+            raise ValueError("Malformed budget rule on line {0} : {1}"
+                             "".format(lineno, text))
+        try:
+            limit, percent = parse_limit(tokens[2])
+            rules.append(BudgetRule(
+                tokens[0], tokens[1], limit, percent,
+                region=tokens[3] if len(tokens) > 3 else None,
+                text=text, line=lineno
+            ))
+        except (ValueError, re.error) as e:
+            raise ValueError("Bad budget rule on line {0} : {1}"
+                             "".format(lineno, e))
+    return rules
+
+
+class BudgetViolation(object):
+    def __init__(self, rule, name, size, limit):
+        self.rule = rule
+        self.name = name
+        self.size = size
+        self.limit = limit
+
+    @property
+    def excess(self):
+        return self.size - self.limit
+
+    def as_dict(self):
+        return OrderedDict([
+            ('rule', self.rule.text),
+            ('line', self.rule.line),
+            ('kind', self.rule.kind),
+            ('name', self.name),
+            ('region', self.rule.region),
+            ('size', self.size),
+            ('limit', self.limit),
+            ('excess', self.excess),
+        ])
+
+    def __repr__(self):
+        return "<BudgetViolation {0} {1} > {2}>".format(
+            self.name, self.size, self.limit
+        )
+
+
+class BudgetReport(object):
+    def __init__(self, rules, checked, violations, unmatched=None,
+                 strict=False):
+        self.rules = rules
+        self.checked = checked
+        self.violations = violations
+        self.unmatched = unmatched or []
+        self.strict = strict
+
+    @property
+    def passed(self):
+        if self.strict and self.unmatched:
+            return False
+        return not self.violations
+
+    def as_dict(self):
+        return OrderedDict([
+            ('passed', self.passed),
+            ('rules', len(self.rules)),
+            ('checked', self.checked),
+            ('violations', [v.as_dict() for v in self.violations]),
+            ('unmatched', [r.as_dict() for r in self.unmatched]),
+        ])
+
+
+def _region_size(memory_map, region):
+    if region == 'VEC' and memory_map.collapse_vectors:
+        sizes = [r.size for r in memory_map.memory_regions
+                 if 'VEC' in r.name]
+    else:
+        sizes = [r.size for r in memory_map.memory_regions
+                 if r.name == region]
+    if not sizes:
+        raise ValueError("Unknown region : {0}".format(region))
+    return sum(sizes)
+
+
+def _budget_totals(memory_map):
+    # All rules are checked against totals read out of the footprints of
+    # the map, keyed by kind and then by (name, region), with None as the
+    # region for totals over all regions.
+    fp = memory_map.footprints
+    totals = map_totals(memory_map, nodes=False)
+    rv = {
+        'region': {(k, None): v for k, v in totals['regions'].items()},
+        'section': {(k, None): v for k, v in totals['sections'].items()},
+    }
+    for kind, attr in (('arfile', 'arfile'), ('objfile', 'objfile'),
+                       ('symbol', 'name')):
+        kind_totals = {(k, None): v for k, v in totals[kind + 's'].items()}
+        for (value, region), size in fp.region_totals(attr).items():
+            if value is not None:
+                kind_totals[(value, region)] = size
+        rv[kind] = kind_totals
+    return rv
+
+
+def check_budget(memory_map, rules, strict=False):
+    """
+    Check the footprints of a memory map against a list of rules,
+    returning a ``BudgetReport``. Rules which match nothing in the map are
+    listed in the report as unmatched. If ``strict`` is set, they also
+    fail the check.
+    """
+    totals = _budget_totals(memory_map)
+    checked = 0
+    violations = []
+    unmatched = []
+    for rule in rules:
+        found = []
+        matched = False
+        for (name, region), size in totals[rule.kind].items():
+            if region != rule.region or not rule.matches(name):
+                continue
+            checked += 1
+            matched = True
+            limit = rule.limit
+            if rule.percent:
+                # Region rules are relative to the region they match.
+                limit = int(_region_size(memory_map, region or name) *
+                            limit / 100)
+            if size > limit:
+                found.append(BudgetViolation(rule, name, size, limit))
+        if not matched:
+            unmatched.append(rule)
+        violations.extend(sorted(found, key=lambda v: -v.excess))
+    return BudgetReport(rules, checked, violations, unmatched, strict)
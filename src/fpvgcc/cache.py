@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent cache of parsed map files.
+
+The parsed memory map, along with the memory regions, aliases, loaded
+files, common symbols and linker defined addresses found in the map file,
+is reduced to a flat table of nodes with all strings interned, and
+pickled. Cache entries are keyed by the content hash and modification
+time of the map file, and the fpvgcc version which produced them.
+
+Since the entries are pickles, the cache directory should not be
+writable by anyone who isn't trusted with running code as the user.
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+
+from .fpv import GCCMemoryMapParserSM
+from .fpv import CommonSymbol
+from .fpv import LinkerDefnAddr
+from .fpv import process_map_file
+from .gccMemoryMap import GCCMemoryMapNode
+from .gccMemoryMap import MemoryRegion
+from .profiles import get_profile
+from .profiles.guess import guess_profile
+
+
+# Bump this whenever the layout of the snapshot changes.
+SNAPSHOT_FORMAT = 1
+
+CACHE_EXTENSION = '.fpvcache'
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def _get_fpvgcc_version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return 'unknown'
+    try:
+        return version('fpvgcc')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'fpvgcc')
+
+
+def file_hash(fname, blocksize=1 << 20):
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+
+    def intern(self, value):
+        if value is None:
+            return None
+        try:
+            return self._ids[value]
+        except KeyError:
+            self._ids[value] = len(self.strings)
+            self.strings.append(value)
+            return self._ids[value]
+
+
+def snapshot(sm):
+    """
+    Reduce a parsed map file to a structure of plain python builtins,
+    suitable for pickling.
+    """
+    st = _StringTable()
+    s = st.intern
+    nodes = sm.memory_map.root.all_nodes()
+    positions = {id(node): pos for pos, node in enumerate(nodes)}
+    records = []
+    for node in nodes:
+        if node.is_root:
+            parent = None
+        else:
+            parent = positions[id(node.parent)]
+        records.append((parent, s(node.name), node._address, node._defsize,
+                        node._size, node._fillsize, s(node.arfile),
+                        s(node.objfile), s(node.arfolder)))
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'strings': st.strings,
+        'nodes': records,
+        'memory_regions': [(r.name, r.origin, r.size, r.attribs)
+                           for r in sm.memory_map.memory_regions],
+        'aliases': sm.memory_map.aliases.items(),
+        'loaded_files': list(sm.loaded_files),
+        'common_symbols': [(c.symbol, c.size, c.filefolder,
+                            c.archivefile, c.objfile)
+                           for c in sm.common_symbols],
+        'linker_defined_addresses': [(d.symbol, d.address, d.defn_addr)
+                                     for d in sm.linker_defined_addresses],
+    }
+
+
+def restore(snap, profile):
+    """
+    Reconstruct a parser state machine, with its memory map, from a
+    snapshot produced by ``snapshot``.
+    """
+    if snap['format'] != SNAPSHOT_FORMAT:
+        raise ValueError("Unsupported snapshot format : {0}"
+                         "".format(snap['format']))
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    mm = sm.memory_map
+    strings = snap['strings']
+
+    def s(idx):
+        if idx is None:
+            return None
+        return strings[idx]
+
+    # Nodes are linked directly rather than through add_child, which
+    # checks for duplicates and invalidates the tree on every call.
+    nodes = []
+    for record in snap['nodes']:
+        (parent, name, address, defsize, size, fillsize,
+         arfile, objfile, arfolder) = record
+        if parent is None:
+            node = mm.root
+        else:
+            node = GCCMemoryMapNode(name=s(name))
+            nodes[parent].attach_child(node)
+        node.name = s(name)
+        node._address = address
+        node._defsize = defsize
+        node._size = size
+        node._fillsize = fillsize
+        node.arfile = s(arfile)
+        node.objfile = s(objfile)
+        node.arfolder = s(arfolder)
+        nodes.append(node)
+
+    for name, origin, size, attribs in snap['memory_regions']:
+        mm.add_memory_region(
+            MemoryRegion(name, hex(origin), hex(size), attribs)
+        )
+    for alias, target in snap['aliases']:
+        mm.aliases.register_alias(target, alias)
+    sm.loaded_files = list(snap['loaded_files'])
+    for symbol, size, filefolder, archivefile, objfile in \
+            snap['common_symbols']:
+        sm.common_symbols.append(
+            CommonSymbol(symbol, hex(size), filefolder, archivefile, objfile)
+        )
+    for symbol, address, defn_addr in snap['linker_defined_addresses']:
+        sm.linker_defined_addresses.append(
+            LinkerDefnAddr(symbol, hex(address), hex(defn_addr))
+        )
+    sm.state = 'CACHED'
+    mm.assign_regions()
+    mm.invalidate()
+    return sm
+
+
+class MapCache(object):
+    """
+    A directory of parsed map file snapshots.
+
+    Entries are evicted when they have not been used for longer than
+    ``max_age`` seconds, and the least recently used entries are evicted
+    when the total size of the cache exceeds ``max_size`` bytes. Eviction
+    is run whenever a new entry is stored.
+    """
+    def __init__(self, cachedir=None, max_size=DEFAULT_MAX_SIZE,
+                 max_age=DEFAULT_MAX_AGE):
+        if cachedir is None:
+            cachedir = default_cache_dir()
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def key(self, fname):
+        h = hashlib.sha1()
+        h.update('{0}|{1}|{2}|{3}'.format(
+            SNAPSHOT_FORMAT, _get_fpvgcc_version(),
+            os.stat(fname).st_mtime_ns, file_hash(fname)
+        ).encode())
+        return h.hexdigest()
+
+    def path(self, fname, key):
+        return os.path.join(
+            self.cachedir, '{0}.{1}{2}'.format(os.path.basename(fname),
+                                               key[:16], CACHE_EXTENSION)
+        )
+
+    def load(self, fname, profile=None, key=None):
+        if key is None:
+            key = self.key(fname)
+        path = self.path(fname, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            if entry['key'] != key:
+                return None
+            sm = restore(entry['snapshot'], _get_ctx(fname, profile))
+        except Exception as e:
+            logging.warning("Discarding unreadable cache entry {0} : {1}"
+                            "".format(path, e))
+            self._remove(path)
+            return None
+        # Used entries are kept fresh for the purposes of eviction.
+        os.utime(path, None)
+        logging.info("Loaded {0} from cache : {1}".format(fname, path))
+        return sm
+
+    def store(self, fname, sm, key=None):
+        if key is None:
+            key = self.key(fname)
+        path = self.path(fname, key)
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+        entry = {'key': key, 'snapshot': snapshot(sm)}
+        fd, tmppath = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, path)
+        except Exception:
+            self._remove(tmppath)
+            raise
+        self.evict()
+        return path
+
+    def entries(self):
+        if not os.path.isdir(self.cachedir):
+            return []
+        rv = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith(CACHE_EXTENSION):
+                continue
+            path = os.path.join(self.cachedir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            rv.append((stat.st_mtime, stat.st_size, path))
+        return sorted(rv)
+
+    def evict(self):
+        entries = self.entries()
+        now = time.time()
+        total = sum(e[1] for e in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            oversize = self.max_size is not None and total > self.max_size
+            if expired or oversize:
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def process_map_file(self, fname, profile=None):
+        profile = _get_ctx(fname, profile)
+        key = self.key(fname)
+        sm = self.load(fname, profile, key=key)
+        if sm is None:
+            sm = process_map_file(fname, profile=profile)
+            try:
+                self.store(fname, sm, key=key)
+            except (OSError, IOError) as e:
+                logging.warning("Could not write to the cache : {0}"
+                                "".format(e))
+        return sm
+
+
+def _get_ctx(fname, profile):
+    if profile is None:
+        return get_profile('default')
+    elif profile == 'auto':
+        return get_profile(guess_profile(fname))
+    return profile
@@ -22,14 +22,37 @@
 Docstring for cli
 """
 
+import sys
+import json
+import time
 import argparse
 import logging
+from collections import OrderedDict
+from contextlib import redirect_stdout
 from prettytable import PrettyTable
 
 from .fpv import process_map_file
+from .fpv import GCCMemoryMapParser
+from .cache import MapCache
+from .budget import check_budget
+from .budget import read_budget_rules
+from .diff import diff_maps
+from .output import FORMATS
+from .output import write_report
+from .stats import ParseStats
+from .history import FootprintHistory
+from .batch import MapSummary
+from .batch import expand_map_paths
+from .batch import process_map_files
+from .batch import summarize_map
+from .parallel import parallel_jobs
+from .parallel import process_map_file_parallel
+from .incremental import IncrementalMap
+from .incremental import process_map_file_incremental
 from .profiles import profiles
 from .profiles import get_profile
 from .profiles.guess import guess_profile
+from .watch import watch_files
 
 
 def _build_table_header(cols, rowtitle):
@@ -51,105 +74,139 @@ def _add_row(tbl, rowtitle, row, totals=None):
         return totals
 
 
-def _add_totals_row(tbl, totals):
-    tbl.add_row(['TOTALS'] + totals + [''])
-
-
-def _render_table(tbl):
-    print(tbl.get_string(sortby='TOTAL', reversesort=True,
-                         sort_key=lambda x: x[-1] or 0))
-
-
-def print_symbol_fp(mm, lfile='all'):
-    cols = mm.used_regions
-    tbl, totals = _build_table_header(cols, 'SYMBOL')
-
+def print_symbol_fp(mm, lfile='all', fmt='table', top=None):
     if lfile == 'all':
         symbols = mm.all_symbols
     else:
         symbols = mm.symbols_from_file(lfile)
 
-    for symbol in symbols:
-        nextrow = mm.get_symbol_fp(symbol)
-        if not sum(nextrow):
-            continue
-        totals = _add_row(tbl, symbol, nextrow, totals)
-
-    _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    def rows():
+        for symbol in symbols:
+            nextrow = mm.get_symbol_fp(symbol)
+            if not sum(nextrow):
+                continue
+            yield symbol, nextrow
 
+    write_report('SYMBOL', mm.used_regions, rows(), fmt, top)
 
-def print_objfile_fp(mm, arfile='all'):
-    cols = mm.used_regions
-    tbl, totals = _build_table_header(cols, 'OBJFILE')
 
+def print_objfile_fp(mm, arfile='all', fmt='table', top=None):
     if arfile == 'all':
         objfiles = mm.used_objfiles
     else:
         objfiles = mm.arfile_objfiles(arfile)
+    rows = ((objfile, mm.get_objfile_fp(objfile)) for objfile in objfiles)
+    write_report('OBJFILE', mm.used_regions, rows, fmt, top)
 
-    for objfile in objfiles:
-        nextrow = mm.get_objfile_fp(objfile)
-        totals = _add_row(tbl, objfile, nextrow, totals)
-
-    _add_totals_row(tbl, totals)
-    _render_table(tbl)
-
-
-def print_arfile_fp(mm):
-    cols = mm.used_regions
-    tbl, totals = _build_table_header(cols, 'ARFILE')
-
-    for arfile in mm.used_arfiles:
-        nextrow = mm.get_arfile_fp(arfile)
-        totals = _add_row(tbl, arfile, nextrow, totals)
-
-    _add_totals_row(tbl, totals)
-    _render_table(tbl)
 
+def print_arfile_fp(mm, fmt='table', top=None):
+    rows = ((arfile, mm.get_arfile_fp(arfile))
+            for arfile in mm.used_arfiles)
+    write_report('ARFILE', mm.used_regions, rows, fmt, top)
 
-def print_file_fp(mm):
-    cols = mm.used_regions
-    tbl, totals = _build_table_header(cols, 'FILE')
 
+def print_file_fp(mm, fmt='table', top=None):
     objfiles, arfiles = mm.used_files
 
-    for objfile in objfiles:
-        nextrow = mm.get_objfile_fp(objfile)
-        totals = _add_row(tbl, objfile, nextrow, totals)
+    def rows():
+        for objfile in objfiles:
+            yield objfile, mm.get_objfile_fp(objfile)
+        for arfile in arfiles:
+            yield arfile, mm.get_arfile_fp(arfile)
 
-    for arfile in arfiles:
-        nextrow = mm.get_arfile_fp(arfile)
-        totals = _add_row(tbl, arfile, nextrow, totals)
+    write_report('FILE', mm.used_regions, rows(), fmt, top)
 
-    _add_totals_row(tbl, totals)
-    _render_table(tbl)
-
-
-def print_sectioned_fp(mm):
-    cols = mm.used_sections
-    tbl, totals = _build_table_header(cols, 'FILE')
 
+def print_sectioned_fp(mm, fmt='table', top=None):
     arfiles = []
     objfiles = mm.used_objfiles
     # objfiles, arfiles = mm.used_files
 
-    for objfile in objfiles:
-        nextrow = mm.get_objfile_fp_secs(objfile)
-        totals = _add_row(tbl, objfile, nextrow, totals)
+    def rows():
+        for objfile in objfiles:
+            yield objfile, mm.get_objfile_fp_secs(objfile)
+        for arfile in arfiles:
+            yield arfile, mm.get_arfile_fp_secs(arfile)
 
-    for arfile in arfiles:
-        nextrow = mm.get_arfile_fp_secs(arfile)
-        totals = _add_row(tbl, arfile, nextrow, totals)
+    write_report('FILE', mm.used_sections, rows(), fmt, top)
 
-    _add_totals_row(tbl, totals)
-    _render_table(tbl)
+
+def print_batch_summary(summaries):
+    cols = []
+    for summary in summaries:
+        for region in summary.regions:
+            if region not in cols:
+                cols.append(region)
+    tbl, totals = _build_table_header(cols, 'MAPFILE')
+
+    errors = []
+    for summary in summaries:
+        if summary.error:
+            errors.append(summary)
+            continue
+        fp = summary.region_fp
+        _add_row(tbl, summary.fname, [fp.get(c, 0) for c in cols])
+
+    # Maps are listed in the order they were given, which is usually
+    # more meaningful than their size when comparing variants.
+    print(tbl.get_string())
+    for summary in errors:
+        print("{0} : {1}".format(summary.fname, summary.error))
+
+
+def print_summary_deltas(previous, current):
+    """
+    Print the change in the footprint of each region of each map between
+    two sets of ``MapSummary``, each a dict keyed by map file.
+    """
+    tbl = PrettyTable(['MAPFILE', 'REGION', 'BEFORE', 'AFTER', 'DELTA'])
+    tbl.align['MAPFILE'] = 'l'
+    tbl.align['REGION'] = 'l'
+    for heading in ('BEFORE', 'AFTER', 'DELTA'):
+        tbl.align[heading] = 'r'
+    for fname, summary in current.items():
+        before = previous.get(fname)
+        if before is None or before.error or summary.error:
+            continue
+        after_fp = summary.region_fp
+        before_fp = before.region_fp
+        regions = summary.regions + [r for r in before.regions
+                                     if r not in after_fp]
+        for region in regions:
+            b, a = before_fp.get(region, 0), after_fp.get(region, 0)
+            if a != b:
+                tbl.add_row([fname, region, b, a, '{0:+d}'.format(a - b)])
+    if not tbl.rows:
+        print("No change in footprint")
+        return
+    print(tbl.get_string())
+
+
+def print_map_diff(mdiff):
+    headings = OrderedDict([('regions', 'REGION'), ('sections', 'SECTION'),
+                            ('arfiles', 'ARFILE'), ('objfiles', 'OBJFILE'),
+                            ('symbols', 'SYMBOL'), ('nodes', 'NODE')])
+    empty = True
+    for kind, deltas in mdiff.items():
+        if not deltas:
+            continue
+        empty = False
+        heading = headings[kind]
+        tbl = PrettyTable([heading, 'BEFORE', 'AFTER', 'DELTA'])
+        tbl.align[heading] = 'l'
+        for col in ('BEFORE', 'AFTER', 'DELTA'):
+            tbl.align[col] = 'r'
+        for d in deltas:
+            tbl.add_row([d.key, d.before, d.after,
+                         '{0:+d}'.format(d.delta)])
+        print(tbl.get_string())
+    if empty:
+        print("No change in footprint")
 
 
 def print_files_list(fl):
-    for f in sorted(set(fl)):
-        if f:
-            print(f)
+    for f in sorted(set(f for f in fl if f)):
+        print(f)
 
 
 def print_loaded_files(sm):
@@ -161,16 +218,116 @@ def print_aliases(sm):
     print(sm.memory_map.aliases)
 
 
+def _read_addresses(f):
+    for line in f:
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        try:
+            yield int(line.split()[0], 0)
+        except ValueError:
+            logging.warning("Skipping invalid address : {0}".format(line))
+
+
+def print_resolved_addresses(mm, f):
+    for resolved in mm.resolve_addresses(_read_addresses(f)):
+        print(resolved)
+
+
+# Available reports, and whether each of them takes an argument.
+REPORTS = OrderedDict([
+    ('sar', False),
+    ('sobj', True),
+    ('ssym', True),
+    ('ssec', False),
+    ('lmap', True),
+    ('lobj', True),
+    ('lar', True),
+    ('uf', False),
+    ('uarf', False),
+    ('uobjf', False),
+    ('uregions', False),
+    ('usections', False),
+    ('lfa', False),
+    ('la', False),
+    ('addr', True),
+    ('addrs', True),
+])
+
+
 def _get_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('mapfile',
-                        help='GCC generated Map file to analyze.')
+    parser.add_argument('mapfile', nargs='+',
+                        help="GCC generated Map file to analyze, or '-' "
+                             "to read it from stdin. With --summary, any "
+                             "number of map files or glob patterns.")
     parser.add_argument('-v', '--verbose',
                         help='Include detailed warnings in the output.',
                         action='count', default=0)
     parser.add_argument('-p', '--profile', metavar='PROFILE',
                         choices=profiles.keys(), default='auto')
+    parser.add_argument('--cache', action='store_true',
+                        help='Reuse the parsed map from the cache if the map '
+                             'file is unchanged, and cache it otherwise.')
+    parser.add_argument('--cache-dir', metavar='DIR', default=None,
+                        help='Directory in which parsed maps are cached. '
+                             'Implies --cache. Defaults to ~/.cache/fpvgcc.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep the parsed map in the cache directory, and '
+                             'parse again only the sections of the map file '
+                             'which have changed since the last run.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, and produce the report again '
+                             'along with the change in footprint whenever '
+                             'the map files change. Only the sections of a '
+                             'map which have changed are parsed again.')
+    parser.add_argument('--format', choices=FORMATS, default='table',
+                        help='Output format of the footprint reports, '
+                             '--sar, --sobj, --ssym and --ssec. Rows are '
+                             'written as they are produced in the json, '
+                             'ndjson and csv formats.')
+    parser.add_argument('--top', metavar='N', type=int, default=None,
+                        help='Only include the N rows with the largest '
+                             'totals in the footprint reports.')
+    parser.add_argument('--history', metavar='DB', default=None,
+                        help='Append the footprint totals of the map file to '
+                             'the SQLite database DB, which is created if '
+                             'needed, before producing the report.')
+    parser.add_argument('--label', metavar='LABEL', default=None,
+                        help='Label the build recorded with --history, such '
+                             'as with a version or commit id.')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=None,
+                        help='Number of processes used to parse map files '
+                             'with --summary, which defaults to the number '
+                             'of CPUs. For a single map file which is not '
+                             'cached, the largest number of processes used '
+                             'to parse its sections in parallel, which is '
+                             'only done for large maps with at least 4 '
+                             'CPUs.')
+    parser.add_argument('--strict-budget', action='store_true',
+                        help='With --budget, also fail if any rule matches '
+                             'nothing in the map, as with a mistyped '
+                             'pattern or region.')
+    parser.add_argument('--stats', action='store_true',
+                        help='Write statistics of the parsing of the map '
+                             'file, such as the time spent in each region '
+                             'of it and the hit rates of the regular '
+                             'expressions, to stderr.')
     action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--summary', action='store_true',
+                        help='Print the total footprint of each of the '
+                             'map files by region.')
+    action.add_argument('--diff', action='store_true',
+                        help='Print the change in footprint per region, '
+                             'section, file and symbol between two map '
+                             'files, given as OLDMAP NEWMAP.')
+    action.add_argument('--budget', metavar='RULESFILE',
+                        type=argparse.FileType('r'),
+                        help="Check the footprint of the map file against "
+                             "the limits in RULESFILE, one per line, as "
+                             "'KIND PATTERN LIMIT [REGION]'. Prints a JSON "
+                             "report, and exits with status 1 if any limit "
+                             "is exceeded.")
     action.add_argument('--sar', action='store_true',
                         help='Print summary of usage per included file.')
     action.add_argument('--sobj', metavar='ARFILE',
@@ -205,66 +362,352 @@ def _get_parser():
                         help='Print list of detected aliases.')
     action.add_argument('--addr', metavar='ADDRESS',
                         help='Describe contents at specified address.')
+    action.add_argument('--addrs', metavar='FILE',
+                        type=argparse.FileType('r'),
+                        help="Describe contents at each address listed in "
+                             "the specified file, one per line. Specify '-' "
+                             "to read addresses from stdin.")
+    action.add_argument('--report', nargs=2, action='append',
+                        metavar=('REPORT', 'OUTFILE'),
+                        help="Write the specified report to OUTFILE, or to "
+                             "stdout if OUTFILE is '-'. REPORT is the name "
+                             "of any of the other actions, with its argument "
+                             "if any, as in 'sar' or 'ssym=all'. May be "
+                             "repeated to produce several reports from a "
+                             "single parse of the map file.")
+    action.add_argument('--report-spec', metavar='SPECFILE',
+                        type=argparse.FileType('r'),
+                        help="Produce all the reports listed in SPECFILE, "
+                             "one per line, as 'REPORT [OUTFILE]'.")
     return parser
 
 
-def main():
-    parser = _get_parser()
-    args = parser.parse_args()
-    if args.verbose == 0:
+def _setup_logging(verbose):
+    if verbose == 0:
         logging.basicConfig(level=logging.ERROR)
-    elif args.verbose == 1:
+    elif verbose == 1:
         logging.basicConfig(level=logging.WARNING)
-    elif args.verbose == 2:
+    elif verbose == 2:
         logging.basicConfig(level=logging.INFO)
-    elif args.verbose == 3:
+    elif verbose == 3:
         logging.basicConfig(level=logging.DEBUG)
+
+
+def _load_map(args, mapfile=None):
+    if mapfile is None:
+        mapfile = args.mapfile[0]
+    stats = ParseStats() if args.stats else None
+    if mapfile == '-':
+        # The map is parsed as it arrives. With the 'auto' profile, the
+        # parser picks the profile from the OUTPUT line once it is done.
+        parser = GCCMemoryMapParser(args.profile, stats=stats)
+        parser.feed(sys.stdin.buffer)
+        sm = parser.close()
+        _print_stats(stats)
+        return sm
+    if args.incremental:
+        profile = 'auto' if args.profile == 'auto' \
+            else get_profile(args.profile)
+        return process_map_file_incremental(mapfile, profile=profile,
+                                            cachedir=args.cache_dir)
+    if args.cache or args.cache_dir:
+        if args.profile == 'auto':
+            pname = guess_profile(mapfile)
+        else:
+            pname = args.profile
+        cache = MapCache(args.cache_dir)
+        return cache.process_map_file(mapfile, profile=get_profile(pname))
     if args.profile == 'auto':
-        pname = guess_profile(args.mapfile)
+        # The profile is guessed from the same mapping of the file which
+        # is parsed.
+        profile = 'auto'
     else:
-        pname = args.profile
-    profile = get_profile(pname)
-    state_machine = process_map_file(args.mapfile, profile=profile)
-    if args.sar:
-        print_file_fp(state_machine.memory_map)
-    elif args.sobj:
-        print_objfile_fp(state_machine.memory_map, arfile=args.sobj)
-    elif args.ssym:
-        print_symbol_fp(state_machine.memory_map, lfile=args.ssym)
-    elif args.ssec:
-        print_sectioned_fp(state_machine.memory_map)
-    elif args.uf:
+        profile = get_profile(args.profile)
+    if args.jobs is not None and args.jobs > 1:
+        # Splitting the map only pays with enough CPUs and a large map.
+        jobs = parallel_jobs(mapfile, args.jobs)
+        if jobs > 1:
+            return process_map_file_parallel(mapfile, profile=profile,
+                                             jobs=jobs)
+    sm = process_map_file(mapfile, profile=profile, stats=stats)
+    _print_stats(stats)
+    return sm
+
+
+def _print_stats(stats):
+    if stats is not None:
+        sys.stderr.write(stats.report())
+
+
+def run_report(state_machine, report, arg=None, fmt='table', top=None):
+    # The format and the number of rows only apply to footprint reports.
+    if report == 'sar':
+        print_file_fp(state_machine.memory_map, fmt=fmt, top=top)
+    elif report == 'sobj':
+        print_objfile_fp(state_machine.memory_map, arfile=arg,
+                         fmt=fmt, top=top)
+    elif report == 'ssym':
+        print_symbol_fp(state_machine.memory_map, lfile=arg,
+                        fmt=fmt, top=top)
+    elif report == 'ssec':
+        print_sectioned_fp(state_machine.memory_map, fmt=fmt, top=top)
+    elif report == 'uf':
         ol, al = state_machine.memory_map.used_files
         print_files_list(ol + al)
-    elif args.uarf:
+    elif report == 'uarf':
         print_files_list(state_machine.memory_map.used_arfiles)
-    elif args.uobjf:
+    elif report == 'uobjf':
         print_files_list(state_machine.memory_map.used_objfiles)
-    elif args.usections:
+    elif report == 'usections':
         print_files_list(state_machine.memory_map.used_sections)
-    elif args.uregions:
+    elif report == 'uregions':
         print_files_list(state_machine.memory_map.used_regions)
-    elif args.lfa:
+    elif report == 'lfa':
         print_files_list(state_machine.loaded_files)
-    elif args.la:
+    elif report == 'la':
         print_aliases(state_machine)
-    elif args.lmap:
-        if args.lmap == 'root':
+    elif report == 'lmap':
+        if arg == 'root':
             for node in state_machine.memory_map.top_level_nodes:
                 print(node)
         else:
-            n = state_machine.memory_map.get_node(args.lmap)
+            n = state_machine.memory_map.get_node(arg)
             for node in n.all_nodes():
                 print(node)
-    elif args.lar:
-        for node in state_machine.memory_map.root.all_nodes():
-            if node.arfile == args.lar:
-                print(node)
-    elif args.lobj:
-        for node in state_machine.memory_map.root.all_nodes():
-            if node.objfile == args.lobj:
-                print(node)
-    elif args.addr:
-        for node in state_machine.memory_map.root.all_nodes():
-            if node.contains_address(args.addr):
-                print(node)
+    elif report == 'lar':
+        for node in state_machine.memory_map.arfile_nodes(arg):
+            print(node)
+    elif report == 'lobj':
+        for node in state_machine.memory_map.objfile_nodes(arg):
+            print(node)
+    elif report == 'addr':
+        resolved = state_machine.memory_map.resolve_address(arg)
+        for node in resolved.nodes:
+            print(node)
+    elif report == 'addrs':
+        if arg == '-':
+            print_resolved_addresses(state_machine.memory_map, sys.stdin)
+        elif isinstance(arg, str):
+            with open(arg) as f:
+                print_resolved_addresses(state_machine.memory_map, f)
+        else:
+            print_resolved_addresses(state_machine.memory_map, arg)
+    else:
+        raise ValueError("Unknown report : {0}".format(report))
+
+
+def parse_report_spec(spec):
+    """
+    Parse a single report specification of the form ``REPORT[=ARG]``,
+    where ``REPORT`` is the name of one of the report options without the
+    leading dashes, such as ``sar`` or ``ssym=all``.
+    """
+    report, _, arg = spec.partition('=')
+    if report not in REPORTS:
+        raise ValueError("Unknown report : {0}".format(report))
+    if REPORTS[report] and not arg:
+        raise ValueError("Report {0} needs an argument, as in {0}=ARG"
+                         "".format(report))
+    if not REPORTS[report] and arg:
+        raise ValueError("Report {0} does not take an argument"
+                         "".format(report))
+    return report, arg or None
+
+
+def read_report_spec_file(f):
+    """
+    Read a list of reports from a report spec file. Each line contains a
+    report specification as accepted by ``parse_report_spec``, optionally
+    followed by the file the report should be written to. Reports without
+    an output file are written to stdout. Anything following a ``#`` is
+    ignored.
+    """
+    reports = []
+    for line in f:
+        tokens = line.split('#')[0].split()
+        if not tokens:
+            continue
+        if len(tokens) > 2:
+            raise ValueError("Malformed report spec : {0}"
+                             "".format(line.strip()))
+        report, arg = parse_report_spec(tokens[0])
+        outfile = tokens[1] if len(tokens) > 1 else '-'
+        reports.append((report, arg, outfile))
+    return reports
+
+
+def run_reports(state_machine, reports, fmt='table', top=None):
+    # The aggregates shared by the footprint reports are computed once,
+    # up front, and reused by every report.
+    state_machine.memory_map.footprints
+    for report, arg, outfile in reports:
+        if outfile == '-':
+            run_report(state_machine, report, arg, fmt, top)
+            continue
+        with open(outfile, 'w') as f:
+            with redirect_stdout(f):
+                run_report(state_machine, report, arg, fmt, top)
+
+
+def run_budget(args, state_machine):
+    """
+    Check the map against the budget given with ``--budget``, printing the
+    report as JSON. Returns True if the budget is met.
+    """
+    rules = read_budget_rules(args.budget)
+    report = check_budget(state_machine.memory_map, rules,
+                          strict=args.strict_budget)
+    for rule in report.unmatched:
+        logging.error("Budget rule on line {0} matches nothing : {1}"
+                      "".format(rule.line, rule.text))
+    for violation in report.violations:
+        logging.error("Budget exceeded : {0} {1} is {2} bytes, over the "
+                      "limit of {3} bytes set on line {4}"
+                      "".format(violation.rule.kind, violation.name,
+                                violation.size, violation.limit,
+                                violation.rule.line))
+    result = OrderedDict([('mapfile', args.mapfile[0])])
+    result.update(report.as_dict())
+    print(json.dumps(result, indent=2))
+    return report.passed
+
+
+def run_selected_reports(args, reports, state_machine):
+    if reports:
+        run_reports(state_machine, reports, args.format, args.top)
+        return
+    for report in REPORTS:
+        arg = getattr(args, report)
+        if arg:
+            run_report(state_machine, report, arg, args.format, args.top)
+            break
+
+
+def _render_watch(args, reports, maps, summaries, previous, changed):
+    if sys.stdout.isatty():
+        # Each build replaces the output of the last one.
+        sys.stdout.write('\033[2J\033[H')
+    print("{0} : {1}".format(time.strftime('%H:%M:%S'), ', '.join(changed)))
+    if args.summary:
+        print_batch_summary(list(summaries.values()))
+    else:
+        imap = maps[args.mapfile[0]]
+        if imap.sm is not None:
+            run_selected_reports(args, reports, imap.sm)
+    if previous:
+        print_summary_deltas(previous, summaries)
+    sys.stdout.flush()
+
+
+def watch_map_files(args, reports):
+    """
+    Produce the selected reports every time the map files change, until
+    interrupted. Each map is kept parsed between builds, and only the
+    sections of it which have changed are parsed again.
+    """
+    if args.summary:
+        fnames = expand_map_paths(args.mapfile)
+    else:
+        fnames = args.mapfile[:1]
+    if args.profile == 'auto':
+        profile = 'auto'
+    else:
+        profile = get_profile(args.profile)
+    maps = OrderedDict((fname, IncrementalMap(fname, profile))
+                       for fname in fnames)
+    summaries = OrderedDict()
+    watcher = watch_files(fnames)
+    changed = fnames
+    try:
+        while True:
+            previous = OrderedDict(summaries)
+            for fname in changed:
+                try:
+                    maps[fname].update()
+                except Exception as e:
+                    logging.error("Could not analyze {0} : {1}"
+                                  "".format(fname, e))
+                    summaries[fname] = MapSummary(fname, error='{0}: {1}'
+                                                  ''.format(type(e).__name__,
+                                                            e))
+                    continue
+                summaries[fname] = summarize_map(maps[fname].sm, fname)
+            _render_watch(args, reports, maps, summaries, previous, changed)
+            changed = next(watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def main():
+    parser = _get_parser()
+    args = parser.parse_args()
+    _setup_logging(args.verbose)
+
+    reports = []
+    try:
+        if args.report:
+            for spec, outfile in args.report:
+                reports.append(parse_report_spec(spec) + (outfile,))
+        elif args.report_spec:
+            reports = read_report_spec_file(args.report_spec)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.stats and (args.incremental or args.cache or args.cache_dir or
+                       args.summary or args.watch or
+                       (args.jobs is not None and args.jobs > 1)):
+        parser.error("--stats is only available for a single map file "
+                     "parsed from start to end in one process")
+
+    if args.watch:
+        if '-' in args.mapfile:
+            parser.error("Map files read from stdin cannot be watched")
+        if len(args.mapfile) > 1 and not args.summary:
+            parser.error("Only one map file can be analyzed at a time, "
+                         "except with --summary")
+        watch_map_files(args, reports)
+        return
+
+    if args.diff:
+        if len(args.mapfile) != 2:
+            parser.error("--diff needs exactly two map files, "
+                         "as OLDMAP NEWMAP")
+        if '-' in args.mapfile:
+            parser.error("Map files read from stdin cannot be compared")
+        before, after = [_load_map(args, mapfile)
+                         for mapfile in args.mapfile]
+        print_map_diff(diff_maps(before.memory_map, after.memory_map,
+                                 nodes=False))
+        return
+
+    if args.summary:
+        cache = None
+        if args.cache or args.cache_dir:
+            cache = MapCache(args.cache_dir)
+        summaries = process_map_files(args.mapfile, profile=args.profile,
+                                      jobs=args.jobs, cache=cache)
+        print_batch_summary(summaries)
+        if any(summary.error for summary in summaries):
+            sys.exit(1)
+        return
+
+    if len(args.mapfile) > 1:
+        parser.error("Only one map file can be analyzed at a time, "
+                     "except with --summary")
+
+    state_machine = _load_map(args)
+    if args.history:
+        with FootprintHistory(args.history) as history:
+            history.add_build(state_machine, label=args.label,
+                              mapfile=args.mapfile[0])
+    if args.budget:
+        try:
+            passed = run_budget(args, state_machine)
+        except ValueError as e:
+            parser.error(str(e))
+        if not passed:
+            sys.exit(1)
+        return
+    run_selected_reports(args, reports, state_machine)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Columnar view of a memory map.
+
+Every node of the memory map is a row, and each of its properties is held
+in a column of 64 bit integers rather than in a node object. Strings, such
+as names and file names, are stored once in a string table and referred to
+by their position in it. Missing values are ``MISSING``.
+
+Columns are ``array`` objects, or NumPy arrays if NumPy is installed. NumPy
+is needed to save and load the columns, and makes the group-by sums much
+faster, but is otherwise optional.
+"""
+
+import os
+import json
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .fpv import iter_map_sections
+from .profiles import get_profile
+from .profiles.guess import guess_profile
+
+
+MISSING = -1
+
+COLUMNS = ('parent', 'name', 'address', 'osize', 'fillsize', 'defsize',
+           'region', 'objfile', 'arfile', 'section', 'subsection')
+
+# Columns which hold positions in the string table.
+STRING_COLUMNS = ('name', 'region', 'objfile', 'arfile',
+                  'section', 'subsection')
+
+FORMAT_VERSION = 1
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy is needed to save and load columnar "
+                          "memory maps")
+
+
+def _value(value):
+    return MISSING if value is None else value
+
+
+class ColumnarMemoryMap(object):
+    """
+    Memory map held as flat columns, one row per node in depth first
+    order. ``parent`` is the row of the parent of the node, and
+    ``section`` and ``subsection`` are the gidents of the top level
+    ancestor of the node and of the ancestor just below it, which are the
+    sections the node is counted against by the ``--ssec`` report.
+    """
+    def __init__(self, columns=None, strings=None):
+        if columns is None:
+            columns = OrderedDict((c, array('q')) for c in COLUMNS)
+        self.columns = columns
+        self.strings = strings if strings is not None else []
+        self._string_ids = {s: idx for idx, s in enumerate(self.strings)}
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.columns['parent'])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def string_id(self, value):
+        if value is None:
+            return MISSING
+        try:
+            return self._string_ids[value]
+        except KeyError:
+            self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            return self._string_ids[value]
+
+    def string(self, idx):
+        if idx == MISSING:
+            return None
+        return self.strings[idx]
+
+    def _append_nodes(self, nodes):
+        columns = self.columns
+        rows = self._rows
+        sid = self.string_id
+        section = subsection = MISSING
+        for node in nodes:
+            parent = rows.get(id(node.parent), MISSING)
+            if node.is_toplevelnode:
+                section = sid(node.gident)
+                subsection = MISSING
+            elif not node.is_root and node.parent.is_toplevelnode:
+                subsection = sid(node.gident)
+            rows[id(node)] = len(columns['parent'])
+            columns['parent'].append(parent)
+            columns['name'].append(sid(node.name))
+            columns['address'].append(_value(node._address))
+            columns['osize'].append(_value(node._size))
+            columns['fillsize'].append(_value(node._fillsize))
+            columns['defsize'].append(_value(node._defsize))
+            columns['region'].append(sid(node.region))
+            columns['objfile'].append(sid(node.objfile))
+            columns['arfile'].append(sid(node.arfile))
+            columns['section'].append(MISSING if node.is_root else section)
+            columns['subsection'].append(subsection)
+
+    def _finalize(self):
+        self._rows = {}
+        if numpy is not None:
+            self.columns = OrderedDict(
+                (c, numpy.frombuffer(col, dtype=numpy.int64))
+                for c, col in self.columns.items()
+            )
+        return self
+
+    @classmethod
+    def from_memory_map(cls, memory_map):
+        cmap = cls()
+        root = memory_map.root
+        cmap._append_nodes([root])
+        for tnode in root.children:
+            cmap._append_nodes(tnode.all_nodes())
+        return cmap._finalize()
+
+    @classmethod
+    def from_map_file(cls, fname, profile='auto'):
+        """
+        Build the columnar map directly from the parser. Each top level
+        section is converted as soon as it has been parsed and is then
+        discarded, so the whole memory map is never held as node objects
+        at once.
+        """
+        if profile == 'auto':
+            profile = get_profile(guess_profile(fname))
+        elif profile is None:
+            profile = get_profile('default')
+        cmap = cls()
+        root_added = False
+        with open(fname) as f:
+            for section in iter_map_sections(f, profile=profile, keep=False):
+                if not root_added:
+                    cmap._append_nodes([section.parent])
+                    root_added = True
+                cmap._append_nodes(section.all_nodes())
+        return cmap._finalize()
+
+    def leafsize(self):
+        """
+        The leaf size of every node, with missing sizes counted as 0.
+        """
+        osize = self.columns['osize']
+        fillsize = self.columns['fillsize']
+        if numpy is not None:
+            return numpy.maximum(osize, 0) + numpy.maximum(fillsize, 0)
+        return array('q', (max(o, 0) + max(f, 0)
+                           for o, f in zip(osize, fillsize)))
+
+    def group_sum(self, *keys):
+        """
+        Sum the leaf sizes of the nodes grouped by the given columns.
+        Returns a dict from tuples of column values, with the string
+        columns translated into strings, to the sum of the group. Groups
+        which sum to 0 are left out.
+        """
+        sizes = self.leafsize()
+        cols = [self.columns[k] for k in keys]
+        if numpy is not None and len(sizes):
+            keymat = numpy.stack(cols, axis=1)
+            groups, inverse = numpy.unique(keymat, axis=0,
+                                           return_inverse=True)
+            totals = numpy.zeros(len(groups), dtype=numpy.int64)
+            numpy.add.at(totals, inverse.reshape(-1), sizes)
+            sums = {tuple(int(v) for v in group): int(total)
+                    for group, total in zip(groups, totals) if total}
+        else:
+            sums = {}
+            for row in zip(sizes, *cols):
+                if not row[0]:
+                    continue
+                sums[row[1:]] = sums.get(row[1:], 0) + row[0]
+        return {self._translate(keys, group): total
+                for group, total in sums.items()}
+
+    def _translate(self, keys, group):
+        return tuple(self.string(v) if k in STRING_COLUMNS else v
+                     for k, v in zip(keys, group))
+
+    def region_footprints(self, attr):
+        """
+        Footprints of each value of ``attr`` (one of ``name``,
+        ``objfile`` or ``arfile``), per region, as a dict keyed by
+        ``(value, region)``.
+        """
+        return self.group_sum(attr, 'region')
+
+    def section_footprints(self, attr):
+        """
+        Footprints of each value of ``attr`` per section, as a dict keyed
+        by ``(value, section)``. As in the ``--ssec`` report, each node
+        counts against its top level section and against its subsection.
+        """
+        sums = {}
+        for column in ('section', 'subsection'):
+            for (value, section), total in \
+                    self.group_sum(attr, column).items():
+                if section is None:
+                    continue
+                sums[(value, section)] = sums.get((value, section), 0) + total
+        return sums
+
+    def save(self, path):
+        """
+        Save the columns. A path ending in ``.npz`` is written as a single
+        archive. Any other path is written as a directory holding one
+        ``.npy`` file per column, which can be memory mapped on load.
+        """
+        _require_numpy()
+        arrays = OrderedDict((c, numpy.asarray(col, dtype=numpy.int64))
+                             for c, col in self.columns.items())
+        strings = json.dumps({'version': FORMAT_VERSION,
+                              'strings': self.strings})
+        arrays['strings'] = numpy.frombuffer(strings.encode('utf-8'),
+                                             dtype=numpy.uint8)
+        if path.endswith('.npz'):
+            numpy.savez(path, **arrays)
+            return
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, values in arrays.items():
+            numpy.save(os.path.join(path, name + '.npy'), values)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load columns written by ``save``. Columns saved as a directory of
+        ``.npy`` files are memory mapped with ``mmap_mode``, unless it is
+        None. ``.npz`` archives are always read into memory.
+        """
+        _require_numpy()
+        if path.endswith('.npz'):
+            with numpy.load(path) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+        else:
+            arrays = {}
+            for name in COLUMNS + ('strings',):
+                arrays[name] = numpy.load(
+                    os.path.join(path, name + '.npy'),
+                    mmap_mode=None if name == 'strings' else mmap_mode
+                )
+        header = json.loads(arrays.pop('strings').tobytes().decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError("Unsupported columnar map format : {0}"
+                             "".format(header['version']))
+        columns = OrderedDict((c, arrays[c]) for c in COLUMNS)
+        return cls(columns, header['strings'])
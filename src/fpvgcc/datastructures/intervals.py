@@ -0,0 +1,61 @@
+# Copyright (C) 2015 Quazar Technologies Pvt. Ltd.
+#               2015 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from bisect import bisect_right
+
+
+class IntervalIndex(object):
+    """
+    Static index of half-open intervals ``[start, end)``.
+
+    The boundaries of all the intervals split the number line into
+    elementary segments, and the set of intervals covering each segment
+    is computed once with a sweep when the index is built. Finding every
+    interval which contains a point is then a single bisection.
+
+    Items are reported in the order in which their intervals were
+    provided. Empty intervals are ignored.
+    """
+    def __init__(self, intervals):
+        items = []
+        starts = {}
+        ends = {}
+        for start, end, item in intervals:
+            if end <= start:
+                continue
+            starts.setdefault(start, []).append(len(items))
+            ends.setdefault(end, []).append(len(items))
+            items.append(item)
+        self._bounds = sorted(set(starts) | set(ends))
+        self._segments = []
+        active = set()
+        for bound in self._bounds:
+            active.difference_update(ends.get(bound, ()))
+            active.update(starts.get(bound, ()))
+            self._segments.append(tuple(items[i] for i in sorted(active)))
+        self._count = len(items)
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, point):
+        idx = bisect_right(self._bounds, point) - 1
+        if idx < 0:
+            return ()
+        return self._segments[idx]
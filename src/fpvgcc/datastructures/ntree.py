@@ -19,30 +19,46 @@
 
 
 import logging
-from functools import cached_property, lru_cache
+from functools import lru_cache
 from os.path import commonprefix
 
 
 class NTreeNode(object):
+    # Trees can hold a very large number of nodes, so nodes are slotted
+    # and the type of their children is a class attribute. Subclasses
+    # should declare __slots__ as well.
+    __slots__ = ('parent', 'children', '_tree', '_child_idents',
+                 '_child_disambigs', '_duplicate_idents',
+                 '_unindexed_children')
+    node_t = None
     _leaf_property = None
     _ident_property = None
 
     def __init__(self, parent=None, node_t=None):
+        if node_t is not None and node_t is not self.node_t:
+            raise TypeError("Children of {0} nodes are always {1} nodes"
+                            "".format(type(self).__name__,
+                                      self.node_t.__name__))
         self.parent = parent
-        if node_t is None:
-            if self.parent is not None:
-                node_t = self.parent.node_t
-            else:
-                node_t = NTreeNode
-        self.node_t = node_t
         self.children = []
+        self._tree = None
+        # Children indexed by ident, and the largest disambiguation suffix
+        # in use for each base ident. These are only created once needed,
+        # since most nodes are leaves. Children without an ident property
+        # are identified by their position and cannot be indexed.
+        self._child_idents = None
+        self._child_disambigs = None
+        self._duplicate_idents = None
+        self._unindexed_children = 0
 
-    @cached_property
+    @property
     def tree(self):
-        if isinstance(self.parent, NTree):
-            return self.parent
-        else:
-            return self.parent.tree
+        if self._tree is None:
+            if isinstance(self.parent, NTree):
+                self._tree = self.parent
+            else:
+                self._tree = self.parent.tree
+        return self._tree
 
     @property
     def is_root(self):
@@ -69,13 +85,10 @@ class NTreeNode(object):
     def add_child(self, newchild=None):
         if newchild is None:
             newchild = self.node_t(parent=self, node_t=self.node_t)
-        try:
-            for child in self.children:
-                if child.ident == newchild.ident:
-                    raise ValueError("Child with that identifier already "
-                                     "exists: {0}".format(newchild.ident))
-        except NotImplementedError:
-            pass
+        if newchild.has_ident and self._child_idents and \
+                newchild.ident in self._child_idents:
+            raise ValueError("Child with that identifier already "
+                             "exists: {0}".format(newchild.ident))
         if len(self.children) == 0:
             try:
                 if self._is_leaf_property_set is True:
@@ -85,10 +98,99 @@ class NTreeNode(object):
                     )
             except NotImplementedError:
                 pass
-        newchild.parent = self
-        self.children.append(newchild)
+        self.attach_child(newchild)
+        self._invalidate_tree()
         return newchild
 
+    def attach_child(self, child):
+        """
+        Link a child to this node without checking for duplicates or
+        invalidating the tree. Intended for building trees in bulk, after
+        which the tree should be invalidated once.
+        """
+        child.parent = self
+        self.children.append(child)
+        self._index_child(child)
+        self._children_changed()
+
+    def remove_child(self, child):
+        """
+        Unlink a child from this node. The child retains its reference to
+        this node, so that its ``gident`` remains meaningful.
+        """
+        self.children.remove(child)
+        self._unindex_child(child, child.ident)
+        self._children_changed()
+        self._invalidate_tree()
+
+    def _children_changed(self):
+        # Hook for subclasses which hold data derived from the children
+        # of the node.
+        pass
+
+    def _index_child(self, child):
+        if not child.has_ident:
+            self._unindexed_children += 1
+            return
+        ident = child.ident
+        if self._child_idents is None:
+            self._child_idents = {}
+        if self._child_idents.setdefault(ident, child) is not child:
+            if self._duplicate_idents is None:
+                self._duplicate_idents = set()
+            self._duplicate_idents.add(ident)
+        if ':' in ident:
+            try:
+                name, d = ident.split(':')
+                d = int(d)
+            except ValueError:
+                return
+            if self._child_disambigs is None:
+                self._child_disambigs = {}
+            self._child_disambigs[name] = \
+                max(self._child_disambigs.get(name, 0), d)
+
+    def _unindex_child(self, child, ident):
+        if not child.has_ident:
+            self._unindexed_children -= 1
+            return
+        if not self._child_idents or \
+                self._child_idents.get(ident) is not child:
+            return
+        del self._child_idents[ident]
+        if self._duplicate_idents and ident in self._duplicate_idents:
+            self._duplicate_idents.discard(ident)
+            for other in self.children:
+                if other is not child and other.ident == ident:
+                    self._index_child(other)
+        if ':' in ident and self._child_disambigs:
+            name = ident.split(':')[0]
+            self._child_disambigs.pop(name, None)
+            for other in self.children:
+                if other is not child and other.ident.startswith(name + ':'):
+                    self._index_child(other)
+
+    def _ident_changed(self, old):
+        # Keeps the index of the parent in sync when the ident of an
+        # attached node changes. Nodes which are not attached yet are
+        # indexed when they are.
+        parent = self.parent
+        if not isinstance(parent, NTreeNode) or not parent._child_idents:
+            return
+        if parent._child_idents.get(old) is not self:
+            if not parent._duplicate_idents or \
+                    old not in parent._duplicate_idents or \
+                    self not in parent.children:
+                return
+        parent._unindex_child(self, old)
+        parent._index_child(self)
+
+    def _invalidate_tree(self):
+        # Detached nodes have no tree whose derived data could go stale.
+        if self.parent is None:
+            return
+        self.tree.invalidate()
+
     @property
     def _is_leaf_property_set(self):
         if self._leaf_property is None:
@@ -122,7 +224,10 @@ class NTreeNode(object):
     @ident.setter
     def ident(self, value):
         if self._ident_property:
+            old = self.ident
             setattr(self, self._ident_property, value)
+            self._ident_changed(old)
+            self._invalidate_tree()
 
     @property
     def has_ident(self):
@@ -138,23 +243,25 @@ class NTreeNode(object):
         return rval
 
     def get_child_by_ident(self, ident):
-        for child in self.children:
-            if child.ident == ident:
-                return child
+        try:
+            return self._child_idents[ident]
+        except (KeyError, TypeError):
+            pass
+        if self._unindexed_children:
+            for child in self.children:
+                if child.ident == ident:
+                    return child
         raise ValueError
 
     def get_child_disambig(self, ident, prospective=False):
         disambig = None
-        for child in self.children:
-            if ':' in child.ident:
-                name, d = child.ident.split(':')
-                if name == ident:
-                    disambig = disambig or 0
-                    disambig = max(disambig, int(d))
-            elif prospective and child.ident == ident:
-                # print("Recommending disambig for {0};{1}
-                # ".format(self.gident, ident))
-                disambig = disambig or 0
+        if self._child_disambigs:
+            disambig = self._child_disambigs.get(ident)
+        if disambig is None and prospective and self._child_idents and \
+                ident in self._child_idents:
+            # print("Recommending disambig for {0};{1}
+            # ".format(self.gident, ident))
+            disambig = 0
         return disambig
 
     def get_descendent_by_ident(self, ident):
@@ -188,12 +295,21 @@ class NTreeNode(object):
         return walker
 
 
+NTreeNode.node_t = NTreeNode
+
+
 class NTree(object):
     node_t = NTreeNode
 
     def __init__(self):
         self.root = self.node_t(parent=self, node_t=self.node_t)
 
+    def invalidate(self):
+        # Called whenever the structure of the tree changes. Subclasses
+        # holding data derived from the tree should extend this to discard
+        # it.
+        NTreeNode.all_nodes.cache_clear()
+
     @property
     def top_level_nodes(self):
         return self.root.children
@@ -23,25 +23,54 @@ from .ntree import NTreeNode, NTree
 
 
 class SizeNTreeNode(NTreeNode):
+    __slots__ = ('_subtree_size', '_size_dirty')
+
     def __init__(self, parent=None, node_t=None):
         super(SizeNTreeNode, self).__init__(parent, node_t)
-        self._leafsize = None
+        # The size of the subtree is computed on first access and kept
+        # until the size of a node within it changes. A clean node only
+        # ever has clean descendants, so marking a node dirty can stop at
+        # the first ancestor which already is.
+        self._subtree_size = None
+        self._size_dirty = True
 
     @property
     def size(self):
+        if not self._size_dirty:
+            return self._subtree_size
         rval = 0
         if self.is_leaf:
             rval = self.leafsize
         else:
+            missing = False
             for child in self.children:
                 try:
                     rval += child.size
                 except TypeError:
                     logging.warning("Size information not available for : "
                                     + child.gident)
-                    return "Err"
+                    missing = True
+            if missing:
+                # Left dirty, so that the size is found again once the
+                # missing sizes are set.
+                return "Err"
+        self._subtree_size = rval
+        self._size_dirty = False
         return rval
 
+    def mark_size_dirty(self):
+        """
+        Discard the cached size of this node and of its ancestors. To be
+        called whenever the leaf size of the node changes.
+        """
+        walker = self
+        while isinstance(walker, SizeNTreeNode) and not walker._size_dirty:
+            walker._size_dirty = True
+            walker = walker.parent
+
+    def _children_changed(self):
+        self.mark_size_dirty()
+
     @property
     def leafsize(self):
         raise NotImplementedError
@@ -51,6 +80,9 @@ class SizeNTreeNode(NTreeNode):
         raise NotImplementedError
 
 
+SizeNTreeNode.node_t = SizeNTreeNode
+
+
 class SizeNTree(NTree):
     node_t = SizeNTreeNode
 
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Differences in footprint between two memory maps.
+
+Each map is reduced to totals keyed by region, section, arfile, objfile,
+symbol and node gident, read out of the footprints of the map, which are
+accumulated in a single walk over its tree. The two sets of totals are then
+joined on their keys, so the cost of a diff grows linearly with the size
+of the maps.
+
+Totals only count the nodes which are attributed to a file, and only the
+used regions and sections, as the ``--sar`` and ``--ssec`` reports do.
+Node totals are the leaf sizes of every node of the map, wherever it is.
+"""
+
+from collections import OrderedDict
+
+
+class FootprintDelta(object):
+    __slots__ = ('key', 'before', 'after')
+
+    def __init__(self, key, before, after):
+        self.key = key
+        self.before = before
+        self.after = after
+
+    @property
+    def delta(self):
+        return self.after - self.before
+
+    @property
+    def added(self):
+        return not self.before and bool(self.after)
+
+    @property
+    def removed(self):
+        return bool(self.before) and not self.after
+
+    def __repr__(self):
+        return "<FootprintDelta {0} {1} -> {2} ({3:+d})>".format(
+            self.key, self.before, self.after, self.delta
+        )
+
+
+def _sorted_deltas(before, after, include_unchanged=False):
+    # A hash join of the two sets of totals. Keys missing from one side
+    # count as 0 there.
+    rv = []
+    for key, size in after.items():
+        old = before.get(key, 0)
+        if include_unchanged or size != old:
+            rv.append(FootprintDelta(key, old, size))
+    for key, old in before.items():
+        if key not in after and (include_unchanged or old):
+            rv.append(FootprintDelta(key, old, 0))
+    rv.sort(key=lambda d: (-abs(d.delta), str(d.key)))
+    return rv
+
+
+def _collapse(totals, position):
+    # Sum totals keyed by (value, region) or (value, section) over one of
+    # the two parts of the key. Nodes which are not attributed to any
+    # file are left out.
+    rv = {}
+    for key, size in totals.items():
+        if key[0] is None:
+            continue
+        k = key[position]
+        rv[k] = rv.get(k, 0) + size
+    return rv
+
+
+def node_totals(memory_map):
+    """
+    The leaf size of every node of a memory map which has one, keyed by
+    gident.
+    """
+    rv = {}
+    root = memory_map.root
+    stack = [(node, root.ident + '.' + node.ident)
+             for node in root.children]
+    while stack:
+        node, gident = stack.pop()
+        size = node.leafsize
+        if size:
+            rv[gident] = size
+        stack.extend((child, gident + '.' + child.ident)
+                     for child in node.children)
+    return rv
+
+
+def map_totals(memory_map, nodes=True):
+    """
+    Reduce a memory map to the totals compared by ``diff_maps``, as a
+    dict of dicts keyed by the kind of total.
+    """
+    fp = memory_map.footprints
+    objfile_regions = fp.region_totals('objfile')
+    rv = OrderedDict([
+        ('regions', _collapse(objfile_regions, 1)),
+        ('sections', _collapse(fp.section_totals('objfile'), 1)),
+        ('arfiles', _collapse(fp.region_totals('arfile'), 0)),
+        ('objfiles', _collapse(objfile_regions, 0)),
+        ('symbols', _collapse(fp.region_totals('name'), 0)),
+    ])
+    if nodes:
+        rv['nodes'] = node_totals(memory_map)
+    return rv
+
+
+class MapDiff(object):
+    """
+    The differences in footprint between two memory maps. Each of
+    ``regions``, ``sections``, ``arfiles``, ``objfiles``, ``symbols`` and
+    ``nodes`` is a list of ``FootprintDelta``, sorted by the magnitude of
+    the change.
+    """
+    kinds = ('regions', 'sections', 'arfiles', 'objfiles', 'symbols',
+             'nodes')
+
+    def __init__(self, deltas):
+        for kind in self.kinds:
+            setattr(self, kind, deltas.get(kind, []))
+
+    def items(self):
+        return [(kind, getattr(self, kind)) for kind in self.kinds]
+
+    @property
+    def total(self):
+        return sum(d.delta for d in self.regions)
+
+    def __bool__(self):
+        return any(d.delta for kind, deltas in self.items() for d in deltas)
+
+    def __repr__(self):
+        return "<MapDiff {0}>".format(' '.join(
+            '{0}={1:+d}'.format(d.key, d.delta) for d in self.regions
+        ))
+
+
+def diff_maps(before, after, include_unchanged=False, nodes=True):
+    """
+    Compare two ``GCCMemoryMap`` objects, returning a ``MapDiff``. Totals
+    which are the same in both maps are left out, unless
+    ``include_unchanged`` is set. Node totals are left out altogether if
+    ``nodes`` is False.
+    """
+    old = map_totals(before, nodes)
+    new = map_totals(after, nodes)
+    return MapDiff(OrderedDict(
+        (kind, _sorted_deltas(old[kind], new[kind], include_unchanged))
+        for kind in new
+    ))
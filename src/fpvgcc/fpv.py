@@ -21,19 +21,42 @@ from __future__ import with_statement
 from __future__ import print_function
 from six import iteritems
 
+import io
+import os
 import re
+import mmap
+import stat
+import codecs
 import logging
+import functools
 
-from .gccMemoryMap import GCCMemoryMap, MemoryRegion
+from .gccMemoryMap import GCCMemoryMap, GCCMemoryMapNode, MemoryRegion
 from .profiles import get_profile
-from .profiles.guess import guess_profile
+from .profiles.guess import guess_profile_from_line
+from .profiles.guess import guess_profile_from_buffer
 
 
 class GCCMemoryMapParserSM(object):
-    def __init__(self, ctx):
+    def __init__(self, ctx, stats=None):
         self.ctx = ctx
         self.state = 'START'
 
+        # The expressions and functions which the lines are processed with.
+        # With a ParseStats, they are wrapped to count and time their use
+        # by this parse alone.
+        if stats is None:
+            self.regexes = _parser_regexes
+            self.linkermap_get_newnode = linkermap_get_newnode
+            self.push_to_leaf = GCCMemoryMapNode.push_to_leaf
+        else:
+            self.regexes = ParserRegexes(stats.counting_pattern)
+            self.linkermap_get_newnode = stats.timed(
+                'linkermap_get_newnode', linkermap_get_newnode
+            )
+            self.push_to_leaf = stats.timed(
+                'push_to_leaf', GCCMemoryMapNode.push_to_leaf
+            )
+
         self.IDEP_STATE = 'START'
         self.idep_archive = None
 
@@ -134,8 +157,84 @@ re_linkermap = {
 }
 
 
-def check_line_for_heading(l):
-    for key, regex in iteritems(re_headings):
+# All the headings start with a literal character at the beginning of the
+# line, so only the headings starting with the first character of a line
+# need to be tried against it.
+_re_headings_by_initial = {}
+for _key, _regex in iteritems(re_headings):
+    _re_headings_by_initial.setdefault(_regex.pattern[0], []).append(
+        (_key, _regex)
+    )
+
+
+class ParserRegexes(object):
+    """
+    The expressions used to process the lines of a map file, named as the
+    module level expressions they are. If ``wrap`` is provided, each of
+    them is replaced by ``wrap(name, regex)``. Expressions in
+    ``re_linkermap`` and ``re_headings`` are named by their keys, as in
+    ``re_linkermap.SYMBOL``.
+    """
+    def __init__(self, wrap=None):
+        if wrap is None:
+            def wrap(name, regex):
+                return regex
+        self.re_b1_archive = wrap('re_b1_archive', re_b1_archive)
+        self.re_b1_file = wrap('re_b1_file', re_b1_file)
+        self.re_comsym_normal = wrap('re_comsym_normal', re_comsym_normal)
+        self.re_comsym_nameonly = wrap('re_comsym_nameonly',
+                                       re_comsym_nameonly)
+        self.re_comsym_detailonly = wrap('re_comsym_detailonly',
+                                         re_comsym_detailonly)
+        self.re_memregion = wrap('re_memregion', re_memregion)
+        self.re_linkermap = dict(
+            (key, wrap('re_linkermap.' + key, regex))
+            for key, regex in iteritems(re_linkermap)
+        )
+        self.re_headings_by_initial = dict(
+            (initial, [(key, wrap('re_headings.' + key, regex))
+                       for key, regex in headings])
+            for initial, headings in iteritems(_re_headings_by_initial)
+        )
+
+
+_parser_regexes = ParserRegexes()
+
+
+# All the headings as a single expression over the raw bytes of a map file,
+# to locate them without reading the map line by line. The expression
+# includes the newline preceding the heading, since searching for it is
+# much faster than trying every position for the start of a line.
+re_headings_bytes = re.compile(
+    b'\n(?:' + b'|'.join(
+        b'(?P<' + key.encode() + b'>' + regex.pattern.encode() + b')'
+        for key, regex in iteritems(re_headings)
+    ) + b')'
+)
+
+# Sections of the map which are not used, and need not be read at all.
+_skipped_states = ('IN_DISCARDED_INPUT_SECTIONS',)
+
+
+def find_headings(mapping, start=0, end=None):
+    """
+    Find the headings in the raw bytes of a map file held in a bytes-like
+    object, between ``start``, which should be at the beginning of a
+    line, and ``end``. Yields the offset of each heading along with the
+    state it leads into.
+    """
+    if end is None:
+        end = len(mapping)
+    if start == 0:
+        match = re_headings_bytes.match(b'\n' + mapping[:256])
+        if match:
+            yield 0, match.lastgroup
+    for match in re_headings_bytes.finditer(mapping, max(start - 1, 0), end):
+        yield match.start() + 1, match.lastgroup
+
+
+def check_line_for_heading(l, headings=_re_headings_by_initial):
+    for key, regex in headings.get(l[:1], ()):
         if regex.match(l):
             logging.info("Entering File Region : " + key)
             return key
@@ -177,14 +276,14 @@ class IDLSymbol(object):
 def process_dependencies_line(l, sm):
     # Rough draft. Needs much work to make it usable
     if sm.IDEP_STATE == 'START':
-        res = re_b1_archive.findall(l)
+        res = sm.regexes.re_b1_archive.findall(l)
         if len(res) and len(res[0]) == 5:
             archive = IDLArchive(res[0][1], res[0][1], res[0][4])
             sm.idep_archives.append(archive)
             sm.IDEP_STATE = 'ARCHIVE_DEFINED'
             sm.idep_archive = archive
     if sm.IDEP_STATE == 'ARCHIVE_DEFINED':
-        res = re_b1_file.findall(l)
+        res = sm.regexes.re_b1_file.findall(l)
         if len(res) and len(res[0]) == 5:
             symbol = IDLSymbol(res[0][1], res[0][1], res[0][4])
             sm.idep_symbols.append(symbol)
@@ -210,18 +309,18 @@ class CommonSymbol(object):
 
 def process_common_symbols_line(l, sm):
     if sm.COMSYM_STATE == 'NORMAL':
-        res = re_comsym_normal.findall(l)
+        res = sm.regexes.re_comsym_normal.findall(l)
         if len(res) and len(res[0]) == 5:
             sym = CommonSymbol(res[0][0], res[0][1], res[0][2],
                                res[0][3], res[0][4])
             sm.common_symbols.append(sym)
         else:
-            res = re_comsym_nameonly.findall(l)
+            res = sm.regexes.re_comsym_nameonly.findall(l)
             if len(res) == 1:
                 sm.comsym_name = res[0]
                 sm.COMSYM_STATE = 'GOT_NAME'
     elif sm.COMSYM_STATE == 'GOT_NAME':
-        res = re_comsym_detailonly.findall(l)
+        res = sm.regexes.re_comsym_detailonly.findall(l)
         if len(res) and len(res[0]) == 4:
             sym = CommonSymbol(sm.comsym_name, res[0][0], res[0][1],
                                res[0][2], res[0][3])
@@ -234,16 +333,19 @@ def process_discarded_input_section_line(l, sm):
 
 
 def process_memory_configuration_line(l, sm):
-    res = re_memregion.findall(l)
+    res = sm.regexes.re_memregion.findall(l)
     if len(res) and len(res[0]) == 4:
         region = MemoryRegion(res[0][0], res[0][1], res[0][2], res[0][3])
-        sm.memory_map.memory_regions.append(region)
+        sm.memory_map.add_memory_region(region)
 
 
-def process_linkermap_load_line(l, sm):
-    res = re_linkermap['LOAD'].findall(l)
-    if len(res) and len(res[0]) == 2:
-        sm.loaded_files.append((res[0][0] + res[0][1]).strip())
+def process_linkermap_load_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['LOAD'].match(l)
+    if match:
+        sm.loaded_files.append(
+            ((match.group('filefolder') or '') + match.group('file')).strip()
+        )
 
 
 class LinkerDefnAddr(object):
@@ -258,11 +360,13 @@ class LinkerDefnAddr(object):
         return r
 
 
-def process_linkermap_defn_addr_line(l, sm):
-    res = re_linkermap['DEFN_ADDR'].findall(l)
-    if len(res) and len(res[0]) == 3:
+def process_linkermap_defn_addr_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['DEFN_ADDR'].match(l)
+    if match:
         sm.linker_defined_addresses.append(
-            LinkerDefnAddr(res[0][1], res[0][0], res[0][2])
+            LinkerDefnAddr(match.group('name'), match.group('origin'),
+                           match.group('defn'))
         )
 
 
@@ -300,7 +404,7 @@ def linkermap_get_newnode(name, sm, allow_disambig=True,
             # Push the current node into it's own leaf node. This is enough
             # for most cases.
             try:
-                newnode.push_to_leaf()
+                sm.push_to_leaf(newnode)
             except TypeError:
                 print("Error getting new node : {0}".format(name))
                 raise
@@ -328,28 +432,29 @@ def linkermap_get_newnode(name, sm, allow_disambig=True,
                 newnodepath = "{0}:{1}".format(newnodepath, disambig + 1)
 
             # Get the new child node for what was originally requested
-            newnode = linkermap_get_newnode(
+            newnode = sm.linkermap_get_newnode(
                 newnodepath, sm, allow_disambig=False,
                 objfile=objfile, at_fill=True
             )
     return newnode
 
 
-def process_linkermap_section_headings_line(l, sm):
-    match = re_linkermap['SECTION_HEADINGS'].match(l)
+def process_linkermap_section_headings_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['SECTION_HEADINGS'].match(l)
     name = match.group('name').strip()
     name = linkermap_name_process(name, sm, False)
     if name is None:
         return
     if name == '*fill*':
         print("IN SH")
-    newnode = linkermap_get_newnode(name, sm, True)
+    newnode = sm.linkermap_get_newnode(name, sm, True)
     if match.group('address') is not None:
         newnode.address = match.group('address').strip()
     if match.group('size') is not None:
         newnode.defsize = match.group('size').strip()
         if len(newnode.children) > 0:
-            newnode = newnode.push_to_leaf()
+            newnode = sm.push_to_leaf(newnode)
     if match.group('address') is not None:
         sm.linkermap_section = newnode
         sm.LINKERMAP_STATE = 'IN_SECTION'
@@ -358,8 +463,9 @@ def process_linkermap_section_headings_line(l, sm):
         sm.LINKERMAP_STATE = 'GOT_SECTION_NAME'
 
 
-def process_linkermap_section_heading_detail_line(l, sm):
-    match = re_linkermap['SECTIONDETAIL'].match(l)
+def process_linkermap_section_heading_detail_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['SECTIONDETAIL'].match(l)
     newnode = sm.linkermap_section
     if match:
         if match.group('address') is not None:
@@ -367,16 +473,17 @@ def process_linkermap_section_heading_detail_line(l, sm):
         if match.group('size') is not None:
             newnode.defsize = match.group('size').strip()
             if len(newnode.children) > 0:
-                newnode.push_to_leaf()
+                sm.push_to_leaf(newnode)
     sm.LINKERMAP_STATE = 'IN_SECTION'
 
 
-def process_linkermap_symbol_line(l, sm):
+def process_linkermap_symbol_line(l, sm, match=None):
     if sm.linkermap_symbol is not None:
         logging.warning("Probably Missed Symbol Detail : " +
                         sm.linkermap_symbol)
         sm.linkermap_symbol = None
-    match = re_linkermap['SYMBOL'].match(l)
+    if match is None:
+        match = sm.regexes.re_linkermap['SYMBOL'].match(l)
     name = match.group('name').strip()
     name = linkermap_name_process(name, sm)
     if name is None:
@@ -396,24 +503,20 @@ def process_linkermap_symbol_line(l, sm):
         objfile = match.group('file').strip()
         if match.group('filefolder') is not None:
             arfolder = match.group('filefolder').strip()
-    newnode = linkermap_get_newnode(name, sm, allow_disambig=True,
-                                    objfile=objfile)
-    if arfile is not None:
-        newnode.arfile = arfile
-    if objfile is not None:
-        newnode.objfile = objfile
-    if arfolder is not None:
-        newnode.arfolder = arfolder
+    newnode = sm.linkermap_get_newnode(name, sm, allow_disambig=True,
+                                       objfile=objfile)
+    intern = sm.memory_map.intern
+    newnode.update_files(intern(arfile), intern(objfile), intern(arfolder))
     if match.group('address') is not None:
         newnode.address = match.group('address').strip()
     if match.group('size') is not None:
         newnode.osize = match.group('size').strip()
         if len(newnode.children) > 0:
-            newnode = newnode.push_to_leaf()
+            newnode = sm.push_to_leaf(newnode)
     sm.linkermap_lastsymbol = newnode
 
 
-def process_linkermap_fill_line(l, sm):
+def process_linkermap_fill_line(l, sm, match=None):
     if sm.linkermap_symbol is not None:
         logging.warning("Probably Missed Symbol Detail : "
                         + sm.linkermap_symbol)
@@ -423,17 +526,19 @@ def process_linkermap_fill_line(l, sm):
         logging.warning("Fill Container Unknown : " + l)
         return
 
-    match = re_linkermap['FILL'].match(l)
+    if match is None:
+        match = sm.regexes.re_linkermap['FILL'].match(l)
     if match.group('size') is not None:
         sm.linkermap_lastsymbol.fillsize = int(match.group('size').strip(), 16)
 
 
-def process_linkermap_symbolonly_line(l, sm):
+def process_linkermap_symbolonly_line(l, sm, match=None):
     if sm.linkermap_symbol is not None:
         logging.warning("Probably Missed Symbol Detail : "
                         + sm.linkermap_symbol)
         sm.linkermap_symbol = None
-    match = re_linkermap['SYMBOLONLY'].match(l)
+    if match is None:
+        match = sm.regexes.re_linkermap['SYMBOLONLY'].match(l)
     name = match.group('name').strip()
     name = linkermap_name_process(name, sm)
     if name is None:
@@ -443,8 +548,9 @@ def process_linkermap_symbolonly_line(l, sm):
     sm.linkermap_symbol = name
 
 
-def process_linkermap_section_detail_line(l, sm):
-    match = re_linkermap['SYMBOLDETAIL'].match(l)
+def process_linkermap_section_detail_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['SYMBOLDETAIL'].match(l)
     name = sm.linkermap_symbol
     if name is None:
         return
@@ -460,26 +566,23 @@ def process_linkermap_section_detail_line(l, sm):
         objfile = match.group('file').strip()
         if match.group('filefolder') is not None:
             arfolder = match.group('filefolder').strip()
-    newnode = linkermap_get_newnode(name, sm,
-                                    allow_disambig=True, objfile=objfile)
-    if arfile is not None:
-        newnode.arfile = arfile
-    if objfile is not None:
-        newnode.objfile = objfile
-    if arfolder is not None:
-        newnode.arfolder = arfolder
+    newnode = sm.linkermap_get_newnode(name, sm,
+                                       allow_disambig=True, objfile=objfile)
+    intern = sm.memory_map.intern
+    newnode.update_files(intern(arfile), intern(objfile), intern(arfolder))
     if match.group('address') is not None:
         newnode.address = match.group('address').strip()
     if match.group('size') is not None:
         newnode.osize = match.group('size').strip()
         if len(newnode.children) > 0:
-            newnode = newnode.push_to_leaf()
+            newnode = sm.push_to_leaf(newnode)
     sm.linkermap_lastsymbol = newnode
     sm.linkermap_symbol = None
 
 
-def process_linkaliases_line(l, sm):
-    match = re_linkermap['LINKALIASES'].match(l)
+def process_linkaliases_line(l, sm, match=None):
+    if match is None:
+        match = sm.regexes.re_linkermap['LINKALIASES'].match(l)
     alias_list = match.group(1).split(' ')
     # print alias_list, linkermap_section.gident
     for alias in alias_list:
@@ -499,49 +602,124 @@ def process_linkaliases_line(l, sm):
             logging.warning("Target for alias unknown : " + alias)
 
 
+def classify_linkermap_line(line):
+    """
+    Classify a line from the linker map by its leading characters alone.
+    Each class determines which of the expressions in ``re_linkermap``
+    could possibly match the line.
+    """
+    c = line[:1]
+    if not c.isspace():
+        if c in '._':
+            return 'NAME'
+        if line.startswith('LOAD'):
+            return 'LOAD'
+        return 'OTHER'
+    c = line[1:2]
+    if c.isspace():
+        return 'DETAIL'
+    if c == '*':
+        return 'STAR'
+    if c in '._':
+        # An indented name alone on a line can only be a SYMBOLONLY, and
+        # anything more can only be a SYMBOL.
+        if len(line.split(None, 1)) == 1:
+            return 'SYMNAMEONLY'
+        return 'SYMNAME'
+    if c == '0':
+        return 'ADDR'
+    return 'INDENTED'
+
+
+# Expressions which are to be tried against lines of each class, in order,
+# in each LINKERMAP_STATE. The order within each list is the order in
+# which the expressions have always been tried, and expressions are left
+# out only when they can't match lines of the class. 'SYMBOLDETAIL' is
+# only tried in the IN_SECTION state when a symbol name has been read.
+_linkermap_candidates = {
+    'NORMAL': {
+        'NAME': ('SECTION_HEADINGS',),
+        'LOAD': ('LOAD',),
+        'DETAIL': ('DEFN_ADDR',),
+        'ADDR': ('DEFN_ADDR',),
+    },
+    'IN_SECTION': {
+        'NAME': ('SECTION_HEADINGS',),
+        'DETAIL': ('SYMBOLDETAIL',),
+        'STAR': ('FILL', 'LINKALIASES', 'SYMBOL'),
+        'SYMNAME': ('SYMBOL',),
+        'SYMNAMEONLY': ('SYMBOLONLY',),
+        'ADDR': ('SYMBOL',),
+        'INDENTED': ('SYMBOL',),
+    },
+}
+
+# Lines matching any other expression are not expected outside sections.
+# These are the other expressions which could match lines of each class,
+# in the order in which they have always been tried.
+_linkermap_unexpected = {
+    'NAME': ('SECTIONHEADINGONLY',),
+    'DETAIL': ('SYMBOLDETAIL', 'SECTIONDETAIL'),
+    'STAR': ('SYMBOL', 'FILL', 'LINKALIASES'),
+    'SYMNAME': ('SYMBOL',),
+    'SYMNAMEONLY': ('SYMBOLONLY',),
+    'ADDR': ('SYMBOL',),
+    'INDENTED': ('SYMBOL',),
+}
+
+_linkermap_handlers = {
+    'LOAD': process_linkermap_load_line,
+    'DEFN_ADDR': process_linkermap_defn_addr_line,
+    'SECTION_HEADINGS': process_linkermap_section_headings_line,
+    'SYMBOLDETAIL': process_linkermap_section_detail_line,
+    'FILL': process_linkermap_fill_line,
+    'LINKALIASES': process_linkaliases_line,
+    'SYMBOL': process_linkermap_symbol_line,
+    'SYMBOLONLY': process_linkermap_symbolonly_line,
+}
+
+
+def match_linkermap_line(line, state, symbol_pending=False,
+                         regexes=re_linkermap):
+    """
+    Find the expression from ``regexes``, by default ``re_linkermap``,
+    which should handle a line of the linker map in the given
+    LINKERMAP_STATE. Returns the key of the expression and the match, or
+    ``(None, None)`` if there is none.
+    """
+    candidates = _linkermap_candidates.get(state, {})
+    for key in candidates.get(classify_linkermap_line(line), ()):
+        if key == 'SYMBOLDETAIL' and not symbol_pending:
+            continue
+        match = regexes[key].match(line)
+        if match:
+            return key, match
+    return None, None
+
+
 def process_linkermap_line(l, sm):
     if sm.LINKERMAP_STATE == 'GOT_SECTION_NAME':
         process_linkermap_section_heading_detail_line(l, sm)
+        return None
+    if sm.LINKERMAP_STATE not in _linkermap_candidates:
+        return None
+    key, match = match_linkermap_line(l, sm.LINKERMAP_STATE,
+                                      sm.linkermap_symbol is not None,
+                                      sm.regexes.re_linkermap)
+    if key is not None:
+        _linkermap_handlers[key](l, sm, match)
     elif sm.LINKERMAP_STATE == 'NORMAL':
-        for key, regex in iteritems(re_linkermap):
-            if regex.match(l):
-                if key == 'LOAD':
-                    process_linkermap_load_line(l, sm)
-                    return
-                if key == 'DEFN_ADDR':
-                    process_linkermap_defn_addr_line(l, sm)
-                    return
-                if key == 'SECTION_HEADINGS':
-                    process_linkermap_section_headings_line(l, sm)
-                    return
+        for key in _linkermap_unexpected.get(classify_linkermap_line(l), ()):
+            if sm.regexes.re_linkermap[key].match(l):
                 logging.error(
                     "Unhandled line in linkerm : {0}".format(l.strip()))
-    elif sm.LINKERMAP_STATE == 'IN_SECTION':
-        if sm.linkermap_symbol is not None:
-            if re_linkermap['SYMBOLDETAIL'].match(l):
-                process_linkermap_section_detail_line(l, sm)
-                return
-        if re_linkermap['SECTION_HEADINGS'].match(l):
-            process_linkermap_section_headings_line(l, sm)
-            return
-        if re_linkermap['FILL'].match(l):
-            process_linkermap_fill_line(l, sm)
-            return
-        if re_linkermap['LINKALIASES'].match(l):
-            process_linkaliases_line(l, sm)
-            return
-        if re_linkermap['SYMBOL'].match(l):
-            process_linkermap_symbol_line(l, sm)
-            return
-        if re_linkermap['SYMBOLONLY'].match(l):
-            process_linkermap_symbolonly_line(l, sm)
-            return
+    else:
         logging.warning("Unhandled line in section : {0}".format(l.strip()))
     return None
 
 
-def cleanup_and_pack_map(sm):
-    for node in sm.memory_map.root.all_nodes():
+def pack_nodes(nodes):
+    for node in nodes:
         if len(node.children) > 0:
             logging.warning('Force clearing leaf size for intermediate node'
                             ' : {0}'.format(node.gident))
@@ -549,32 +727,316 @@ def cleanup_and_pack_map(sm):
             node.fillsize = 0
 
 
-def process_map_file(fname, profile=None):
-    if profile is None:
-        profile = get_profile('default')
-    elif profile == 'auto':
-        profile = guess_profile(fname)
-    sm = GCCMemoryMapParserSM(ctx=profile)
-    with open(fname) as f:
-        for line in f:
-            if not line.strip():
-                continue
-            rval = check_line_for_heading(line)
-            if rval is not None:
-                sm.state = rval
+def cleanup_and_pack_map(sm):
+    pack_nodes(sm.memory_map.root.all_nodes())
+    sm.memory_map.assign_regions()
+    sm.memory_map.build_index()
+
+
+def process_map_line(line, sm):
+    if not line.strip():
+        return
+    rval = check_line_for_heading(line, sm.regexes.re_headings_by_initial)
+    if rval is not None:
+        sm.state = rval
+    else:
+        if sm.state == 'IN_DEPENDENCIES':
+            process_dependencies_line(line, sm)
+        elif sm.state == 'IN_COMMON_SYMBOLS':
+            process_common_symbols_line(line, sm)
+        elif sm.state == 'IN_DISCARDED_INPUT_SECTIONS':
+            process_discarded_input_section_line(line, sm)
+        elif sm.state == 'IN_MEMORY_CONFIGURATION':
+            process_memory_configuration_line(line, sm)
+        elif sm.state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+            process_linkermap_line(line, sm)
+
+
+def _instrumented(phase):
+    # Parser methods which collect statistics of their work when the
+    # parser has been given a ParseStats. Otherwise, they run as they are.
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None or self.stats.active:
+                return method(self, *args, **kwargs)
+            with self.stats.instrument(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class GCCMemoryMapParser(object):
+    """
+    Push style parser for GCC map files.
+
+    Map file content is provided with ``feed``, either as an iterable of
+    lines or as chunks of text or bytes which need not end at line
+    boundaries, and ``close`` is called once all of it has been provided.
+    ``close`` returns the parser state machine, whose ``memory_map`` is
+    then complete.
+
+    If ``track_sections`` is set, top level sections of the memory map are
+    completed as soon as the linker map moves on to the next top level
+    section, and can be collected with ``pop_completed_sections`` while
+    parsing is still in progress. Completed sections are packed just as
+    they would be at the end of the parse. If ``keep`` is False, they are
+    also removed from the memory map, so that the memory used by the parser
+    is bounded by the largest section rather than by the whole map.
+
+    With the 'auto' profile, the profile is guessed from the ``OUTPUT``
+    line of the linker map and applied when the parser is closed.
+
+    If a ``ParseStats`` from ``fpvgcc.stats`` is provided as ``stats``,
+    statistics of the work done by the parser are collected into it.
+    """
+    def __init__(self, profile=None, track_sections=False, keep=True,
+                 encoding='utf-8', stats=None):
+        self._auto_profile = profile == 'auto'
+        if profile is None or self._auto_profile:
+            profile = get_profile('default')
+        self.sm = GCCMemoryMapParserSM(ctx=profile, stats=stats)
+        if stats is None:
+            self._process_line = process_map_line
+        else:
+            self._process_line = stats.line_processor(process_map_line)
+        self.track_sections = track_sections or not keep
+        self.keep = keep
+        self.encoding = encoding
+        self.stats = stats
+        self.closed = False
+        self._output_signature = None
+        self._decoder = None
+        self._binary = False
+        self._partial = ''
+        self._last_section = None
+        self._current_section = None
+        self._completed = []
+        # Sections which have been completed, by id. The sections are held
+        # here as well, so that their ids cannot be reused while they are
+        # tracked. Detached sections are not tracked, since any later
+        # content for them goes into a new node anyway.
+        self._packed = {}
+        self._packed_any = False
+
+    @_instrumented('read')
+    def feed(self, data):
+        if self.closed:
+            raise ValueError("Parser is already closed")
+        if isinstance(data, (str, bytes)):
+            self._feed_text(data)
+        else:
+            for line in data:
+                if isinstance(line, bytes):
+                    self._feed_text(line)
+                else:
+                    self._feed_line(line)
+
+    def _feed_text(self, data, final=False):
+        if self._decoder is None:
+            self._binary = not isinstance(data, str)
+            if self._binary:
+                decoder = codecs.getincrementaldecoder(self.encoding)()
             else:
-                if sm.state == 'IN_DEPENDENCIES':
-                    process_dependencies_line(line, sm)
-                elif sm.state == 'IN_COMMON_SYMBOLS':
-                    process_common_symbols_line(line, sm)
-                elif sm.state == 'IN_DISCARDED_INPUT_SECTIONS':
-                    process_discarded_input_section_line(line, sm)
-                elif sm.state == 'IN_MEMORY_CONFIGURATION':
-                    process_memory_configuration_line(line, sm)
-                elif sm.state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
-                    process_linkermap_line(line, sm)
-    cleanup_and_pack_map(sm)
-    return sm
+                decoder = None
+            self._decoder = io.IncrementalNewlineDecoder(decoder, True)
+        lines = (self._partial +
+                 self._decoder.decode(data, final=final)).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._feed_line(line + '\n')
+
+    @_instrumented('read')
+    def feed_mapping(self, mapping, start=0, end=None):
+        """
+        Parse the content of a complete map file held in a bytes-like
+        object, typically an mmap of the file. If ``start`` and ``end``
+        are provided, only that part of the mapping is parsed. Both
+        should be at the beginning of a line.
+
+        The headings of the map are located directly in the mapping.
+        Sections of the map which are not used are skipped without being
+        decoded, and the rest are decoded one section at a time.
+        """
+        if self.closed:
+            raise ValueError("Parser is already closed")
+        if end is None:
+            end = len(mapping)
+        blocks = [start]
+        skipped = set()
+        for offset, state in find_headings(mapping, start, end):
+            blocks.append(offset)
+            if state in _skipped_states:
+                skipped.add(offset)
+        blocks.append(end)
+        with memoryview(mapping) as view:
+            for start, end in zip(blocks[:-1], blocks[1:]):
+                if start in skipped:
+                    # Only the heading itself, to enter the section.
+                    end = min(mapping.find(b'\n', start) + 1 or end, end)
+                with view[start:end] as chunk:
+                    self._feed_text(chunk)
+
+    def _feed_line(self, line):
+        sm = self.sm
+        self._process_line(line, sm)
+        if self._auto_profile and line.startswith('OUTPUT('):
+            self._output_signature = guess_profile_from_line(line)
+        if not self.track_sections:
+            return
+        if sm.state != 'IN_LINKER_SCRIPT_AND_MEMMAP':
+            if self._current_section is not None:
+                self._complete_section()
+            return
+        if sm.linkermap_section is not self._last_section:
+            self._last_section = sm.linkermap_section
+            section = sm.linkermap_section
+            if not section.is_toplevelnode:
+                section = section.get_top_level_ancestor
+            if section is not self._current_section:
+                if self._current_section is not None:
+                    self._complete_section()
+                self._current_section = section
+
+    def _complete_section(self):
+        section = self._current_section
+        self._current_section = None
+        if id(section) in self._packed:
+            # Later blocks of the map added to a section which has already
+            # been completed. Pack whatever they added, but do not report
+            # the section again.
+            pack_nodes(node for node in section.all_nodes()
+                       if node.children and (node.osize or node.fillsize))
+            return
+        pack_nodes(section.all_nodes())
+        self._packed_any = True
+        if self.keep:
+            self._packed[id(section)] = section
+        else:
+            section.parent.remove_child(section)
+        self._completed.append(section)
+
+    def pop_completed_sections(self):
+        completed = self._completed
+        self._completed = []
+        return completed
+
+    @_instrumented('read')
+    def flush(self):
+        """
+        Process whatever has been fed but is still held back, such as a
+        last line without a newline, without closing the parser.
+        """
+        if self._decoder is not None:
+            self._feed_text(b'' if self._binary else '', final=True)
+            self._decoder = None
+        if self._partial:
+            self._feed_line(self._partial)
+            self._partial = ''
+
+    @_instrumented('close')
+    def close(self):
+        if self.closed:
+            return self.sm
+        self.flush()
+        if self._current_section is not None:
+            self._complete_section()
+        self.closed = True
+        if self._auto_profile:
+            self._apply_profile(get_profile(self._output_signature))
+        mm = self.sm.memory_map
+        if not self._packed_any:
+            cleanup_and_pack_map(self.sm)
+        else:
+            pack_nodes([mm.root])
+            for node in mm.top_level_nodes:
+                if id(node) not in self._packed:
+                    pack_nodes(node.all_nodes())
+            mm.assign_regions()
+            mm.build_index()
+        if self.stats is not None:
+            self.stats.record_map(mm)
+        return self.sm
+
+    def _apply_profile(self, profile):
+        self.sm.ctx = profile
+        self.sm.memory_map.ctx = profile
+        # Nodes resolve their profile and region lazily, and could have
+        # done so with the default profile before the guess was made.
+        for node in self.sm.memory_map.root.all_nodes():
+            node.invalidate_context()
+        self.sm.memory_map.invalidate_regions()
+
+    @_instrumented('read')
+    def _feed_until_completed(self, lines):
+        # Feed lines from the iterator until a section is completed.
+        # Returns False once the lines are exhausted.
+        for line in lines:
+            self.feed((line,))
+            if self._completed:
+                return True
+        return False
+
+    def iter_sections(self, lines):
+        """
+        Parse the provided lines, yielding each top level section of the
+        memory map as soon as it is completed. The parser is closed once
+        the lines are exhausted.
+        """
+        self.track_sections = True
+        lines = iter(lines)
+        while self._feed_until_completed(lines):
+            for section in self.pop_completed_sections():
+                yield section
+        self.close()
+        for section in self.pop_completed_sections():
+            yield section
+
+
+def iter_map_sections(lines, profile=None, keep=True):
+    parser = GCCMemoryMapParser(profile, track_sections=True, keep=keep)
+    for section in parser.iter_sections(lines):
+        yield section
+
+
+def map_file(f):
+    """
+    Map the open file ``f`` for reading. Returns the mmap, ``b''`` if the
+    file is empty, or None if the file cannot be mapped, as with pipes and
+    FIFOs, in which case it has to be read as a stream instead.
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        st = os.fstat(f.fileno())
+        if stat.S_ISREG(st.st_mode) and not st.st_size:
+            # Empty files cannot be mapped.
+            return b''
+        return None
+
+
+def process_map_file(fname, profile=None, stats=None):
+    with open(fname, 'rb') as f:
+        mapping = map_file(f)
+        if mapping is None:
+            # With the 'auto' profile, the parser picks the profile from
+            # the OUTPUT line once it is done.
+            parser = GCCMemoryMapParser(profile, stats=stats)
+            parser.feed(f)
+            return parser.close()
+        try:
+            if profile is None:
+                profile = get_profile('default')
+            elif profile == 'auto':
+                profile = get_profile(
+                    guess_profile_from_buffer(mapping) or 'default'
+                )
+            parser = GCCMemoryMapParser(profile, stats=stats)
+            parser.feed_mapping(mapping)
+        finally:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+    return parser.close()
 
 
 if __name__ == '__main__':
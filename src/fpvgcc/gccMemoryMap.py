@@ -22,11 +22,19 @@ import logging
 from functools import cached_property
 
 from fpvgcc.datastructures.ntreeSize import SizeNTree, SizeNTreeNode
+from fpvgcc.query import MapQuery
+from fpvgcc.datastructures.intervals import IntervalIndex
 
 
 class LinkAliases(object):
+    # Aliases are also held in a character trie, in which each node is a
+    # dict of the next characters, with the target of an alias ending at
+    # the node under the _TARGET key.
+    _TARGET = None
+
     def __init__(self):
         self._aliases = {}
+        self._trie = {}
 
     def register_alias(self, target, alias):
         if alias in self._aliases.keys():
@@ -35,14 +43,38 @@ class LinkAliases(object):
                                 "".format(alias, target, self._aliases[alias]))
         else:
             self._aliases[alias] = target
+            node = self._trie
+            for c in alias:
+                node = node.setdefault(c, {})
+            node[self._TARGET] = target
+
+    def items(self):
+        return list(self._aliases.items())
+
+    def match(self, name):
+        """
+        Return the longest registered alias which is a prefix of name,
+        and its target, or (None, None) if there is none.
+        """
+        node = self._trie
+        alias = target = None
+        if self._TARGET in node:
+            alias, target = '', node[self._TARGET]
+        for idx, c in enumerate(name):
+            node = node.get(c)
+            if node is None:
+                break
+            if self._TARGET in node:
+                alias, target = name[:idx + 1], node[self._TARGET]
+        return alias, target
 
     def encode(self, name):
-        for key in self._aliases.keys():
-            if name.startswith(key):
-                # if alias.startswith(linkermap_section.gident):
-                # alias = alias[len(linkermap_section.gident):]
-                return self._aliases[key] + name
-        return name
+        # if alias.startswith(linkermap_section.gident):
+        # alias = alias[len(linkermap_section.gident):]
+        alias, target = self.match(name)
+        if alias is None:
+            return name
+        return target + name
 
     def __repr__(self):
         return '\n'.join(["{0:>38} -> {1:<38}".format(a, t)
@@ -51,6 +83,8 @@ class LinkAliases(object):
 
 
 class GCCMemoryMapNode(SizeNTreeNode):
+    __slots__ = ('_name', '_address', '_defsize', '_size', '_fillsize',
+                 '_arfile', '_objfile', '_arfolder', '_ctx', '_region')
     _leaf_property = '_size'
     _ident_property = 'name'
 
@@ -58,6 +92,8 @@ class GCCMemoryMapNode(SizeNTreeNode):
                  name=None, address=None, size=None, fillsize=None,
                  arfile=None, objfile=None, arfolder=None):
         super(GCCMemoryMapNode, self).__init__(parent, node_t)
+        self._ctx = None
+        self._region = None
         self._size = None
         if name is None:
             if objfile is not None:
@@ -73,15 +109,89 @@ class GCCMemoryMapNode(SizeNTreeNode):
             self._defsize = int(size, 16)
         else:
             self._defsize = None
-        self.arfolder = arfolder
-        self.arfile = arfile
-        self.objfile = objfile
+        self._arfolder = arfolder
+        self._arfile = arfile
+        self._objfile = objfile
         self._fillsize = None
         self.fillsize = fillsize
 
-    @cached_property
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        old = getattr(self, '_name', None)
+        self._name = value
+        self._ident_changed(old)
+        if old is not None:
+            self.invalidate_region()
+        if value != old:
+            self._invalidate_tree()
+
+    def _set_file(self, slot, value):
+        # The files of the nodes are indexed, and determine which footprints
+        # the nodes are counted in.
+        old = getattr(self, slot)
+        setattr(self, slot, value)
+        if value != old:
+            self._invalidate_tree()
+
+    def update_files(self, arfile=None, objfile=None, arfolder=None):
+        """
+        Set those of the files of the node which are not None, invalidating
+        the tree once rather than for each of them.
+        """
+        changed = False
+        if arfile is not None and arfile != self._arfile:
+            self._arfile = arfile
+            changed = True
+        if objfile is not None and objfile != self._objfile:
+            self._objfile = objfile
+            changed = True
+        if arfolder is not None and arfolder != self._arfolder:
+            self._arfolder = arfolder
+            changed = True
+        if changed:
+            self._invalidate_tree()
+
+    @property
+    def objfile(self):
+        return self._objfile
+
+    @objfile.setter
+    def objfile(self, value):
+        self._set_file('_objfile', value)
+
+    @property
+    def arfile(self):
+        return self._arfile
+
+    @arfile.setter
+    def arfile(self, value):
+        self._set_file('_arfile', value)
+
+    @property
+    def arfolder(self):
+        return self._arfolder
+
+    @arfolder.setter
+    def arfolder(self, value):
+        self._set_file('_arfolder', value)
+
+    @property
     def ctx(self):
-        return self.parent.ctx
+        if self._ctx is None:
+            self._ctx = self.parent.ctx
+        return self._ctx
+
+    def invalidate_context(self):
+        # The tree, profile and region are resolved on first use and kept.
+        # They need to be resolved again if the profile of the map changes,
+        # or if the node is moved into another map.
+        self._tree = None
+        self._ctx = None
+        self._region = None
 
     @property
     def address(self):
@@ -93,15 +203,26 @@ class GCCMemoryMapNode(SizeNTreeNode):
     @address.setter
     def address(self, value):
         self._address = int(value, 16)
+        self.invalidate_region()
+        self._invalidate_tree()
 
     def contains_address(self, addr):
-        if not self.address or self.region in ['DISCARDED', 'UNDEF']:
+        if self._address is None or self.region in ['DISCARDED', 'UNDEF']:
             return False
-        if int(self.address, 0) <= int(addr, 0) < \
-                (int(self.address, 0) + self.size):
+        if not isinstance(addr, int):
+            addr = int(addr, 0)
+        if self._address <= addr < (self._address + self.size):
             return True
         return False
 
+    @property
+    def is_placed(self):
+        # Whether the node occupies an address range in a real region.
+        if self._address is None or self.region in ['DISCARDED', 'UNDEF']:
+            return False
+        size = self.size
+        return isinstance(size, int) and size > 0
+
     @property
     def defsize(self):
         return self._defsize
@@ -130,6 +251,8 @@ class GCCMemoryMapNode(SizeNTreeNode):
                 logging.warning("Possibly missing leaf node "
                                 "with same name : {0}".format(self.gident))
         self._size = newsize
+        self.mark_size_dirty()
+        self._invalidate_tree()
 
     @property
     def fillsize(self):
@@ -144,6 +267,8 @@ class GCCMemoryMapNode(SizeNTreeNode):
                 self._fillsize = int(value)
         else:
             self._fillsize = 0
+        self.mark_size_dirty()
+        self._invalidate_tree()
 
     def add_child(self, newchild=None, name=None,
                   address=None, size=None, fillsize=0,
@@ -162,10 +287,12 @@ class GCCMemoryMapNode(SizeNTreeNode):
             logging.warning("No objfile defined. Can't push to leaf : "
                             "{0}".format(self.gident))
             return self
-        for child in self.children:
-            # TODO This probably discards data which could be preserved
-            if child.name == self.objfile.replace('.', '_'):
-                return self
+        # TODO This probably discards data which could be preserved
+        try:
+            self.get_child_by_ident(self.objfile.replace('.', '_'))
+            return self
+        except ValueError:
+            pass
         newleaf = self.add_child(name=self.objfile.replace('.', '_'))
         if self._defsize is not None:
             newleaf.defsize = hex(self._defsize)
@@ -173,22 +300,18 @@ class GCCMemoryMapNode(SizeNTreeNode):
             newleaf.address = hex(self._address)
         if self.fillsize is not None:
             newleaf.fillsize = self.fillsize
-        if self.objfile is not None:
-            newleaf.objfile = self.objfile
-        if self.arfile is not None:
-            newleaf.arfile = self.arfile
-        if self.arfolder is not None:
-            newleaf.arfolder = self.arfolder
+        newleaf.update_files(self.arfile, self.objfile, self.arfolder)
         newleaf.osize = hex(self._size)
 
         self._size = None
         self._defsize = None
         if not self.is_toplevelnode:
             self._address = None
+        self._objfile = None
+        self._arfile = None
+        self._arfolder = None
+        # Invalidates the tree for all of the above.
         self.fillsize = None
-        self.objfile = None
-        self.arfile = None
-        self.arfolder = None
 
         return newleaf
 
@@ -205,26 +328,34 @@ class GCCMemoryMapNode(SizeNTreeNode):
     def leafsize(self, value):
         raise AttributeError
 
-    @cached_property
+    @property
     def region(self):
-        ctx = self.ctx
-        if not isinstance(self.parent, GCCMemoryMap) and \
-                self.parent.region == 'DISCARDED':
-            return 'DISCARDED'
-        # Suppressed root identifiers for MSP430 GCC. A better mechanism to
-        # provide user access to manipulate this set is needed.
-        if ctx and self.name in ctx.suppressed_names:
-            return 'DISCARDED'
-        if self._address is None:
-            return 'UNDEF'
-        if self._address == 0:
-            return "DISCARDED"
-        for region in self.tree.memory_regions:
-            if self._address in region:
-                if region.name in ctx.suppressed_regions:
-                    return 'DISCARDED'
-                return region.name
-        raise ValueError(self._address)
+        # Regions are normally assigned to every node in bulk once the map
+        # is parsed, by GCCMemoryMap.assign_regions. Nodes which have
+        # changed since are resolved individually.
+        if self._region is None:
+            if isinstance(self.parent, GCCMemoryMap):
+                parent_region = None
+            else:
+                parent_region = self.parent.region
+            self._region = self.tree.region_resolver.resolve(
+                self, parent_region
+            )
+        return self._region
+
+    def invalidate_region(self):
+        # The region of a node depends on its name and address, and on
+        # the region of its parent.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._region = None
+            stack.extend(node.children)
+
+    def attach_child(self, child):
+        super(GCCMemoryMapNode, self).attach_child(child)
+        if child._region is not None:
+            child.invalidate_region()
 
     @property
     def is_leaf_property_set(self):
@@ -238,11 +369,62 @@ class GCCMemoryMapNode(SizeNTreeNode):
         return r
 
 
+GCCMemoryMapNode.node_t = GCCMemoryMapNode
+
+
+class RegionResolver(object):
+    """
+    Assigns memory map nodes to memory regions.
+
+    Built once from the memory regions of the map and the suppressions of
+    the profile. Regions are found by bisecting their sorted boundaries,
+    and suppressed names and regions are held as frozensets. Changes to
+    either after the resolver is built are not seen by it.
+    """
+    def __init__(self, memory_regions, ctx):
+        if ctx is None:
+            self.suppressed_names = frozenset()
+            self.suppressed_regions = frozenset()
+        else:
+            self.suppressed_names = frozenset(ctx.suppressed_names)
+            self.suppressed_regions = frozenset(ctx.suppressed_regions)
+        self._index = IntervalIndex(
+            (region.origin, region.origin + region.size, region)
+            for region in memory_regions
+        )
+
+    def region_at(self, address):
+        regions = self._index.lookup(address)
+        if not regions:
+            raise ValueError(address)
+        # Where regions overlap, the first one declared wins.
+        name = regions[0].name
+        if name in self.suppressed_regions:
+            return 'DISCARDED'
+        return name
+
+    def resolve(self, node, parent_region=None):
+        if parent_region == 'DISCARDED':
+            return 'DISCARDED'
+        # Suppressed root identifiers for MSP430 GCC. A better mechanism to
+        # provide user access to manipulate this set is needed.
+        if node.name in self.suppressed_names:
+            return 'DISCARDED'
+        if node._address is None:
+            return 'UNDEF'
+        if node._address == 0:
+            return "DISCARDED"
+        return self.region_at(node._address)
+
+
 class GCCMemoryMap(SizeNTree):
     # This really needs to be cleaned up. Most of the code here is pretty
     # much an example of what NOT to do.
     node_t = GCCMemoryMapNode
     collapse_vectors = True
+    # Data derived from the tree, discarded whenever the tree changes.
+    _derived = frozenset(('index', 'query_cache', 'address_index',
+                          'region_address_index', 'footprints'))
 
     def __init__(self, ctx):
         self.ctx = ctx
@@ -250,16 +432,127 @@ class GCCMemoryMap(SizeNTree):
         self._vector_regions = []
         self._vector_sections = []
         self.aliases = LinkAliases()
+        self._strings = {}
         super(GCCMemoryMap, self).__init__()
 
+    def intern(self, value):
+        # Archive, object file and folder names are shared by a great many
+        # nodes, and are stored once per map rather than once per node.
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def add_memory_region(self, region):
+        self.memory_regions.append(region)
+        self.invalidate_regions()
+
+    @cached_property
+    def region_resolver(self):
+        return RegionResolver(self.memory_regions, self.ctx)
+
+    def assign_regions(self, node=None):
+        """
+        Assign every node to its region in a single walk over the tree, or
+        over the subtree of ``node`` if one is provided.
+        """
+        resolver = self.region_resolver
+        if node is None:
+            node = self.root
+        if node.is_root:
+            node._region = resolver.resolve(node)
+        else:
+            node._region = resolver.resolve(node, node.parent.region)
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            region = node._region
+            for child in node.children:
+                child._region = resolver.resolve(child, region)
+            stack.extend(node.children)
+
+    def invalidate_regions(self):
+        # To be called when the memory regions or the profile change.
+        self.__dict__.pop('region_resolver', None)
+        self.__dict__.pop('region_address_index', None)
+        self.root.invalidate_region()
+        self.invalidate()
+
+    @cached_property
+    def footprints(self):
+        return MemoryMapFootprints(self)
+
+    def invalidate_footprints(self):
+        self.__dict__.pop('footprints', None)
+
+    @cached_property
+    def index(self):
+        return MemoryMapIndex(self)
+
+    def build_index(self):
+        return self.index
+
+    @cached_property
+    def query_cache(self):
+        return {}
+
+    def query(self, group_by=None, where=None, order_by='size', limit=None):
+        """
+        Query the footprint of the nodes of the map, as described by
+        ``MapQuery``. The query is evaluated when its rows are first used,
+        and the result is kept until the tree changes.
+        """
+        return MapQuery(self, group_by, where, order_by, limit)
+
+    def invalidate(self):
+        super(GCCMemoryMap, self).invalidate()
+        # Called for every change to the tree, which while the map is being
+        # parsed is almost always with nothing to discard.
+        if self._derived.isdisjoint(self.__dict__):
+            return
+        self.__dict__.pop('index', None)
+        self.__dict__.pop('query_cache', None)
+        self.__dict__.pop('address_index', None)
+        self.__dict__.pop('region_address_index', None)
+        self.invalidate_footprints()
+
+    @cached_property
+    def address_index(self):
+        return IntervalIndex(
+            (node._address, node._address + node.size, node)
+            for node in self.index.all_nodes if node.is_placed
+        )
+
+    @cached_property
+    def region_address_index(self):
+        return IntervalIndex(
+            (region.origin, region.origin + region.size, region)
+            for region in self.memory_regions
+            if region.name not in self.ctx.suppressed_regions
+        )
+
+    def resolve_address(self, address):
+        if not isinstance(address, int):
+            address = int(address, 0)
+        return ResolvedAddress(
+            address,
+            self.region_address_index.lookup(address),
+            self.address_index.lookup(address)
+        )
+
+    def resolve_addresses(self, addresses):
+        for address in addresses:
+            yield self.resolve_address(address)
+
     @property
     def used_regions(self):
+        return list(self.footprints.used_regions)
+
+    def _find_used_regions(self):
         ur = ['UNDEF']
         if self.collapse_vectors:
             self._vector_regions = []
             ur.append('VEC')
-        for node in self.root.all_nodes():
-            region = node.region
+        for region in self.index.values('region'):
             if region not in ur:
                 if self.collapse_vectors:
                     if 'VEC' not in region:
@@ -272,75 +565,63 @@ class GCCMemoryMap(SizeNTree):
         ur.remove('DISCARDED')
         return ur
 
-    @property
-    def used_objfiles(self):
-        of = []
-        for node in self.root.all_nodes():
+    def _warn_unaccounted(self, nodes):
+        # Returns the number of nodes which occupy memory without being
+        # attributable to a file.
+        count = 0
+        for node in nodes:
             region = node.region
-            if node.objfile is None and node.leafsize \
-                    and region not in ['DISCARDED', 'UNDEF']:
+            if node.leafsize and region not in ['DISCARDED', 'UNDEF']:
                 logging.warning(
                     "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
                     "".format(node.gident, region, str(node.leafsize))
                 )
-                continue
-            if node.objfile not in of:
-                of.append(node.objfile)
-        return of
+                count += 1
+        return count
+
+    def _used_values(self, attr):
+        rv = []
+        for value in self.index.values(attr):
+            if value is None:
+                nodes = self.index.nodes(attr, None)
+                if self._warn_unaccounted(nodes) == len(nodes):
+                    continue
+            rv.append(value)
+        return rv
+
+    @property
+    def used_objfiles(self):
+        return self._used_values('objfile')
 
     def arfile_objfiles(self, arfile):
-        of = []
-        for node in self.root.all_nodes():
+        of = {}
+        for node in self.index.nodes('arfile', arfile):
             if node.leafsize and node.region not in ['DISCARDED', 'UNDEF']:
                 continue
-            if node.arfile == arfile and node.objfile not in of:
-                of.append(node.objfile)
-        return of
+            of[node.objfile] = None
+        return list(of)
 
     @property
     def used_arfiles(self):
-        af = []
-        for node in self.root.all_nodes():
-            region = node.region
-            if node.arfile is None and node.leafsize \
-                    and region not in ['DISCARDED', 'UNDEF']:
-                logging.warning(
-                    "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
-                    "".format(node.gident, region, str(node.leafsize))
-                )
-                continue
-            if node.arfile not in af:
-                af.append(node.arfile)
-        return af
+        return self._used_values('arfile')
 
     @property
     def used_files(self):
-        af = []
-        of = []
-        for node in self.root.all_nodes():
-            region = node.region
-            if node.arfile is None and node.leafsize \
-                    and region not in ['DISCARDED', 'UNDEF']:
-                if node.objfile is None and node.leafsize \
-                        and region not in ['DISCARDED', 'UNDEF']:
-                    logging.warning(
-                        "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
-                        "".format(node.gident, region, str(node.leafsize))
-                    )
-                    continue
+        of = {}
+        for node in self.index.nodes('arfile', None):
+            if node.leafsize and node.region not in ['DISCARDED', 'UNDEF']:
+                if node.objfile is None:
+                    self._warn_unaccounted([node])
                 else:
-                    if node.objfile not in of:
-                        of.append(node.objfile)
-            if node.arfile not in af:
-                af.append(node.arfile)
-        if None in af:
-            af.remove(None)
-        if None in of:
-            of.remove(None)
-        return of, af
+                    of[node.objfile] = None
+        af = [x for x in self.index.values('arfile') if x is not None]
+        return list(of), af
 
     @property
     def used_sections(self):
+        return list(self.footprints.used_sections)
+
+    def _find_used_sections(self):
         sections = [node.gident for node in self.top_level_nodes
                     if node.size > 0 and
                     node.region not in ['DISCARDED', 'UNDEF']]
@@ -355,147 +636,231 @@ class GCCMemoryMap(SizeNTree):
 
     @property
     def all_symbols(self):
-        asym = []
-        for node in self.root.all_nodes():
-            if node.name not in asym:
-                asym.append(node.name)
-        return asym
+        return self.index.values('name')
 
     def symbols_from_file(self, lfile):
-        fsym = []
-        for node in self.root.all_nodes():
-            if node.name not in fsym and lfile in [node.objfile, node.arfile]:
-                fsym.append(node.name)
-        return fsym
+        positions = set(self.index.positions('objfile', lfile))
+        positions.update(self.index.positions('arfile', lfile))
+        nodes = self.index.nodes_at(sorted(positions))
+        return list({node.name: None for node in nodes})
+
+    def objfile_nodes(self, objfile):
+        return self.index.nodes('objfile', objfile)
+
+    def arfile_nodes(self, arfile):
+        return self.index.nodes('arfile', arfile)
+
+    def symbol_nodes(self, symbol):
+        return self.index.nodes('name', symbol)
+
+    def region_nodes(self, region):
+        return self.index.nodes('region', region)
 
     def get_symbol_fp(self, symbol):
-        r = []
-        for rgn in self.used_regions:
-            r.append(self.get_symbol_fp_rgn(symbol, rgn))
-        return r
+        return self.footprints.region_fps('name', symbol)
 
     def get_symbol_fp_rgn(self, symbol, region):
-        if self.collapse_vectors and region == "VEC":
-            return self.get_symbol_fp_rgnvec(symbol)
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.name == symbol:
-                if node.region == region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.region_fp('name', symbol, region)
 
     def get_symbol_fp_rgnvec(self, symbol):
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.name == symbol:
-                if 'VEC' in node.region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.vector_fp('name', symbol)
 
     def get_objfile_fp(self, objfile):
-        r = []
-        for rgn in self.used_regions:
-            r.append(self.get_objfile_fp_rgn(objfile, rgn))
-        return r
+        return self.footprints.region_fps('objfile', objfile)
 
     def get_objfile_fp_rgn(self, objfile, region):
-        if self.collapse_vectors and region == "VEC":
-            return self.get_objfile_fp_rgnvec(objfile)
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.objfile == objfile:
-                if node.region == region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.region_fp('objfile', objfile, region)
 
     def get_objfile_fp_rgnvec(self, objfile):
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.objfile == objfile:
-                if 'VEC' in node.region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.vector_fp('objfile', objfile)
 
     def get_objfile_fp_secs(self, objfile):
-        r = []
-        for section in self.used_sections:
-            r.append(self.get_objfile_fp_sec(objfile, section))
-        return r
+        return self.footprints.section_fps('objfile', objfile)
 
     def get_arfile_fp_secs(self, arfile):
-        r = []
-        for section in self.used_sections:
-            r.append(self.get_arfile_fp_sec(arfile, section))
-        return r
+        return self.footprints.section_fps('arfile', arfile)
 
     def get_objfile_fp_sec(self, objfile, section):
-        if section == '.*vec*':
-            return self.get_objfile_fp_secvec(objfile)
-        rv = 0
-        for node in self.get_node(section).all_nodes():
-            if node.objfile == objfile:
-                if node.leafsize is not None:
-                    rv += node.leafsize
-        return rv
+        return self.footprints.section_fp('objfile', objfile, section)
 
     def get_objfile_fp_secvec(self, objfile):
-        rv = 0
-        for section in self._vector_sections:
-            for node in self.get_node(section).all_nodes():
-                if node.objfile == objfile:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.section_fp('objfile', objfile, '.*vec*')
 
     def get_arfile_fp_sec(self, arfile, section):
-        if section == '.*vec*':
-            return self.get_objfile_fp_secvec(arfile)
-        rv = 0
-        for node in self.get_node(section).all_nodes():
-            if node.arfile == arfile:
-                if node.leafsize is not None:
-                    rv += node.leafsize
-        return rv
+        return self.footprints.section_fp('arfile', arfile, section)
 
     def get_arfile_fp_secvec(self, arfile):
-        rv = 0
-        for section in self._vector_sections:
-            for node in self.get_node(section).all_nodes():
-                if node.arfile == arfile:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.section_fp('arfile', arfile, '.*vec*')
 
     def get_arfile_fp(self, arfile):
-        r = []
-        for rgn in self.used_regions:
-            r.append(self.get_arfile_fp_rgn(arfile, rgn))
-        return r
+        return self.footprints.region_fps('arfile', arfile)
 
     def get_arfile_fp_rgn(self, arfile, region):
-        if self.collapse_vectors and region == "VEC":
-            return self.get_arfile_fp_rgnvec(arfile)
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.arfile == arfile:
-                if node.region == region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
-        return rv
+        return self.footprints.region_fp('arfile', arfile, region)
 
     def get_arfile_fp_rgnvec(self, arfile):
-        rv = 0
-        for node in self.root.all_nodes():
-            if node.arfile == arfile:
-                if 'VEC' in node.region:
-                    if node.leafsize is not None:
-                        rv += node.leafsize
+        return self.footprints.vector_fp('arfile', arfile)
+
+
+class MemoryMapIndex(object):
+    """
+    Flat index of all the nodes in a GCCMemoryMap, in tree order, along
+    with the positions of the nodes sharing each value of the node
+    attributes in ``keys``. Distinct values of an attribute are available
+    in the order in which they first appear in the tree.
+
+    The memory map discards its index whenever the tree changes.
+    """
+    keys = ('objfile', 'arfile', 'name', 'region')
+
+    def __init__(self, memory_map):
+        self.all_nodes = memory_map.root.all_nodes()
+        self._positions = {attr: {} for attr in self.keys}
+        for pos, node in enumerate(self.all_nodes):
+            for attr in self.keys:
+                positions = self._positions[attr]
+                value = getattr(node, attr)
+                try:
+                    positions[value].append(pos)
+                except KeyError:
+                    positions[value] = [pos]
+
+    def values(self, attr):
+        return list(self._positions[attr].keys())
+
+    def positions(self, attr, value):
+        return self._positions[attr].get(value, [])
+
+    def nodes_at(self, positions):
+        return [self.all_nodes[pos] for pos in positions]
+
+    def nodes(self, attr, value):
+        return self.nodes_at(self.positions(attr, value))
+
+
+class MemoryMapFootprints(object):
+    """
+    Footprint totals of a GCCMemoryMap, accumulated in a single walk over
+    the tree. Leaf sizes are summed against each of the node attributes in
+    ``keys``, per region and per used section, so that the footprint of
+    any objfile, arfile or symbol can be read out without walking the tree
+    again.
+
+    This is a snapshot of the tree at the time it is constructed. The
+    memory map discards it when ``invalidate_footprints`` is called.
+    """
+    keys = ('objfile', 'arfile', 'name')
+
+    def __init__(self, memory_map):
+        self.collapse_vectors = memory_map.collapse_vectors
+        self.used_regions = memory_map._find_used_regions()
+        self.used_sections = memory_map._find_used_sections()
+        self.vector_sections = list(memory_map._vector_sections)
+        self._rgn = {attr: {} for attr in self.keys}
+        self._rgnvec = {attr: {} for attr in self.keys}
+        self._sec = {attr: {} for attr in self.keys}
+        self._build(memory_map)
+
+    def _build(self, memory_map):
+        # Sections reported by used_sections are either top level nodes
+        # or the children of top level nodes, so a node contributes to at
+        # most two of them.
+        root = memory_map.root
+        self._accumulate(root, ())
+        for tnode in root.children:
+            tsection = tnode.gident
+            self._accumulate(tnode, (tsection,))
+            for cnode in tnode.children:
+                sections = (tsection, cnode.gident)
+                for node in cnode.all_nodes():
+                    self._accumulate(node, sections)
+
+    def _accumulate(self, node, sections):
+        size = node.leafsize
+        if not size:
+            return
+        region = node.region
+        isvec = 'VEC' in region
+        for attr in self.keys:
+            value = getattr(node, attr)
+            rgn = self._rgn[attr]
+            rgn[(value, region)] = rgn.get((value, region), 0) + size
+            if isvec:
+                rgnvec = self._rgnvec[attr]
+                rgnvec[value] = rgnvec.get(value, 0) + size
+            sec = self._sec[attr]
+            for section in sections:
+                sec[(value, section)] = sec.get((value, section), 0) + size
+
+    def vector_fp(self, attr, value):
+        return self._rgnvec[attr].get(value, 0)
+
+    def region_fp(self, attr, value, region):
+        if self.collapse_vectors and region == 'VEC':
+            return self.vector_fp(attr, value)
+        return self._rgn[attr].get((value, region), 0)
+
+    def region_fps(self, attr, value):
+        return [self.region_fp(attr, value, rgn)
+                for rgn in self.used_regions]
+
+    def section_fp(self, attr, value, section):
+        if section == '.*vec*':
+            sec = self._sec[attr]
+            return sum(sec.get((value, s), 0) for s in self.vector_sections)
+        return self._sec[attr].get((value, section), 0)
+
+    def section_fps(self, attr, value):
+        return [self.section_fp(attr, value, section)
+                for section in self.used_sections]
+
+    def region_totals(self, attr):
+        """
+        The footprint of every value of ``attr`` in each of the used
+        regions, as a dict keyed by ``(value, region)``. Footprints which
+        are 0 are left out.
+        """
+        used = set(self.used_regions)
+        rv = {key: size for key, size in self._rgn[attr].items()
+              if key[1] in used}
+        if self.collapse_vectors:
+            for value, size in self._rgnvec[attr].items():
+                rv[(value, 'VEC')] = size
         return rv
 
+    def section_totals(self, attr):
+        """
+        The footprint of every value of ``attr`` in each of the used
+        sections, as a dict keyed by ``(value, section)``. Footprints
+        which are 0 are left out.
+        """
+        used = set(self.used_sections)
+        vector_sections = set(self.vector_sections)
+        rv = {}
+        for (value, section), size in self._sec[attr].items():
+            if section in vector_sections:
+                section = '.*vec*'
+            elif section not in used:
+                continue
+            rv[(value, section)] = rv.get((value, section), 0) + size
+        return rv
+
+
+class ResolvedAddress(object):
+    def __init__(self, address, regions, nodes):
+        self.address = address
+        self.regions = regions
+        self.nodes = nodes
+
+    def __repr__(self):
+        r = '{0:#010x} :: {1}'.format(
+            self.address,
+            ', '.join(region.name for region in self.regions) or 'UNDEF'
+        )
+        for node in self.nodes:
+            r += '\n' + repr(node)
+        return r
+
 
 class MemoryRegion(object):
     def __init__(self, name, origin, size, attribs):
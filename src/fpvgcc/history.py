@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+History of footprints across builds, kept in a SQLite database.
+
+Each build appends its footprint totals to the database: the footprint of
+every region, and of every objfile, arfile and symbol in each region, along
+with the total of every section. Only these totals are kept, so that
+queries over any number of builds are answered from the indexes of the
+database rather than by parsing old maps.
+
+Names are stored once, in the ``keys`` table, and footprints refer to them
+by id. Footprints are clustered by key, so the history of any one name is
+read from a single range of the table, and also indexed by build, so that
+all of the footprints of a build can be read together.
+"""
+
+import time
+import sqlite3
+
+from .diff import map_totals
+
+
+SCHEMA_VERSION = 1
+
+KINDS = ('region', 'objfile', 'arfile', 'symbol')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    label TEXT,
+    mapfile TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keys (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (kind, name)
+);
+CREATE TABLE IF NOT EXISTS footprints (
+    key INTEGER NOT NULL REFERENCES keys (id),
+    region TEXT NOT NULL,
+    build INTEGER NOT NULL REFERENCES builds (id),
+    size INTEGER NOT NULL,
+    PRIMARY KEY (key, region, build)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS footprints_build ON footprints (build, key);
+CREATE TABLE IF NOT EXISTS sections (
+    section TEXT NOT NULL,
+    build INTEGER NOT NULL REFERENCES builds (id),
+    size INTEGER NOT NULL,
+    PRIMARY KEY (section, build)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS builds_label ON builds (label);
+"""
+
+
+class Build(object):
+    __slots__ = ('id', 'label', 'mapfile', 'created')
+
+    def __init__(self, id, label, mapfile, created):
+        self.id = id
+        self.label = label
+        self.mapfile = mapfile
+        self.created = created
+
+    def __repr__(self):
+        return "<Build {0} {1}>".format(self.id, self.label or self.mapfile)
+
+
+class Growth(object):
+    __slots__ = ('name', 'before', 'after')
+
+    def __init__(self, name, before, after):
+        self.name = name
+        self.before = before
+        self.after = after
+
+    @property
+    def delta(self):
+        return self.after - self.before
+
+    def __repr__(self):
+        return "<Growth {0} {1} -> {2} ({3:+d})>".format(
+            self.name, self.before, self.after, self.delta
+        )
+
+
+class FootprintHistory(object):
+    """
+    A database of footprint totals, one set per build, in the order in
+    which the builds were added.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version == 0:
+            self.db.execute('PRAGMA user_version = {0}'
+                            ''.format(SCHEMA_VERSION))
+        elif version != SCHEMA_VERSION:
+            self.db.close()
+            raise ValueError("Unsupported history database version : {0}"
+                             "".format(version))
+        self._keys = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _key(self, kind, name, create=False):
+        try:
+            return self._keys[(kind, name)]
+        except KeyError:
+            pass
+        row = self.db.execute('SELECT id FROM keys WHERE kind = ? AND '
+                              'name = ?', (kind, name)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            cursor = self.db.execute('INSERT INTO keys (kind, name) '
+                                     'VALUES (?, ?)', (kind, name))
+            row = (cursor.lastrowid,)
+        self._keys[(kind, name)] = row[0]
+        return row[0]
+
+    def add_build(self, sm, label=None, mapfile=None, created=None):
+        """
+        Append the footprint totals of a parsed map to the database.
+        Returns the ``Build`` which was added.
+        """
+        if created is None:
+            created = time.time()
+        fp = sm.memory_map.footprints
+        totals = map_totals(sm.memory_map, nodes=False)
+        with self.db:
+            build = self.db.execute(
+                'INSERT INTO builds (label, mapfile, created) '
+                'VALUES (?, ?, ?)', (label, mapfile, created)
+            ).lastrowid
+            rows = [(self._key('region', region, True), region, build, size)
+                    for region, size in totals['regions'].items()]
+            for kind, attr in (('objfile', 'objfile'), ('arfile', 'arfile'),
+                               ('symbol', 'name')):
+                for (value, region), size in \
+                        fp.region_totals(attr).items():
+                    if value is None or not size:
+                        continue
+                    rows.append((self._key(kind, value, True), region,
+                                 build, size))
+            self.db.executemany('INSERT INTO footprints (key, region, '
+                                'build, size) VALUES (?, ?, ?, ?)', rows)
+            self.db.executemany(
+                'INSERT INTO sections (section, build, size) '
+                'VALUES (?, ?, ?)',
+                [(section, build, size)
+                 for section, size in totals['sections'].items()]
+            )
+        return Build(build, label, mapfile, created)
+
+    def builds(self, last=None):
+        """
+        The builds in the database, oldest first, or only the last
+        ``last`` of them.
+        """
+        query = 'SELECT id, label, mapfile, created FROM builds ' \
+                'ORDER BY id DESC'
+        params = ()
+        if last is not None:
+            query += ' LIMIT ?'
+            params = (last,)
+        return [Build(*row) for row in
+                reversed(self.db.execute(query, params).fetchall())]
+
+    def build(self, label):
+        """
+        The last build with the given label, or None.
+        """
+        row = self.db.execute('SELECT id, label, mapfile, created FROM '
+                              'builds WHERE label = ? ORDER BY id DESC '
+                              'LIMIT 1', (label,)).fetchone()
+        return Build(*row) if row else None
+
+    def footprint(self, build, kind, name, region=None):
+        """
+        The footprint of a region, objfile, arfile or symbol in a build,
+        in one region or in all of them.
+        """
+        key = self._key(kind, name)
+        if key is None:
+            return 0
+        query = 'SELECT SUM(size) FROM footprints WHERE key = ? AND ' \
+                'build = ?'
+        params = [key, _build_id(build)]
+        if region is not None:
+            query += ' AND region = ?'
+            params.append(region)
+        return self.db.execute(query, params).fetchone()[0] or 0
+
+    def series(self, kind, name, region=None):
+        """
+        The footprint of a region, objfile, arfile or symbol in every
+        build in which it is present, as a list of ``(build id, size)``.
+        """
+        key = self._key(kind, name)
+        if key is None:
+            return []
+        query = 'SELECT build, SUM(size) FROM footprints WHERE key = ?'
+        params = [key]
+        if region is not None:
+            query += ' AND region = ?'
+            params.append(region)
+        query += ' GROUP BY build ORDER BY build'
+        return self.db.execute(query, params).fetchall()
+
+    def section_series(self, section):
+        return self.db.execute('SELECT build, size FROM sections WHERE '
+                               'section = ? ORDER BY build',
+                               (section,)).fetchall()
+
+    def top_growers(self, kind='objfile', last=10, region=None, limit=10):
+        """
+        The objfiles, arfiles, symbols or regions which grew the most over
+        the last ``last`` builds, comparing the newest of them with the
+        oldest, as a list of ``Growth``.
+        """
+        builds = self.builds(last)
+        if len(builds) < 2:
+            return []
+        first, latest = builds[0].id, builds[-1].id
+        query = """
+            SELECT k.name,
+                   SUM(CASE WHEN f.build = ? THEN f.size ELSE 0 END) AS before,
+                   SUM(CASE WHEN f.build = ? THEN f.size ELSE 0 END) AS after
+            FROM footprints f JOIN keys k ON k.id = f.key
+            WHERE f.build IN (?, ?) AND k.kind = ?
+        """
+        params = [first, latest, first, latest, kind]
+        if region is not None:
+            query += ' AND f.region = ?'
+            params.append(region)
+        query += """
+            GROUP BY f.key HAVING after > before
+            ORDER BY after - before DESC, k.name LIMIT ?
+        """
+        params.append(limit)
+        return [Growth(*row) for row in self.db.execute(query, params)]
+
+    def first_exceeding(self, kind, name, size, region=None):
+        """
+        The first build in which the footprint of a region, objfile,
+        arfile or symbol exceeded ``size`` bytes, as ``(build, size)``,
+        or None if it never did.
+        """
+        key = self._key(kind, name)
+        if key is None:
+            return None
+        query = 'SELECT build, SUM(size) AS total FROM footprints ' \
+                'WHERE key = ?'
+        params = [key]
+        if region is not None:
+            query += ' AND region = ?'
+            params.append(region)
+        query += ' GROUP BY build HAVING total > ? ORDER BY build LIMIT 1'
+        params.append(size)
+        row = self.db.execute(query, params).fetchone()
+        if row is None:
+            return None
+        build = self.db.execute('SELECT id, label, mapfile, created FROM '
+                                'builds WHERE id = ?', (row[0],)).fetchone()
+        return Build(*build), row[1]
+
+
+def _build_id(build):
+    return build.id if isinstance(build, Build) else build
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Incremental re-analysis of a map file which changes between builds.
+
+The output section blocks of the linker map are located and hashed, and
+grouped by the top level section of the memory map they add to. When the
+map file changes, only the groups which contain a changed block, or whose
+blocks follow a change in the aliases registered by the linker map, are
+parsed again. Their subtrees replace the old ones in the same memory map,
+and the indexes and footprints derived from the map are invalidated.
+
+Each group is parsed on its own, as though the blocks before it had left
+the parser in a clean state. Maps in which that does not hold, such as
+those with a fill at the start of a block which belongs to the last
+symbol of the block before it, are parsed in full on every update.
+
+Warnings are only reported for the parts of the map which are parsed.
+"""
+
+import os
+import mmap
+import pickle
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+
+from .fpv import GCCMemoryMapParser
+from .fpv import map_file
+from .fpv import pack_nodes
+from .cache import snapshot
+from .cache import restore
+from .cache import default_cache_dir
+from .gccMemoryMap import GCCMemoryMapNode
+from .gccMemoryMap import LinkAliases
+from .parallel import find_blocks
+from .profiles import get_profile
+from .profiles.guess import guess_profile_from_buffer
+
+
+# Bump this whenever the layout of the saved state changes.
+STATE_FORMAT = 1
+
+STATE_EXTENSION = '.fpvinc'
+
+
+def _region_key(regions):
+    return [(r.name, r.origin, r.size, r.attribs) for r in regions]
+
+
+class IncrementalMap(object):
+    """
+    The memory map of a map file, kept up to date with the file by
+    ``update``. ``blocks`` holds the top level section and the byte
+    offsets of each output section block of the linker map as of the last
+    update.
+    """
+    def __init__(self, fname, profile=None, encoding='utf-8'):
+        self.fname = fname
+        self.profile = profile
+        self.encoding = encoding
+        self.sm = None
+        self.blocks = []
+        self._profile_key = None
+        # The key of each group of blocks the memory map was built from,
+        # by top level section, or None if it was not built group by
+        # group.
+        self._groups = None
+        # Saved state which is restored once the profile is known.
+        self._snapshot = None
+
+    def _resolve_profile(self, mapping):
+        profile = self.profile
+        if profile is None:
+            profile = get_profile('default')
+        elif profile == 'auto':
+            profile = get_profile(
+                guess_profile_from_buffer(mapping) or 'default'
+            )
+        return profile, type(profile).__name__
+
+    def update(self):
+        """
+        Bring the memory map up to date with the map file. Returns the
+        names of the top level sections which were parsed.
+        """
+        with open(self.fname, 'rb') as f:
+            mapping = map_file(f)
+            if mapping is None:
+                # Sections are found and hashed across the whole of the
+                # file, so files which cannot be mapped are read whole.
+                mapping = f.read()
+            try:
+                return self._update(mapping)
+            finally:
+                if isinstance(mapping, mmap.mmap):
+                    mapping.close()
+
+    def _update(self, mapping):
+        profile, profile_key = self._resolve_profile(mapping)
+        if profile_key != self._profile_key:
+            self.sm = None
+            self._groups = None
+            self._snapshot = None
+        elif self._snapshot is not None:
+            self.sm = restore(self._snapshot, profile)
+            self._snapshot = None
+        self._profile_key = profile_key
+
+        found = find_blocks(mapping, self.encoding)
+        if found is None:
+            return self._parse_all(mapping, profile)
+        blocks, end = found
+        groups = OrderedDict()
+        for block in blocks:
+            groups.setdefault(block.top, []).append(block)
+        keys = self._group_keys(mapping, blocks)
+
+        rebuilt = OrderedDict()
+        for top, group in groups.items():
+            if self._groups is not None and self.sm is not None and \
+                    self._groups.get(top) == keys[top]:
+                continue
+            node = self._parse_group(mapping, group, profile)
+            if node is None:
+                logging.info("Sections of {0} depend on each other, parsing "
+                             "it in full".format(self.fname))
+                return self._parse_all(mapping, profile)
+            rebuilt[top] = node
+
+        outside = GCCMemoryMapParser(profile, encoding=self.encoding)
+        outside.feed_mapping(mapping, 0, blocks[0].start)
+        outside.feed_mapping(mapping, end)
+        outside.flush()
+        if self.sm is None or self._groups is None:
+            self.sm = outside.sm
+            regions_changed = False
+        else:
+            regions_changed = self._update_outside(outside.sm)
+        self._splice(groups, rebuilt, regions_changed)
+        aliases = LinkAliases()
+        for alias, target in blocks[-1].aliases + blocks[-1].registrations:
+            aliases.register_alias(target, alias)
+        self.sm.memory_map.aliases = aliases
+        self.sm.state = outside.sm.state
+        self._groups = keys
+        self.blocks = [(b.top, b.start, b.end) for b in blocks]
+        return list(rebuilt)
+
+    @staticmethod
+    def _group_keys(mapping, blocks):
+        # A block parses the same way if its content and the aliases
+        # registered before it are unchanged. The aliases before a block
+        # are all those registered by the blocks preceding it, which are
+        # hashed as they go.
+        keys = OrderedDict()
+        aliases = hashlib.sha1()
+        for block in blocks:
+            h = hashlib.sha1(mapping[block.start:block.end]).digest()
+            keys.setdefault(block.top, []).append((h, aliases.digest()))
+            aliases.update(repr(block.registrations).encode('utf-8'))
+        return {top: tuple(key) for top, key in keys.items()}
+
+    def _parse_group(self, mapping, group, profile):
+        parser = GCCMemoryMapParser(profile, encoding=self.encoding)
+        sm = parser.sm
+        sm.state = 'IN_LINKER_SCRIPT_AND_MEMMAP'
+        aliases = sm.memory_map.aliases
+        for block in group:
+            known = aliases.items()
+            if known != block.aliases[:len(known)]:
+                return None
+            for alias, target in block.aliases[len(known):]:
+                aliases.register_alias(target, alias)
+            # Fills at the start of the block belong to the last symbol of
+            # the block before it, which is not parsed here.
+            unknown = GCCMemoryMapNode()
+            unknown._fillsize = None
+            sm.LINKERMAP_STATE = 'IN_SECTION'
+            sm.linkermap_symbol = None
+            sm.linkermap_lastsymbol = unknown
+            parser.feed_mapping(mapping, block.start, block.end)
+            parser.flush()
+            if unknown._fillsize is not None:
+                return None
+            if sm.LINKERMAP_STATE == 'GOT_SECTION_NAME' or \
+                    sm.linkermap_symbol is not None:
+                return None
+            if aliases.items()[len(block.aliases):] != block.registrations:
+                return None
+        tops = sm.memory_map.top_level_nodes
+        if len(tops) != 1 or tops[0].name != group[0].top:
+            return None
+        node = tops[0]
+        sm.memory_map.root.remove_child(node)
+        return node
+
+    def _update_outside(self, osm):
+        sm = self.sm
+        sm.idep_archives = osm.idep_archives
+        sm.idep_symbols = osm.idep_symbols
+        sm.common_symbols = osm.common_symbols
+        sm.memory_regions = osm.memory_regions
+        sm.loaded_files = osm.loaded_files
+        sm.linker_defined_addresses = osm.linker_defined_addresses
+        mm = sm.memory_map
+        regions = osm.memory_map.memory_regions
+        if _region_key(regions) == _region_key(mm.memory_regions):
+            return False
+        mm.memory_regions = list(regions)
+        mm.invalidate_regions()
+        return True
+
+    def _splice(self, groups, rebuilt, regions_changed):
+        mm = self.sm.memory_map
+        root = mm.root
+        for node in list(root.children):
+            if node.name not in groups or node.name in rebuilt:
+                root.remove_child(node)
+        intern = mm.intern
+        for node in rebuilt.values():
+            root.attach_child(node)
+            stack = [node]
+            while stack:
+                child = stack.pop()
+                child.invalidate_context()
+                child.arfile = intern(child.arfile)
+                child.objfile = intern(child.objfile)
+                child.arfolder = intern(child.arfolder)
+                stack.extend(child.children)
+        # Top level sections are kept in the order they first appear in
+        # the linker map.
+        root.children = [root.get_child_by_ident(top) for top in groups]
+        mm.invalidate()
+        pack_nodes([root])
+        for node in rebuilt.values():
+            pack_nodes(node.all_nodes())
+        if regions_changed:
+            mm.assign_regions()
+        else:
+            for node in rebuilt.values():
+                mm.assign_regions(node)
+        mm.build_index()
+
+    def _parse_all(self, mapping, profile):
+        parser = GCCMemoryMapParser(profile, encoding=self.encoding)
+        parser.feed_mapping(mapping)
+        self.sm = parser.close()
+        self._groups = None
+        self.blocks = []
+        return [node.name for node in self.sm.memory_map.top_level_nodes]
+
+    def save(self, path):
+        state = {
+            'format': STATE_FORMAT,
+            'profile': self._profile_key,
+            'groups': self._groups,
+            'blocks': self.blocks,
+            'snapshot': snapshot(self.sm),
+        }
+        dirname = os.path.dirname(path) or '.'
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmppath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, path)
+        except Exception:
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path, fname, profile=None, encoding='utf-8'):
+        """
+        Load the state saved by ``save``. The memory map is restored by
+        the next ``update``, once the profile of the map file is known.
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state['format'] != STATE_FORMAT:
+            raise ValueError("Unsupported incremental state format : {0}"
+                             "".format(state['format']))
+        imap = cls(fname, profile, encoding)
+        imap._profile_key = state['profile']
+        imap._groups = state['groups']
+        imap.blocks = state['blocks']
+        imap._snapshot = state['snapshot']
+        return imap
+
+
+def state_path(fname, cachedir=None):
+    if cachedir is None:
+        cachedir = default_cache_dir()
+    h = hashlib.sha1(os.path.abspath(fname).encode('utf-8')).hexdigest()
+    return os.path.join(cachedir, '{0}.{1}{2}'.format(
+        os.path.basename(fname), h[:16], STATE_EXTENSION
+    ))
+
+
+def process_map_file_incremental(fname, profile=None, cachedir=None):
+    """
+    Parse a map file as ``process_map_file`` does, reusing the sections
+    parsed by the last call for the same file wherever they are unchanged.
+    The state is kept in ``cachedir``.
+
+    Since the state is a pickle, the cache directory should not be
+    writable by anyone who isn't trusted with running code as the user.
+    """
+    path = state_path(fname, cachedir)
+    imap = None
+    if os.path.exists(path):
+        try:
+            imap = IncrementalMap.load(path, fname, profile)
+        except Exception as e:
+            logging.warning("Discarding unreadable incremental state {0} : "
+                            "{1}".format(path, e))
+    if imap is None:
+        imap = IncrementalMap(fname, profile)
+    try:
+        changed = imap.update()
+    except Exception:
+        if imap.sm is None and imap._snapshot is None:
+            raise
+        logging.warning("Could not update {0} incrementally, parsing it "
+                        "in full".format(fname))
+        imap = IncrementalMap(fname, profile)
+        changed = imap.update()
+    logging.info("Parsed sections of {0} : {1}"
+                 "".format(fname, ', '.join(changed) or 'none'))
+    try:
+        imap.save(path)
+    except (OSError, IOError) as e:
+        logging.warning("Could not write the incremental state : {0}"
+                        "".format(e))
+    return imap.sm
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Writers for the footprint reports.
+
+A footprint report is a table with a row per file or symbol and a column
+per region or section, followed by the total of the row. The ``table``
+format renders it with PrettyTable, sorted by total, along with a row of
+totals. The ``json``, ``ndjson`` and ``csv`` formats are meant for other
+tools. They write each row as soon as it is produced, in the order in
+which it was produced, and leave out the totals. They also leave out the
+rows without a name, which hold whatever could not be attributed to a file
+or symbol, and the rows whose total is 0.
+
+If only the top N rows are wanted, they are selected with a heap of N
+rows as they are produced, and written largest first in every format.
+"""
+
+import sys
+import csv
+import json
+import heapq
+from collections import OrderedDict
+from prettytable import PrettyTable
+
+
+FORMATS = ('table', 'json', 'ndjson', 'csv')
+
+
+class ReportWriter(object):
+    # Whether rows without a name, or with a total of 0, are left out.
+    skip_empty = True
+
+    def __init__(self, rowtitle, cols, stream=None):
+        self.rowtitle = rowtitle
+        self.cols = list(cols)
+        self.headings = [rowtitle] + self.cols + ['TOTAL']
+        # Looked up when the writer is created, so that reports follow
+        # any redirection of stdout.
+        self.stream = stream if stream is not None else sys.stdout
+
+    def begin(self):
+        pass
+
+    def write_row(self, name, row, total):
+        raise NotImplementedError
+
+    def end(self, totals):
+        pass
+
+    def _record(self, name, row, total):
+        return OrderedDict(zip(self.headings, [name] + list(row) + [total]))
+
+
+class TableWriter(ReportWriter):
+    skip_empty = False
+
+    def begin(self):
+        tbl = PrettyTable(self.headings)
+        tbl.align[self.rowtitle] = 'l'
+        for heading in self.cols:
+            tbl.align[heading] = 'r'
+        tbl.align['TOTAL'] = 'r'
+        tbl.padding_width = 1
+        self.tbl = tbl
+
+    def write_row(self, name, row, total):
+        self.tbl.add_row([name] + [x or '' for x in row] + [total])
+
+    def end(self, totals):
+        self.tbl.add_row(['TOTALS'] + totals + [''])
+        self.stream.write(self.tbl.get_string(
+            sortby='TOTAL', reversesort=True, sort_key=lambda x: x[-1] or 0
+        ) + '\n')
+
+
+class JSONWriter(ReportWriter):
+    def begin(self):
+        self._first = True
+        self.stream.write('[')
+
+    def write_row(self, name, row, total):
+        self.stream.write('\n' if self._first else ',\n')
+        self._first = False
+        self.stream.write('  ' + json.dumps(self._record(name, row, total)))
+
+    def end(self, totals):
+        self.stream.write('\n]\n' if not self._first else ']\n')
+
+
+class NDJSONWriter(ReportWriter):
+    def write_row(self, name, row, total):
+        self.stream.write(json.dumps(self._record(name, row, total)) + '\n')
+
+
+class CSVWriter(ReportWriter):
+    def begin(self):
+        self.writer = csv.writer(self.stream, lineterminator='\n')
+        self.writer.writerow(self.headings)
+
+    def write_row(self, name, row, total):
+        self.writer.writerow([name] + list(row) + [total])
+
+
+WRITERS = {
+    'table': TableWriter,
+    'json': JSONWriter,
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+}
+
+
+def get_writer(fmt, rowtitle, cols, stream=None):
+    try:
+        writer_t = WRITERS[fmt]
+    except KeyError:
+        raise ValueError("Unknown output format : {0}".format(fmt))
+    return writer_t(rowtitle, cols, stream)
+
+
+def write_report(rowtitle, cols, rows, fmt='table', top=None, stream=None):
+    """
+    Write a footprint report. ``rows`` is an iterable of ``(name, row)``,
+    with a value in ``row`` for each of ``cols``. If ``top`` is provided,
+    only the ``top`` rows with the largest totals are written, though the
+    totals of the table format still cover every row.
+    """
+    writer = get_writer(fmt, rowtitle, cols, stream)
+    totals = [0] * len(writer.cols)
+
+    def tally():
+        # Totals are accumulated as the rows go by, so that they cover
+        # every row even when only the top rows are kept.
+        for name, row in rows:
+            for idx, value in enumerate(row):
+                totals[idx] += value
+            total = sum(row)
+            if writer.skip_empty and (name is None or not total):
+                continue
+            yield name, row, total
+
+    selected = tally()
+    if top is not None:
+        selected = heapq.nlargest(top, selected, key=lambda r: r[2])
+    writer.begin()
+    for name, row, total in selected:
+        writer.write_row(name, row, total)
+    writer.end(totals)
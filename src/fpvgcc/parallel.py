@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parsing of a single large map file in several processes.
+
+The linker map of a map file is a series of output section blocks, each
+starting with the name of the section at the beginning of a line. The
+blocks are grouped into ranges, and each range is parsed by a worker
+process into a partial memory map, which is sent back as a flat table of
+nodes. The calling process parses the rest of the map file itself, and
+merges the partial maps into its own memory map in the order of the
+ranges.
+
+Parsing a range depends on what precedes it in the linker map, in the
+aliases registered by the sections before it and in the state of the
+linker map parser at its start. The aliases each range will start with are
+predicted by a quick scan over the section names and alias lines of the
+map before any range is parsed. When a range is merged, its starting
+conditions are checked against the actual state of the parse, and a range
+which was parsed on the wrong assumptions, or which adds to a section
+already present in the memory map, is discarded and parsed again in the
+calling process. The result is always the same as that of
+``process_map_file``, although ranges which need to be parsed again are
+not parsed in parallel.
+
+Warnings and output produced while parsing a range in a worker are
+collected there, and are reproduced when the range is merged.
+"""
+
+import io
+import os
+import re
+import sys
+import mmap
+import logging
+from contextlib import contextmanager
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+from .fpv import GCCMemoryMapParser
+from .fpv import GCCMemoryMapParserSM
+from .fpv import LinkerDefnAddr
+from .fpv import linkermap_name_process
+from .fpv import process_linkaliases_line
+from .fpv import find_headings
+from .fpv import map_file
+from .fpv import re_linkermap
+from .cache import snapshot
+from .gccMemoryMap import GCCMemoryMapNode
+from .profiles import get_profile
+from .profiles.guess import guess_profile_from_buffer
+
+
+# Linker maps smaller than this are not worth splitting.
+MIN_CHUNK_SIZE = 1 << 20
+
+# Merging the results of the workers, and parsing what they cannot, takes
+# the calling process about 40% as long as parsing the whole map in one
+# process, while the workers take about 15% longer between them than that.
+# With fewer processes than this, splitting the map is no faster.
+MIN_PARALLEL_JOBS = 4
+
+# As with the headings, lines are searched for along with the newline
+# preceding them.
+re_block_start = re.compile(rb'\n[._]')
+
+# Section headings, and lines which could register aliases.
+re_linkermap_scan = re.compile(rb'\n(?:[._]|[ ]\*\()[^\n]*')
+re_nonblank_line = re.compile(rb'\n[^\S\n]*\S')
+
+
+class BlockRange(object):
+    """
+    A range of output section blocks of the linker map, from ``start`` to
+    ``end`` in the map file, along with the aliases which are expected to
+    have been registered when the parser reaches it. Ranges which are not
+    ``parallel`` are parsed by the calling process.
+    """
+    def __init__(self, start, end, aliases, parallel=True):
+        self.start = start
+        self.end = end
+        self.aliases = aliases
+        self.parallel = parallel
+
+    def __repr__(self):
+        return "<BlockRange {0}:{1}{2}>".format(
+            self.start, self.end, '' if self.parallel else ' serial')
+
+
+class _HeadingStub(object):
+    # Stands in for the section node of a heading in the scan.
+    def __init__(self, gident):
+        self.gident = gident
+
+
+def find_linkermap(mapping):
+    """
+    Find the linker map in a mapping of a map file. Returns the offsets
+    of the start of its first section block and of its end, or None if
+    the map has no linker map or the linker map has no sections.
+    """
+    start = end = None
+    for offset, state in find_headings(mapping):
+        if start is not None:
+            end = offset
+            break
+        if state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+            start = offset
+    if start is None:
+        return None
+    if end is None:
+        end = len(mapping)
+    first = re_block_start.search(mapping, start, end)
+    if first is None:
+        return None
+    return first.start() + 1, end
+
+
+class SectionBlock(object):
+    """
+    An output section block of the linker map, from ``start`` to ``end``
+    in the map file. ``top`` is the name of the top level node of the
+    memory map its section belongs to, ``aliases`` are the aliases
+    registered before the block, and ``registrations`` are the aliases
+    registered within it.
+    """
+    __slots__ = ('start', 'end', 'top', 'aliases', 'registrations')
+
+    def __init__(self, start, end, top, aliases, registrations=None):
+        self.start = start
+        self.end = end
+        self.top = top
+        self.aliases = aliases
+        self.registrations = registrations or []
+
+    def __repr__(self):
+        return "<SectionBlock {0} {1}:{2}>".format(self.top, self.start,
+                                                   self.end)
+
+
+def scan_blocks(mapping, start, end, encoding='utf-8'):
+    """
+    Scan the section headings and alias lines of a linker map, handling
+    them as the parser would, without building the memory map. Returns
+    a list of the ``SectionBlock`` of the linker map. Anything before the
+    first section heading is not part of any block.
+    """
+    sm = GCCMemoryMapParserSM(ctx=None)
+    aliases = sm.memory_map.aliases
+    blocks = []
+    consumed = None
+    for match in re_linkermap_scan.finditer(mapping, start - 1, end):
+        offset = match.start() + 1
+        if offset == consumed:
+            # The line following a heading without an address is always
+            # read as the address of the heading.
+            continue
+        line = match.group(0)[1:].decode(encoding, 'replace').rstrip('\r')
+        if line.startswith(' '):
+            if sm.linkermap_section is None:
+                continue
+            if re_linkermap['FILL'].match(line):
+                continue
+            alias_match = re_linkermap['LINKALIASES'].match(line)
+            if alias_match:
+                process_linkaliases_line(line, sm, alias_match)
+            continue
+        # Lines which are not headings leave the parser in the section
+        # it was in, and so are part of the block before them.
+        heading = re_linkermap['SECTION_HEADINGS'].match(line)
+        if heading is None:
+            continue
+        name = linkermap_name_process(heading.group('name'), sm, False)
+        if name is None:
+            continue
+        sm.linkermap_section = _HeadingStub(name)
+        if heading.group('address') is None:
+            nonblank = re_nonblank_line.search(mapping, match.end(), end)
+            if nonblank is not None:
+                consumed = nonblank.start() + 1
+        known = aliases.items()
+        if blocks:
+            blocks[-1].end = offset
+            blocks[-1].registrations = known[len(blocks[-1].aliases):]
+        blocks.append(SectionBlock(offset, end, name.split('.')[1], known))
+    if blocks:
+        blocks[-1].registrations = aliases.items()[len(blocks[-1].aliases):]
+    return blocks
+
+
+def find_blocks(mapping, encoding='utf-8'):
+    """
+    Locate the output section blocks of the linker map in a mapping of a
+    map file. Returns the list of ``SectionBlock`` and the offset of the
+    end of the linker map, or None if the map has no section blocks.
+    """
+    linkermap = find_linkermap(mapping)
+    if linkermap is None:
+        return None
+    start, end = linkermap
+    # Anything the scan has to warn about is reported by the parse itself.
+    with _collected_output(logging.CRITICAL):
+        blocks = scan_blocks(mapping, start, end, encoding)
+    if not blocks:
+        return None
+    return blocks, end
+
+
+def plan_block_ranges(mapping, jobs, chunk_size=None, encoding='utf-8'):
+    """
+    Split the linker map in a mapping of a map file into ranges of whole
+    output section blocks, for up to ``jobs`` processes to parse. Ranges
+    are at least ``chunk_size`` bytes long, unless a single block is
+    shorter, and there are a few of them per process so that the work can
+    be balanced.
+
+    Blocks which add to a top level node started in an earlier range, as
+    when a section is split across the linker map, are placed in ranges
+    of their own to be parsed by the calling process.
+
+    Returns the offset of the first range, the list of ``BlockRange`` and
+    the offset of the end of the last range, or None if the linker map
+    cannot be split.
+    """
+    found = find_blocks(mapping, encoding)
+    if found is None:
+        return None
+    blocks, end = found
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE,
+                         (end - blocks[0].start) // (jobs * 4))
+    ranges = []
+    # Top level nodes started in the ranges before the last one, and in
+    # the last one.
+    earlier = set()
+    current = set()
+    for block in blocks:
+        parallel = block.top not in earlier
+        if ranges:
+            last = ranges[-1]
+            if last.parallel:
+                if block.top in current or \
+                        (parallel and block.start - last.start < chunk_size):
+                    current.add(block.top)
+                    continue
+            elif not parallel:
+                continue
+            last.end = block.start
+        earlier.update(current)
+        current = {block.top} if parallel else set()
+        ranges.append(BlockRange(block.start, end, block.aliases, parallel))
+    return blocks[0].start, ranges, end
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self):
+        super(_RecordCollector, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        # Records are sent across processes, so their arguments are
+        # formatted into the message up front.
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+@contextmanager
+def _collected_output(level):
+    root = logging.getLogger()
+    handlers, root_level = root.handlers, root.level
+    collector = _RecordCollector()
+    stdout = io.StringIO()
+    root.handlers = [collector]
+    root.setLevel(level)
+    try:
+        with redirect_stdout(stdout):
+            yield collector.records, stdout
+    finally:
+        root.handlers = handlers
+        root.setLevel(root_level)
+
+
+def _replay_output(result):
+    for record in result['records']:
+        logging.getLogger(record.name).handle(record)
+    if result['stdout']:
+        sys.stdout.write(result['stdout'])
+
+
+def parse_block_range(fname, start, end, aliases, encoding='utf-8',
+                      level=logging.WARNING):
+    """
+    Parse a range of output section blocks of the linker map of a map
+    file into a partial memory map, starting with the provided aliases.
+    Returns a dict of plain python builtins describing the partial map
+    and the state of the parser at the end of the range, along with any
+    log records and output produced while parsing it.
+    """
+    with _collected_output(level) as (records, stdout):
+        parser = GCCMemoryMapParser(encoding=encoding)
+        sm = parser.sm
+        sm.state = 'IN_LINKER_SCRIPT_AND_MEMMAP'
+        mm = sm.memory_map
+        for alias, target in aliases:
+            mm.aliases.register_alias(target, alias)
+        # Fills at the start of the range belong to the last symbol of
+        # the previous range, which is not known here.
+        unknown = GCCMemoryMapNode()
+        unknown._fillsize = None
+        sm.linkermap_lastsymbol = unknown
+        with open(fname, 'rb') as f:
+            mapping = map_file(f)
+            if mapping is None:
+                mapping = f.read()
+            try:
+                parser.feed_mapping(mapping, start, end)
+                parser.flush()
+            finally:
+                if isinstance(mapping, mmap.mmap):
+                    mapping.close()
+        positions = {id(node): pos
+                     for pos, node in enumerate(mm.root.all_nodes())}
+        lastsymbol = sm.linkermap_lastsymbol
+        result = {
+            'snapshot': snapshot(sm),
+            'aliases': mm.aliases.items()[len(aliases):],
+            'state': sm.LINKERMAP_STATE,
+            'symbol': sm.linkermap_symbol,
+            'section': positions.get(id(sm.linkermap_section)),
+            'lastsymbol': None if lastsymbol is unknown
+            else positions.get(id(lastsymbol)),
+            'needs_context': unknown._fillsize is not None,
+        }
+    result['records'] = records
+    result['stdout'] = stdout.getvalue()
+    return result
+
+
+def _can_merge(sm, block_range, result):
+    if result['needs_context']:
+        return False
+    if sm.LINKERMAP_STATE == 'GOT_SECTION_NAME' or \
+            sm.linkermap_symbol is not None:
+        return False
+    if result['section'] is None:
+        return False
+    mm = sm.memory_map
+    if mm.aliases.items() != block_range.aliases:
+        return False
+    strings = result['snapshot']['strings']
+    for record in result['snapshot']['nodes'][1:]:
+        if record[0] != 0:
+            continue
+        try:
+            mm.root.get_child_by_ident(strings[record[1]])
+        except ValueError:
+            continue
+        return False
+    return True
+
+
+def merge_block_range(sm, block_range, result):
+    """
+    Merge the partial memory map parsed from a range of blocks into the
+    memory map of the parser state machine, if the range was parsed under
+    the same conditions as the parser would have. Returns False, without
+    changing anything, if it was not.
+    """
+    if not _can_merge(sm, block_range, result):
+        return False
+    _replay_output(result)
+    mm = sm.memory_map
+    snap = result['snapshot']
+    strings = snap['strings']
+    intern = mm.intern
+
+    def s(idx):
+        if idx is None:
+            return None
+        return strings[idx]
+
+    nodes = [mm.root]
+    for record in snap['nodes'][1:]:
+        (parent, name, address, defsize, size, fillsize,
+         arfile, objfile, arfolder) = record
+        node = GCCMemoryMapNode(name=s(name))
+        nodes[parent].attach_child(node)
+        node._address = address
+        node._defsize = defsize
+        node._size = size
+        node._fillsize = fillsize
+        node.arfile = intern(s(arfile))
+        node.objfile = intern(s(objfile))
+        node.arfolder = intern(s(arfolder))
+        nodes.append(node)
+    mm.invalidate()
+
+    for alias, target in result['aliases']:
+        mm.aliases.register_alias(target, alias)
+    sm.loaded_files.extend(snap['loaded_files'])
+    for symbol, address, defn_addr in snap['linker_defined_addresses']:
+        sm.linker_defined_addresses.append(
+            LinkerDefnAddr(symbol, hex(address), hex(defn_addr))
+        )
+    sm.LINKERMAP_STATE = result['state']
+    sm.linkermap_section = nodes[result['section']]
+    sm.linkermap_symbol = result['symbol']
+    if result['lastsymbol'] is not None:
+        sm.linkermap_lastsymbol = nodes[result['lastsymbol']]
+    return True
+
+
+def _parse_ranges(fname, ranges, jobs, encoding):
+    level = logging.getLogger().getEffectiveLevel()
+    args = ([fname] * len(ranges),
+            [r.start for r in ranges], [r.end for r in ranges],
+            [r.aliases for r in ranges],
+            [encoding] * len(ranges), [level] * len(ranges))
+    if jobs <= 1:
+        for result in map(parse_block_range, *args):
+            yield result
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(parse_block_range, *args):
+            yield result
+
+
+def parallel_jobs(fname, jobs=None):
+    """
+    The number of processes worth using to parse the map file ``fname``
+    in parallel, given at most ``jobs`` of them and the number of CPUs.
+    Returns 1 if the map is better parsed in a single process, as it is
+    when fewer than ``MIN_PARALLEL_JOBS`` processes could be given a CPU
+    and ``MIN_CHUNK_SIZE`` bytes of the map each.
+    """
+    cpus = os.cpu_count() or 1
+    if jobs is None or jobs > cpus:
+        jobs = cpus
+    jobs = min(jobs, os.path.getsize(fname) // MIN_CHUNK_SIZE)
+    if jobs < MIN_PARALLEL_JOBS:
+        return 1
+    return jobs
+
+
+def process_map_file_parallel(fname, profile=None, jobs=None,
+                              chunk_size=None):
+    """
+    Parse a map file as ``process_map_file`` does, with the output section
+    blocks of its linker map parsed by a pool of ``jobs`` worker
+    processes. ``jobs`` defaults to the number of CPUs. With ``jobs=1``,
+    the blocks are parsed one range at a time in the calling process.
+
+    Maps whose linker map is too small to be split into more than one
+    range of ``chunk_size`` bytes are parsed directly.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    with open(fname, 'rb') as f:
+        mapping = map_file(f)
+        if mapping is None:
+            # Streams can only be read once, from start to end.
+            parser = GCCMemoryMapParser(profile)
+            parser.feed(f)
+            return parser.close()
+        try:
+            if profile is None:
+                profile = get_profile('default')
+            elif profile == 'auto':
+                profile = get_profile(
+                    guess_profile_from_buffer(mapping) or 'default'
+                )
+            parser = GCCMemoryMapParser(profile)
+            plan = plan_block_ranges(mapping, jobs, chunk_size,
+                                     parser.encoding)
+            if plan is None or \
+                    sum(r.parallel for r in plan[1]) < 2:
+                parser.feed_mapping(mapping)
+                return parser.close()
+            start, ranges, end = plan
+            parser.feed_mapping(mapping, 0, start)
+            results = _parse_ranges(fname, [r for r in ranges if r.parallel],
+                                    jobs, parser.encoding)
+            for block_range in ranges:
+                if block_range.parallel:
+                    result = next(results)
+                    if merge_block_range(parser.sm, block_range, result):
+                        continue
+                    logging.info("Parsing blocks again : {0}"
+                                 "".format(block_range))
+                parser.feed_mapping(mapping, block_range.start,
+                                    block_range.end)
+            parser.feed_mapping(mapping, end)
+        finally:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+    return parser.close()
@@ -3,14 +3,35 @@
 import re
 
 
+re_output = re.compile(r"^OUTPUT\((?P<file>[\S]+)\s(?P<sig>[\S]+)\)$")
+
+
+def guess_profile_from_line(line):
+    matches = re_output.search(line.strip())
+    if matches:
+        return matches.group('sig')
+    return None
+
+
+def guess_profile_from_buffer(buf):
+    # The OUTPUT line is usually, though not always, the last line of the
+    # map. buf can be bytes or an mmap of the map file.
+    if buf[:7] == b'OUTPUT(':
+        start = 0
+    else:
+        start = buf.rfind(b'\nOUTPUT(') + 1
+        if not start:
+            return None
+    end = buf.find(b'\n', start)
+    if end < 0:
+        end = len(buf)
+    return guess_profile_from_line(buf[start:end].decode('utf-8', 'replace'))
+
+
 def guess_profile(fpath):
     fp = open(fpath, "rb")
     fp.seek(-300 - 1, 2)
 
-    rex = r"^OUTPUT\((?P<file>[\S]+)\s(?P<sig>[\S]+)\)$"
     line = fp.readlines()[-1].strip().decode()
 
-    matches = re.search(rex, line)
-    if matches:
-        return matches.group('sig')
-    return 'default'
+    return guess_profile_from_line(line) or 'default'
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Queries over the nodes of a memory map.
+
+A query sums the leaf sizes of the nodes of a memory map, grouped by any of
+the node attributes in ``ATTRIBUTES``, and optionally restricted by
+conditions on them. Queries are evaluated when their rows are first used.
+
+Conditions are resolved against the distinct values of each attribute,
+held by the index of the memory map along with the nodes having each
+value, so only the nodes which satisfy every condition are visited.
+Results are kept by the memory map until its tree changes, except those of
+queries with functions among their conditions, which are kept only by the
+query itself.
+"""
+
+import heapq
+from collections import namedtuple
+
+
+# ``section`` is the gident of the top level node a node is under.
+ATTRIBUTES = ('objfile', 'arfile', 'name', 'region', 'section')
+
+_row_types = {}
+
+
+def _row_type(group_by):
+    try:
+        return _row_types[group_by]
+    except KeyError:
+        row_t = namedtuple('QueryRow', group_by + ('size',))
+        _row_types[group_by] = row_t
+        return row_t
+
+
+def _freeze(condition):
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return frozenset(condition)
+    return condition
+
+
+def _matches(condition, value):
+    if callable(condition):
+        return condition(value)
+    if isinstance(condition, frozenset):
+        return value in condition
+    return value == condition
+
+
+class _SectionIndex(object):
+    # The nodes under each top level node, in the same form as the
+    # memory map index. Nodes are held by the index in depth first order,
+    # so each top level node is followed by all of its descendants.
+    def __init__(self, index):
+        self.sections = []
+        self._positions = {}
+        section = None
+        for pos, node in enumerate(index.all_nodes):
+            if node.is_toplevelnode:
+                section = node.gident
+            self.sections.append(section)
+            try:
+                self._positions[section].append(pos)
+            except KeyError:
+                self._positions[section] = [pos]
+
+    def values(self):
+        return list(self._positions.keys())
+
+    def positions(self, value):
+        return self._positions.get(value, [])
+
+
+class MapQuery(object):
+    """
+    The footprint of the nodes of a memory map, summed over the groups of
+    nodes sharing the values of the attributes in ``group_by``.
+
+    ``where`` is a dict of conditions on attributes, each of which is a
+    value the attribute must equal, a list or set of values, or a function
+    of the value returning whether it is acceptable. ``order_by`` is
+    ``size``, which orders the rows largest first, or one of the
+    attributes in ``group_by``, which orders them by that value. Either is
+    reversed by a leading ``-``. If ``limit`` is provided, only the first
+    ``limit`` rows are kept.
+
+    Rows are named tuples, with the values of the ``group_by`` attributes
+    followed by ``size``. Nodes without a leaf size are left out.
+    """
+    def __init__(self, memory_map, group_by=None, where=None,
+                 order_by='size', limit=None):
+        group_by = tuple(group_by or ())
+        where = where or {}
+        for attr in group_by + tuple(where.keys()):
+            if attr not in ATTRIBUTES:
+                raise ValueError("Unknown query attribute : {0}"
+                                 "".format(attr))
+        self.reverse = order_by.startswith('-')
+        self.order_by = order_by.lstrip('-')
+        if self.order_by != 'size' and self.order_by not in group_by:
+            raise ValueError("Queries can only be ordered by size or by "
+                             "one of the grouped attributes")
+        self.memory_map = memory_map
+        self.group_by = group_by
+        self.where = sorted((attr, _freeze(condition))
+                            for attr, condition in where.items())
+        self.limit = limit
+        # Queries with functions among their conditions are not kept by the
+        # memory map, since each new function would be kept along with its
+        # result. Their rows are kept by the query itself instead.
+        if any(callable(condition) for attr, condition in self.where):
+            self.key = None
+        else:
+            self.key = (group_by, tuple(self.where), order_by, limit)
+        self._rows = None
+
+    @property
+    def rows(self):
+        cache = self.memory_map.query_cache
+        if self.key is None:
+            # The cache of the memory map is replaced whenever its tree
+            # changes.
+            if self._rows is None or self._rows[0] is not cache:
+                self._rows = (cache, self._evaluate())
+            return self._rows[1]
+        try:
+            return cache[self.key]
+        except KeyError:
+            rows = cache[self.key] = self._evaluate()
+            return rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        return self.rows[idx]
+
+    @property
+    def total(self):
+        return sum(row.size for row in self.rows)
+
+    def _section_index(self):
+        cache = self.memory_map.query_cache
+        try:
+            return cache['sections']
+        except KeyError:
+            sections = cache['sections'] = \
+                _SectionIndex(self.memory_map.index)
+            return sections
+
+    def _values(self, attr):
+        if attr == 'section':
+            return self._section_index().values()
+        return self.memory_map.index.values(attr)
+
+    def _positions(self, attr, value):
+        if attr == 'section':
+            return self._section_index().positions(value)
+        return self.memory_map.index.positions(attr, value)
+
+    def _selected(self):
+        # Positions of the nodes satisfying every condition, found through
+        # the index without visiting any node.
+        selected = None
+        for attr, condition in self.where:
+            if callable(condition) or isinstance(condition, frozenset):
+                positions = set()
+                for value in self._values(attr):
+                    if _matches(condition, value):
+                        positions.update(self._positions(attr, value))
+            else:
+                positions = set(self._positions(attr, condition))
+            if selected is None:
+                selected = positions
+            else:
+                selected &= positions
+            if not selected:
+                return []
+        if selected is None:
+            return range(len(self.memory_map.index.all_nodes))
+        return sorted(selected)
+
+    def _evaluate(self):
+        nodes = self.memory_map.index.all_nodes
+        if 'section' in self.group_by:
+            sections = self._section_index().sections
+        getters = []
+        for attr in self.group_by:
+            if attr == 'section':
+                getters.append(lambda pos, node: sections[pos])
+            else:
+                getters.append(
+                    lambda pos, node, attr=attr: getattr(node, attr)
+                )
+        sums = {}
+        for pos in self._selected():
+            node = nodes[pos]
+            size = node.leafsize
+            if not size:
+                continue
+            key = tuple(getter(pos, node) for getter in getters)
+            sums[key] = sums.get(key, 0) + size
+
+        row_t = _row_type(self.group_by)
+        rows = [row_t(*(key + (size,))) for key, size in sums.items()]
+        if self.order_by == 'size':
+            # Largest first, unless reversed.
+            sort_key = (lambda row: row.size)
+            descending = not self.reverse
+        else:
+            column = self.group_by.index(self.order_by)
+            # None sorts before any other value.
+            sort_key = (lambda row: (row[column] is not None, row[column]))
+            descending = self.reverse
+        if self.limit is not None:
+            select = heapq.nlargest if descending else heapq.nsmallest
+            return select(self.limit, rows, key=sort_key)
+        return sorted(rows, key=sort_key, reverse=descending)
+
+    def __repr__(self):
+        return "<MapQuery group_by={0} where={1} order_by={2}{3} " \
+               "limit={4}>".format(list(self.group_by), dict(self.where),
+                                   '-' if self.reverse else '',
+                                   self.order_by, self.limit)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Instrumentation of the map parser.
+
+A ``ParseStats`` provided to the parser collects the number of lines read
+from each region of the map file and the time spent processing them, the
+number of times each regular expression was tried and matched, the number
+of calls to and the time spent in ``linkermap_get_newnode`` and
+``push_to_leaf``, the time spent reading and closing the map, the number
+of nodes in the memory map and the peak memory used.
+
+A parser given a ``ParseStats`` picks counting and timing wrappers of the
+regular expressions and the functions it uses when it is constructed, so
+that only its own work is counted, whatever other parses are running in
+the same process. When no ``ParseStats`` is provided, the parser runs
+exactly as it otherwise would.
+"""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from collections import OrderedDict
+from prettytable import PrettyTable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class RegexStats(object):
+    __slots__ = ('attempts', 'hits')
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+
+    @property
+    def hit_rate(self):
+        if not self.attempts:
+            return None
+        return self.hits / self.attempts
+
+
+class TimingStats(object):
+    # Lines of a file region, or calls to a function.
+    __slots__ = ('count', 'time')
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+
+class _CountingPattern(object):
+    def __init__(self, regex, stats):
+        self.regex = regex
+        self.pattern = regex.pattern
+        self.stats = stats
+
+    def _count(self, result):
+        self.stats.attempts += 1
+        if result:
+            self.stats.hits += 1
+        return result
+
+    def match(self, *args):
+        return self._count(self.regex.match(*args))
+
+    def search(self, *args):
+        return self._count(self.regex.search(*args))
+
+    def findall(self, *args):
+        return self._count(self.regex.findall(*args))
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # In bytes on macOS, and in kilobytes elsewhere.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ParseStats(object):
+    """
+    Statistics of the parses of map files with which it is used.
+
+    ``peak_rss`` is the peak resident memory of the process, which is read
+    when each parse is done and so includes whatever was used before it.
+    If ``trace_memory`` is set, memory allocations are also traced during
+    the parse, which is several times slower, and ``peak_traced`` is the
+    peak memory allocated by Python while parsing.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = OrderedDict()
+        self.regions = OrderedDict()
+        self.regexes = OrderedDict()
+        self.calls = OrderedDict((name, TimingStats()) for name in
+                                 ('linkermap_get_newnode', 'push_to_leaf'))
+        self.nodes = None
+        self.peak_rss = None
+        self.peak_traced = None
+        self.active = False
+
+    def _regex_stats(self, name):
+        try:
+            return self.regexes[name]
+        except KeyError:
+            stats = self.regexes[name] = RegexStats()
+            return stats
+
+    def counting_pattern(self, name, regex):
+        """
+        A wrapper of the compiled ``regex`` which counts its attempts and
+        hits under ``name``.
+        """
+        return _CountingPattern(regex, self._regex_stats(name))
+
+    def timed(self, name, func):
+        """
+        A wrapper of ``func`` which counts and times its calls under
+        ``name``.
+        """
+        stats = self.calls[name]
+        # Calls made from within a call which is already being timed are
+        # counted, but not timed again.
+        depth = [0]
+
+        def wrapper(*args, **kwargs):
+            stats.count += 1
+            if depth[0]:
+                return func(*args, **kwargs)
+            depth[0] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.time += time.perf_counter() - start
+                depth[0] -= 1
+        return wrapper
+
+    def line_processor(self, func):
+        """
+        A wrapper of ``process_map_line`` which counts and times the lines
+        it processes by the region of the map file they are in.
+        """
+        regions = self.regions
+
+        def process_map_line(line, sm):
+            start = time.perf_counter()
+            func(line, sm)
+            # Headings are counted in the region they begin.
+            try:
+                region = regions[sm.state]
+            except KeyError:
+                region = regions[sm.state] = TimingStats()
+            region.count += 1
+            region.time += time.perf_counter() - start
+        return process_map_line
+
+    @contextmanager
+    def instrument(self, phase):
+        """
+        Account the time spent within the context to ``phase``, and track
+        the memory used meanwhile.
+        """
+        self.active = True
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + \
+                time.perf_counter() - start
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_traced = max(self.peak_traced or 0, peak)
+            if tracing:
+                tracemalloc.stop()
+            self.peak_rss = _peak_rss()
+            self.active = False
+
+    def record_map(self, memory_map):
+        self.nodes = len(memory_map.index.all_nodes)
+
+    @property
+    def total_time(self):
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        return OrderedDict([
+            ('time', self.total_time),
+            ('phases', OrderedDict(self.phases)),
+            ('regions', OrderedDict(
+                (name, OrderedDict([('lines', region.count),
+                                    ('time', region.time)]))
+                for name, region in self.regions.items()
+            )),
+            ('regexes', OrderedDict(
+                (name, OrderedDict([('attempts', regex.attempts),
+                                    ('hits', regex.hits),
+                                    ('hit_rate', regex.hit_rate)]))
+                for name, regex in self.regexes.items()
+            )),
+            ('calls', OrderedDict(
+                (name, OrderedDict([('calls', call.count),
+                                    ('time', call.time)]))
+                for name, call in self.calls.items()
+            )),
+            ('nodes', self.nodes),
+            ('peak_rss', self.peak_rss),
+            ('peak_traced', self.peak_traced),
+        ])
+
+    def report(self):
+        """
+        The statistics as text, with a table for each kind.
+        """
+        parts = []
+
+        tbl = PrettyTable(['PHASE', 'TIME (ms)'])
+        tbl.align['PHASE'] = 'l'
+        tbl.align['TIME (ms)'] = 'r'
+        for name, elapsed in self.phases.items():
+            tbl.add_row([name, '{0:.2f}'.format(elapsed * 1000)])
+        tbl.add_row(['TOTAL', '{0:.2f}'.format(self.total_time * 1000)])
+        parts.append(tbl.get_string())
+
+        tbl = PrettyTable(['FILE REGION', 'LINES', 'TIME (ms)'])
+        tbl.align['FILE REGION'] = 'l'
+        for heading in ('LINES', 'TIME (ms)'):
+            tbl.align[heading] = 'r'
+        for name, region in self.regions.items():
+            tbl.add_row([name, region.count,
+                         '{0:.2f}'.format(region.time * 1000)])
+        parts.append(tbl.get_string())
+
+        tbl = PrettyTable(['REGEX', 'ATTEMPTS', 'HITS', 'HIT RATE'])
+        tbl.align['REGEX'] = 'l'
+        for heading in ('ATTEMPTS', 'HITS', 'HIT RATE'):
+            tbl.align[heading] = 'r'
+        for name, regex in self.regexes.items():
+            if not regex.attempts:
+                continue
+            tbl.add_row([name, regex.attempts, regex.hits,
+                         '{0:.1%}'.format(regex.hit_rate)])
+        parts.append(tbl.get_string(sortby='ATTEMPTS', reversesort=True))
+
+        tbl = PrettyTable(['FUNCTION', 'CALLS', 'TIME (ms)'])
+        tbl.align['FUNCTION'] = 'l'
+        for heading in ('CALLS', 'TIME (ms)'):
+            tbl.align[heading] = 'r'
+        for name, call in self.calls.items():
+            tbl.add_row([name, call.count,
+                         '{0:.2f}'.format(call.time * 1000)])
+        parts.append(tbl.get_string())
+
+        lines = ["Nodes : {0}".format(self.nodes)]
+        if self.peak_rss is not None:
+            lines.append("Peak RSS : {0:.1f} MiB"
+                         "".format(self.peak_rss / 1048576))
+        if self.peak_traced is not None:
+            lines.append("Peak Traced Memory : {0:.1f} MiB"
+                         "".format(self.peak_traced / 1048576))
+        parts.append('\n'.join(lines))
+        return '\n\n'.join(parts) + '\n'
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Copyright (C) 2017 Chintalagiri Shashank
+#
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Watching map files for changes.
+
+Files are watched with inotify where it is available, and by polling
+their size and modification time otherwise. Linkers write map files in
+many small writes, and build systems often replace them altogether, so a
+change is only reported once the file has stopped changing for a short
+while.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+
+DEFAULT_SETTLE = 0.25
+DEFAULT_INTERVAL = 0.5
+
+
+def _signature(fname):
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class PollingWatcher(object):
+    def __init__(self, fnames, interval=DEFAULT_INTERVAL):
+        self.fnames = list(fnames)
+        self.interval = interval
+        self._signatures = {f: _signature(f) for f in self.fnames}
+
+    def wait(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds, or indefinitely if it is None, for
+        any of the files to change. Returns the files which changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = []
+            for fname in self.fnames:
+                signature = _signature(fname)
+                if signature != self._signatures[fname]:
+                    self._signatures[fname] = signature
+                    changed.append(fname)
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    # The directories holding the files are watched rather than the files
+    # themselves, so that files which are replaced rather than written to
+    # are still followed.
+    _IN_MODIFY = 0x00000002
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | \
+        _IN_CREATE | _IN_DELETE
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, fnames):
+        libname = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libname, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fnames = list(fnames)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Could not initialize inotify")
+        self._names = {}
+        self._dirs = {}
+        try:
+            for fname in self.fnames:
+                dirname = os.path.dirname(os.path.abspath(fname))
+                if dirname not in self._dirs.values():
+                    wd = libc.inotify_add_watch(
+                        self._fd, os.fsencode(dirname), self._MASK
+                    )
+                    if wd < 0:
+                        raise OSError(ctypes.get_errno(),
+                                      "Could not watch {0}".format(dirname))
+                    self._dirs[wd] = dirname
+                self._names[(dirname, os.path.basename(fname))] = fname
+        except Exception:
+            self.close()
+            raise
+
+    def wait(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds, or indefinitely if it is None, for
+        any of the files to change. Returns the files which changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None \
+                else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return []
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self._IN_Q_OVERFLOW:
+                # Events were lost, so any of the files could have changed.
+                return list(self.fnames)
+            fname = self._names.get((self._dirs.get(wd), name))
+            if fname is not None and fname not in changed:
+                changed.append(fname)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def get_watcher(fnames, polling=False, interval=DEFAULT_INTERVAL):
+    """
+    Get a watcher for the files, using inotify unless ``polling`` is set
+    or inotify is not available.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(fnames)
+        except (OSError, AttributeError, TypeError) as e:
+            logging.info("Polling for changes, inotify is not available : "
+                         "{0}".format(e))
+    return PollingWatcher(fnames, interval)
+
+
+def watch_files(fnames, settle=DEFAULT_SETTLE, watcher=None):
+    """
+    Yield the list of files which have changed, every time any of them
+    change. A file is only reported once it has not changed for ``settle``
+    seconds, and only if it exists and is actually different from when it
+    was last reported. Runs until the generator is closed.
+    """
+    fnames = list(fnames)
+    if watcher is None:
+        watcher = get_watcher(fnames)
+    signatures = {f: _signature(f) for f in fnames}
+    try:
+        while True:
+            pending = set(watcher.wait())
+            while True:
+                more = watcher.wait(settle)
+                if not more:
+                    break
+                pending.update(more)
+            changed = []
+            for fname in fnames:
+                if fname not in pending:
+                    continue
+                signature = _signature(fname)
+                if signature is None or signature == signatures[fname]:
+                    continue
+                signatures[fname] = signature
+                changed.append(fname)
+            if changed:
+                yield changed
+    finally:
+        watcher.close()
@@ -0,0 +1,43 @@
+
+
+from fpvgcc.datastructures.intervals import IntervalIndex
+from .vectors import example_map
+
+
+def test_interval_index():
+    index = IntervalIndex([(0, 10, 'a'), (2, 4, 'b'), (4, 4, 'c'),
+                           (8, 12, 'd'), (20, 30, 'e')])
+    assert len(index) == 4
+    assert index.lookup(-1) == ()
+    assert index.lookup(0) == ('a',)
+    assert index.lookup(3) == ('a', 'b')
+    assert index.lookup(4) == ('a',)
+    assert index.lookup(9) == ('a', 'd')
+    assert index.lookup(10) == ('d',)
+    assert index.lookup(15) == ()
+    assert index.lookup(29) == ('e',)
+    assert index.lookup(30) == ()
+
+
+def test_resolve_addresses(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    nodes = mm.root.all_nodes()
+    probes = set()
+    for node in nodes:
+        if node.is_placed:
+            probes.update([node._address - 1, node._address,
+                           node._address + node.size - 1,
+                           node._address + node.size])
+    for region in mm.memory_regions:
+        probes.update([region.origin, region.origin + region.size])
+    probes = sorted(probes)
+    resolved = list(mm.resolve_addresses(probes))
+    assert [r.address for r in resolved] == probes
+    for r in resolved:
+        assert list(r.nodes) == \
+            [n for n in nodes if n.contains_address(r.address)]
+        assert [x.name for x in r.regions] == \
+            [x.name for x in mm.memory_regions if r.address in x and
+             x.name not in mm.ctx.suppressed_regions]
+    assert mm.resolve_address(hex(probes[0])).address == probes[0]
@@ -0,0 +1,55 @@
+
+
+import pickle
+
+from fpvgcc.batch import MapSummary
+from fpvgcc.batch import summarize_map
+from fpvgcc.batch import expand_map_paths
+from fpvgcc.batch import process_map_files
+from .vectors import example_map
+from .vectors import EXAMPLE_FILES
+
+
+def _state(summary):
+    return (summary.fname, summary.profile, summary.regions,
+            summary.region_totals, summary.sections,
+            summary.section_totals, summary.error)
+
+
+def test_summarize_map(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    summary = summarize_map(sm, 'test.map')
+    objfiles, arfiles = mm.used_files
+    for idx, region in enumerate(mm.used_regions):
+        assert summary.region_fp[region] == \
+            sum(mm.get_objfile_fp(f)[idx] for f in objfiles) + \
+            sum(mm.get_arfile_fp(f)[idx] for f in arfiles)
+    assert _state(pickle.loads(pickle.dumps(summary))) == _state(summary)
+
+
+def test_expand_map_paths():
+    fnames = sorted(EXAMPLE_FILES.keys())
+    assert expand_map_paths(['tests/maps/*.map']) == fnames
+    assert expand_map_paths([fnames[1], 'tests/maps/*.map']) == \
+        [fnames[1], fnames[0], fnames[2]]
+    assert expand_map_paths(['missing.map']) == ['missing.map']
+    assert expand_map_paths(['tests/maps/*.missing', fnames[0]]) == \
+        ['tests/maps/*.missing', fnames[0]]
+
+
+def test_process_map_files_unmatched():
+    summaries = process_map_files(['tests/maps/*.missing'], jobs=1)
+    assert [s.fname for s in summaries] == ['tests/maps/*.missing']
+    assert summaries[0].error
+
+
+def test_process_map_files():
+    fnames = sorted(EXAMPLE_FILES.keys()) + ['missing.map']
+    serial = process_map_files(fnames, jobs=1)
+    parallel = process_map_files(fnames, jobs=2)
+    assert [_state(s) for s in serial] == [_state(s) for s in parallel]
+    assert [s.fname for s in parallel] == fnames
+    assert all(s.error is None and s.total for s in parallel[:-1])
+    assert isinstance(parallel[-1], MapSummary)
+    assert parallel[-1].error
@@ -0,0 +1,91 @@
+
+
+import io
+
+import pytest
+
+from fpvgcc.budget import check_budget
+from fpvgcc.budget import parse_limit
+from fpvgcc.budget import read_budget_rules
+from fpvgcc.diff import map_totals
+from fpvgcc.fpv import process_map_file
+from .vectors import example_map
+
+
+def _rules(text):
+    return read_budget_rules(io.StringIO(text))
+
+
+def test_parse_limit():
+    assert parse_limit('100') == (100, False)
+    assert parse_limit('0x100') == (256, False)
+    assert parse_limit('12K') == (12 * 1024, False)
+    assert parse_limit('1.5M') == (3 * 512 * 1024, False)
+    assert parse_limit('90%') == (90, True)
+    with pytest.raises(ValueError):
+        parse_limit('12KB')
+
+
+@pytest.mark.parametrize('text', [
+    'region RAM',
+    'segment RAM 12K',
+    'region RAM 12K ROM',
+    'objfile *.o 50%',
+    'symbol ( 12K',
+])
+def test_bad_rules(text):
+    with pytest.raises(ValueError):
+        _rules(text)
+
+
+def test_budget_regions(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    regions = map_totals(mm, nodes=False)['regions']
+    rules = ''.join('region {0} {1}\n'.format(region, size)
+                    for region, size in regions.items())
+    report = check_budget(mm, _rules(rules))
+    assert report.passed and report.checked == len(regions)
+    region, size = max(regions.items(), key=lambda x: x[1])
+    report = check_budget(mm, _rules('# Comment\nregion {0} {1}  # tight\n'
+                                     ''.format(region, size - 1)))
+    assert not report.passed
+    violation = report.violations[0]
+    assert (violation.name, violation.size, violation.excess) == \
+        (region, size, 1)
+    assert report.as_dict()['violations'][0]['line'] == 2
+
+
+def test_budget_patterns():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    report = check_budget(mm, _rules(
+        'region R* 95%\n'
+        'arfile librandom-test-msp430f5529.a 600 ROM\n'
+        'objfile *.c.obj 4K\n'
+        'section .bss 1K\n'
+        'symbol ^asg64$ 0x10\n'
+    ))
+    assert [(v.rule.kind, v.name, v.size) for v in report.violations] == \
+        [('arfile', 'librandom-test-msp430f5529.a', 658),
+         ('section', '.bss', 1124),
+         ('symbol', 'asg64', 24)]
+    report = check_budget(mm, _rules('region RAM 10%\n'))
+    assert report.violations[0].limit == 819
+
+
+def test_budget_unmatched():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    rules = _rules(
+        'region RAM 100%\n'
+        'section .nosuchsection 1K\n'
+        'objfile *.c.obj 100K NOSUCHREGION\n'
+    )
+    report = check_budget(mm, rules)
+    assert report.passed
+    assert report.unmatched == rules[1:]
+    assert [r['line'] for r in report.as_dict()['unmatched']] == [2, 3]
+    report = check_budget(mm, rules, strict=True)
+    assert not report.passed and not report.violations
+    assert check_budget(mm, rules[:1], strict=True).passed
@@ -0,0 +1,81 @@
+
+
+import os
+import shutil
+
+from fpvgcc.cache import MapCache
+from fpvgcc.cache import CACHE_EXTENSION
+from .vectors import example_map
+
+
+def _describe(sm):
+    mm = sm.memory_map
+    return (
+        [repr(node) for node in mm.root.all_nodes()],
+        [repr(region) for region in mm.memory_regions],
+        repr(mm.aliases),
+        sm.loaded_files,
+        [repr(sym) for sym in sm.common_symbols],
+        [repr(d) for d in sm.linker_defined_addresses],
+    )
+
+
+def test_cache_roundtrip(example_map, tmp_path, request):
+    sm, vectors = example_map
+    fname = str(tmp_path / 'test.map')
+    shutil.copy(request.node.callspec.params['example_map'], fname)
+    cache = MapCache(str(tmp_path / 'cache'))
+    assert cache.load(fname, sm.ctx) is None
+    cache.store(fname, sm)
+    loaded = cache.load(fname, sm.ctx)
+    assert loaded is not None
+    assert loaded.state == 'CACHED'
+    assert _describe(loaded) == _describe(sm)
+    assert loaded.memory_map.used_regions == sm.memory_map.used_regions
+    for objfile in sm.memory_map.used_objfiles:
+        assert loaded.memory_map.get_objfile_fp(objfile) == \
+            sm.memory_map.get_objfile_fp(objfile)
+
+
+def test_cache_key(tmp_path):
+    fname = str(tmp_path / 'test.map')
+    with open(fname, 'w') as f:
+        f.write('content')
+    cache = MapCache(str(tmp_path / 'cache'))
+    key = cache.key(fname)
+    assert cache.key(fname) == key
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.key(fname) != key
+
+
+def test_cache_eviction(tmp_path):
+    cachedir = tmp_path / 'cache'
+    cachedir.mkdir()
+    for idx in range(4):
+        path = cachedir / 'entry{0}{1}'.format(idx, CACHE_EXTENSION)
+        path.write_bytes(b'x' * 100)
+        os.utime(str(path), (1000 + idx, 1000 + idx))
+    (cachedir / 'unrelated').write_bytes(b'x' * 1000)
+
+    cache = MapCache(str(cachedir), max_size=250, max_age=None)
+    cache.evict()
+    assert sorted(os.listdir(str(cachedir))) == \
+        ['entry2' + CACHE_EXTENSION, 'entry3' + CACHE_EXTENSION, 'unrelated']
+
+    cache = MapCache(str(cachedir), max_size=None, max_age=3600)
+    cache.evict()
+    assert os.listdir(str(cachedir)) == ['unrelated']
+
+
+def test_cache_corrupt_entry(tmp_path):
+    fname = str(tmp_path / 'test.map')
+    with open(fname, 'w') as f:
+        f.write('content')
+    cache = MapCache(str(tmp_path / 'cache'))
+    os.makedirs(cache.cachedir)
+    path = cache.path(fname, cache.key(fname))
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    assert cache.load(fname) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,52 @@
+
+
+import io
+import pytest
+
+from fpvgcc.cli import run_report
+from fpvgcc.cli import run_reports
+from fpvgcc.cli import parse_report_spec
+from fpvgcc.cli import read_report_spec_file
+from .vectors import example_map
+
+
+def test_parse_report_spec():
+    assert parse_report_spec('sar') == ('sar', None)
+    assert parse_report_spec('ssym=all') == ('ssym', 'all')
+    assert parse_report_spec('sobj=libc.a') == ('sobj', 'libc.a')
+    for spec in ['nothing', 'ssym', 'sar=all']:
+        with pytest.raises(ValueError):
+            parse_report_spec(spec)
+
+
+def test_read_report_spec_file():
+    spec = io.StringIO(
+        "# Reports for the nightly build\n"
+        "sar         sar.txt\n"
+        "\n"
+        "ssym=all    symbols.txt   # All symbols\n"
+        "uregions\n"
+    )
+    assert read_report_spec_file(spec) == [
+        ('sar', None, 'sar.txt'),
+        ('ssym', 'all', 'symbols.txt'),
+        ('uregions', None, '-'),
+    ]
+    with pytest.raises(ValueError):
+        read_report_spec_file(io.StringIO("sar a.txt b.txt\n"))
+
+
+def test_run_reports(example_map, tmp_path, capsys):
+    sm, vectors = example_map
+    reports = [('sar', None), ('ssec', None), ('ssym', 'all'),
+               ('uregions', None), ('lmap', 'root')]
+    expected = []
+    for report, arg in reports:
+        run_report(sm, report, arg)
+        expected.append(capsys.readouterr().out)
+    outfiles = [str(tmp_path / '{0}.txt'.format(r)) for r, a in reports]
+    run_reports(sm, [r + (o,) for r, o in zip(reports, outfiles)])
+    assert capsys.readouterr().out == ''
+    for outfile, content in zip(outfiles, expected):
+        with open(outfile) as f:
+            assert f.read() == content
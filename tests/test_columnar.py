@@ -0,0 +1,62 @@
+
+
+import pytest
+
+from fpvgcc import columnar
+from fpvgcc.columnar import COLUMNS
+from fpvgcc.columnar import ColumnarMemoryMap
+from .vectors import example_map
+
+
+def _expected(fps):
+    return {attr: {k: v for k, v in fps[attr].items() if v}
+            for attr in ('objfile', 'arfile', 'name')}
+
+
+def _check_footprints(cmap, mm):
+    rgn = _expected(mm.footprints._rgn)
+    sec = _expected(mm.footprints._sec)
+    for attr in ('objfile', 'arfile', 'name'):
+        assert cmap.region_footprints(attr) == rgn[attr]
+        assert cmap.section_footprints(attr) == sec[attr]
+
+
+def test_columnar_from_memory_map(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    cmap = ColumnarMemoryMap.from_memory_map(mm)
+    nodes = mm.root.all_nodes()
+    assert len(cmap) == len(nodes)
+    assert [cmap.string(x) for x in cmap['name']] == \
+        [node.name for node in nodes]
+    _check_footprints(cmap, mm)
+
+
+def test_columnar_from_map_file(example_map, request):
+    sm, vectors = example_map
+    fname = request.node.callspec.params['example_map']
+    cmap = ColumnarMemoryMap.from_map_file(fname)
+    _check_footprints(cmap, sm.memory_map)
+
+
+def test_columnar_without_numpy(example_map, monkeypatch):
+    sm, vectors = example_map
+    monkeypatch.setattr(columnar, 'numpy', None)
+    cmap = ColumnarMemoryMap.from_memory_map(sm.memory_map)
+    _check_footprints(cmap, sm.memory_map)
+    with pytest.raises(ImportError):
+        cmap.save('unused.npz')
+
+
+@pytest.mark.parametrize('fname', ['columns', 'columns.npz'])
+def test_columnar_save_load(example_map, tmp_path, fname):
+    pytest.importorskip('numpy')
+    sm, vectors = example_map
+    cmap = ColumnarMemoryMap.from_memory_map(sm.memory_map)
+    path = str(tmp_path / fname)
+    cmap.save(path)
+    loaded = ColumnarMemoryMap.load(path)
+    assert loaded.strings == cmap.strings
+    for column in COLUMNS:
+        assert list(loaded[column]) == list(cmap[column])
+    _check_footprints(loaded, sm.memory_map)
@@ -0,0 +1,57 @@
+
+
+from fpvgcc.batch import summarize_map
+from fpvgcc.diff import diff_maps
+from fpvgcc.diff import map_totals
+from fpvgcc.fpv import process_map_file
+from .vectors import example_map
+
+
+def test_diff_unchanged(example_map):
+    sm, vectors = example_map
+    mdiff = diff_maps(sm.memory_map, sm.memory_map)
+    assert not mdiff
+    assert all(not deltas for kind, deltas in mdiff.items())
+
+
+def test_map_totals(example_map):
+    sm, vectors = example_map
+    totals = map_totals(sm.memory_map)
+    summary = summarize_map(sm)
+    for region, total in summary.region_fp.items():
+        assert totals['regions'].get(region, 0) == total
+    for section, total in summary.section_fp.items():
+        assert totals['sections'].get(section, 0) == total
+
+
+def test_diff_maps(tmpdir):
+    fname = 'tests/maps/example.msp430-elf.0.map'
+    with open(fname) as f:
+        content = f.read()
+    line = ' .bss.asg64     0x00000000000024f6       0x18 '
+    path = str(tmpdir.join('example.map'))
+    with open(path, 'w') as f:
+        f.write(content.replace(line, line.replace('0x18 ', '0x20 ')))
+    before = process_map_file(fname, 'auto').memory_map
+    after = process_map_file(path, 'auto').memory_map
+    mdiff = diff_maps(before, after)
+    assert [(d.key, d.delta) for d in mdiff.regions] == [('RAM', 8)]
+    assert [(d.key, d.delta) for d in mdiff.sections] == [('.bss', 8)]
+    assert [(d.key, d.delta) for d in mdiff.objfiles] == \
+        [('test_random.c.obj', 8)]
+    assert [(d.key, d.before, d.after) for d in mdiff.symbols] == \
+        [('asg64', 24, 32)]
+    assert [d.key for d in mdiff.nodes] == ['.bss.asg64']
+    assert mdiff.total == 8
+    reverse = diff_maps(after, before)
+    assert [(d.key, d.delta) for d in reverse.regions] == [('RAM', -8)]
+
+
+def test_diff_sorted(example_map):
+    sm, vectors = example_map
+    empty = process_map_file('tests/maps/example.arm-none-eabi.basic.0.map',
+                             'auto').memory_map
+    mdiff = diff_maps(empty, sm.memory_map)
+    for kind, deltas in mdiff.items():
+        magnitudes = [abs(d.delta) for d in deltas]
+        assert magnitudes == sorted(magnitudes, reverse=True)
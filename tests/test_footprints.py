@@ -0,0 +1,63 @@
+
+
+from .vectors import example_map
+
+
+def _naive_rgn_fp(mm, attr, value, region):
+    rv = 0
+    for node in mm.root.all_nodes():
+        if getattr(node, attr) != value or node.leafsize is None:
+            continue
+        if region == 'VEC' and mm.collapse_vectors:
+            if 'VEC' in node.region:
+                rv += node.leafsize
+        elif node.region == region:
+            rv += node.leafsize
+    return rv
+
+
+def _naive_sec_fp(mm, attr, value, section):
+    if section == '.*vec*':
+        return sum(_naive_sec_fp(mm, attr, value, s)
+                   for s in mm._vector_sections)
+    rv = 0
+    for node in mm.get_node(section).all_nodes():
+        if getattr(node, attr) == value and node.leafsize is not None:
+            rv += node.leafsize
+    return rv
+
+
+def test_region_footprints(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    regions = mm.used_regions
+    for objfile in mm.used_objfiles:
+        assert mm.get_objfile_fp(objfile) == \
+            [_naive_rgn_fp(mm, 'objfile', objfile, r) for r in regions]
+    for arfile in mm.used_arfiles:
+        assert mm.get_arfile_fp(arfile) == \
+            [_naive_rgn_fp(mm, 'arfile', arfile, r) for r in regions]
+    for symbol in mm.all_symbols:
+        assert mm.get_symbol_fp(symbol) == \
+            [_naive_rgn_fp(mm, 'name', symbol, r) for r in regions]
+
+
+def test_section_footprints(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    sections = mm.used_sections
+    for objfile in mm.used_objfiles:
+        assert mm.get_objfile_fp_secs(objfile) == \
+            [_naive_sec_fp(mm, 'objfile', objfile, s) for s in sections]
+    for arfile in mm.used_arfiles:
+        assert mm.get_arfile_fp_secs(arfile) == \
+            [_naive_sec_fp(mm, 'arfile', arfile, s) for s in sections]
+
+
+def test_footprints_invalidate(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    footprints = mm.footprints
+    assert mm.footprints is footprints
+    mm.invalidate_footprints()
+    assert mm.footprints is not footprints
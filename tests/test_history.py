@@ -0,0 +1,66 @@
+
+
+import pytest
+
+from fpvgcc.diff import map_totals
+from fpvgcc.fpv import process_map_file
+from fpvgcc.history import FootprintHistory
+from .vectors import example_map
+
+
+@pytest.fixture
+def history(tmpdir):
+    with FootprintHistory(str(tmpdir.join('history.db'))) as h:
+        yield h
+
+
+def test_history_totals(history, example_map):
+    sm, vectors = example_map
+    build = history.add_build(sm, label='a')
+    totals = map_totals(sm.memory_map, nodes=False)
+    for region, size in totals['regions'].items():
+        assert history.footprint(build, 'region', region) == size
+    for objfile, size in totals['objfiles'].items():
+        assert history.footprint(build, 'objfile', objfile) == size
+    for section, size in totals['sections'].items():
+        assert history.section_series(section) == [(build.id, size)]
+    assert history.build('a').id == build.id
+
+
+def test_history_queries(history, tmpdir):
+    fname = 'tests/maps/example.msp430-elf.0.map'
+    with open(fname) as f:
+        content = f.read()
+    line = ' .bss.asg64     0x00000000000024f6       0x18 '
+    path = str(tmpdir.join('example.map'))
+    with open(path, 'w') as f:
+        f.write(content.replace(line, line.replace('0x18 ', '0x20 ')))
+    builds = [history.add_build(process_map_file(m, 'auto'), label=label)
+              for m, label in ((fname, 'v1'), (fname, 'v2'), (path, 'v3'))]
+
+    assert [b.label for b in history.builds()] == ['v1', 'v2', 'v3']
+    assert [b.label for b in history.builds(last=2)] == ['v2', 'v3']
+    growers = history.top_growers('objfile', last=3)
+    assert [(g.name, g.delta) for g in growers] == \
+        [('test_random.c.obj', 8)]
+    assert history.top_growers('symbol', last=2, region='RAM')[0].name == \
+        'asg64'
+    assert history.top_growers('objfile', last=1) == []
+
+    build, size = history.first_exceeding('symbol', 'asg64', 24)
+    assert build.id == builds[2].id and size == 32
+    assert history.first_exceeding('symbol', 'asg64', 32) is None
+    assert history.first_exceeding('symbol', 'missing', 0) is None
+    assert [size for build, size in history.series('region', 'RAM')] == \
+        [1352, 1352, 1360]
+
+
+def test_history_reopen(tmpdir, example_map):
+    sm, vectors = example_map
+    path = str(tmpdir.join('history.db'))
+    with FootprintHistory(path) as history:
+        history.add_build(sm)
+    with FootprintHistory(path) as history:
+        history.add_build(sm)
+        assert len(history.builds()) == 2
+        assert history.top_growers('objfile', last=2) == []
@@ -0,0 +1,55 @@
+
+
+import os
+
+from fpvgcc.fpv import process_map_file
+from fpvgcc.incremental import IncrementalMap
+from fpvgcc.incremental import process_map_file_incremental
+from .test_parallel import _describe
+from .test_parallel import _fname
+from .vectors import example_map
+
+
+def test_incremental_build(example_map, request):
+    sm, vectors = example_map
+    imap = IncrementalMap(_fname(request), profile='auto')
+    changed = imap.update()
+    assert changed == [node.name for node in sm.memory_map.top_level_nodes]
+    assert _describe(imap.sm) == _describe(sm)
+    assert imap.update() == []
+    assert _describe(imap.sm) == _describe(sm)
+
+
+def test_incremental_update(tmpdir):
+    fname = 'tests/maps/example.msp430-elf.0.map'
+    with open(fname) as f:
+        content = f.read()
+    path = str(tmpdir.join('example.map'))
+    with open(path, 'w') as f:
+        f.write(content)
+    imap = IncrementalMap(path, profile='auto')
+    imap.update()
+    root = imap.sm.memory_map.root
+    bss = root.get_child_by_ident('bss')
+    text = root.get_child_by_ident('text')
+    line = ' .bss.asg64     0x00000000000024f6       0x18 '
+    assert line in content
+    with open(path, 'w') as f:
+        f.write(content.replace(line, line.replace('0x18 ', '0x20 ')))
+    # Only the changed section is parsed again and replaced.
+    assert imap.update() == ['bss']
+    assert root.get_child_by_ident('bss') is not bss
+    assert root.get_child_by_ident('text') is text
+    assert _describe(imap.sm) == _describe(process_map_file(path, 'auto'))
+
+
+def test_incremental_state(tmpdir):
+    fname = 'tests/maps/example.arm-none-eabi.basic.0.map'
+    cachedir = str(tmpdir)
+    sm = process_map_file_incremental(fname, profile='auto',
+                                      cachedir=cachedir)
+    assert len(os.listdir(cachedir)) == 1
+    csm = process_map_file_incremental(fname, profile='auto',
+                                       cachedir=cachedir)
+    assert _describe(csm) == _describe(sm)
+    assert _describe(csm) == _describe(process_map_file(fname, 'auto'))
@@ -0,0 +1,95 @@
+from fpvgcc.fpv import process_map_file
+from .vectors import example_map
+
+
+def _naive_distinct(nodes, attr):
+    rv = []
+    for node in nodes:
+        if getattr(node, attr) not in rv:
+            rv.append(getattr(node, attr))
+    return rv
+
+
+def test_index_lookups(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    nodes = mm.root.all_nodes()
+    assert mm.all_symbols == _naive_distinct(nodes, 'name')
+    for objfile in mm.used_objfiles:
+        assert mm.objfile_nodes(objfile) == \
+            [n for n in nodes if n.objfile == objfile]
+    for arfile in mm.used_arfiles:
+        assert mm.arfile_nodes(arfile) == \
+            [n for n in nodes if n.arfile == arfile]
+        assert mm.symbols_from_file(arfile) == _naive_distinct(
+            [n for n in nodes if arfile in [n.objfile, n.arfile]], 'name'
+        )
+    for region in mm.used_regions:
+        assert mm.region_nodes(region) == \
+            [n for n in nodes if n.region == region]
+
+
+def test_used_files(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    objfiles, arfiles = mm.used_files
+    assert None not in objfiles
+    assert arfiles == [x for x in mm.used_arfiles if x is not None]
+    for objfile in objfiles:
+        assert all(n.arfile is None for n in mm.objfile_nodes(objfile)
+                   if n.leafsize and
+                   n.region not in ['DISCARDED', 'UNDEF'])
+
+
+def test_index_invalidation(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    index = mm.index
+    footprints = mm.footprints
+    assert mm.index is index
+    node = mm.top_level_nodes[0].add_child(name='fpvgcc_test_node')
+    assert mm.index is not index
+    assert mm.footprints is not footprints
+    assert node in mm.symbol_nodes('fpvgcc_test_node')
+    node.parent.children.remove(node)
+    mm.invalidate()
+    assert not mm.symbol_nodes('fpvgcc_test_node')
+
+
+def test_index_leaf_mutation():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    regions = mm.used_regions
+    ram = regions.index('RAM')
+    footprint = mm.get_objfile_fp('usbcdc.c.obj')
+    node = [n for n in mm.objfile_nodes('usbcdc.c.obj')
+            if n.leafsize and n.region == 'RAM'][0]
+    node.osize = hex(node.osize + 1000)
+    footprint[ram] += 1000
+    assert mm.get_objfile_fp('usbcdc.c.obj') == footprint
+    node.objfile = 'zzz.obj'
+    assert node in mm.objfile_nodes('zzz.obj')
+    assert node not in mm.objfile_nodes('usbcdc.c.obj')
+    assert mm.get_objfile_fp('zzz.obj')[ram] == node.leafsize
+    footprint[ram] -= node.leafsize
+    assert mm.get_objfile_fp('usbcdc.c.obj') == footprint
+    node.arfile = 'libzzz.a'
+    assert mm.get_arfile_fp('libzzz.a')[ram] == node.leafsize
+
+
+def test_index_rename():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    node = [n for n in mm.index.all_nodes
+            if n.leafsize and n.region == 'RAM' and n.is_leaf][0]
+    old = node.name
+    ram = mm.used_regions.index('RAM')
+    footprint = mm.get_symbol_fp(old)
+    assert node in mm.symbol_nodes(old)
+    node.name = 'renamed'
+    assert 'renamed' in mm.all_symbols
+    assert node in mm.symbol_nodes('renamed')
+    assert node not in mm.symbol_nodes(old)
+    assert mm.get_symbol_fp('renamed')[ram] == node.leafsize
+    footprint[ram] -= node.leafsize
+    assert mm.get_symbol_fp(old) == footprint
@@ -0,0 +1,152 @@
+
+
+import pytest
+
+from fpvgcc.datastructures.ntreeSize import SizeNTree
+from fpvgcc.datastructures.ntreeSize import SizeNTreeNode
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.profiles import get_profile
+from .vectors import example_map
+
+
+def _naive_disambig(node, ident, prospective):
+    disambig = None
+    for child in node.children:
+        if ':' in child.ident:
+            name, d = child.ident.split(':')
+            if name == ident:
+                disambig = max(disambig or 0, int(d))
+        elif prospective and child.ident == ident:
+            disambig = disambig or 0
+    return disambig
+
+
+def test_child_index(example_map):
+    sm, vectors = example_map
+    for node in sm.memory_map.root.all_nodes():
+        for child in node.children:
+            assert node.get_child_by_ident(child.ident) is child
+            name = child.ident.split(':')[0]
+            for prospective in (False, True):
+                assert node.get_child_disambig(name, prospective) == \
+                    _naive_disambig(node, name, prospective)
+        with pytest.raises(ValueError):
+            node.get_child_by_ident('no_such_child')
+
+
+def test_child_index_renames():
+    mm = GCCMemoryMap(get_profile('default'))
+    node = mm.get_node('.text.foo', create=True)
+    text = node.parent
+    assert mm.get_node('.text.foo') is node
+
+    node.ident = 'bar'
+    assert mm.get_node('.text.bar') is node
+    with pytest.raises(ValueError):
+        mm.get_node('.text.foo')
+
+    node.name = 'foo:1'
+    assert mm.get_node('.text.foo:1') is node
+    assert mm.get_node_disambig('.text.foo') == 1
+    node.name = 'foo:3'
+    assert mm.get_node_disambig('.text.foo') == 3
+    assert mm.get_node_disambig('.text.bar', prospective=True) is None
+
+    text.remove_child(node)
+    assert mm.get_node_disambig('.text.foo') is None
+    with pytest.raises(ValueError):
+        mm.get_node('.text.foo:3')
+    assert node.gident == '.text.foo:3'
+
+
+def _naive_size(node):
+    if node.is_leaf:
+        return node.leafsize
+    return sum(_naive_size(child) for child in node.children)
+
+
+def test_cached_sizes(example_map):
+    sm, vectors = example_map
+    for node in sm.memory_map.root.all_nodes():
+        if node.leafsize is not None or not node.is_leaf:
+            assert node.size == _naive_size(node)
+
+
+def test_cached_sizes_dirty():
+    mm = GCCMemoryMap(get_profile('default'))
+    foo = mm.get_node('.text.foo', create=True)
+    foo.osize = '0x10'
+    bar = mm.get_node('.text.bar', create=True)
+    bar.osize = '0x20'
+    text = foo.parent
+    assert text.size == 0x30
+    assert mm.root.size == 0x30
+
+    foo.fillsize = 2
+    assert text.size == 0x32
+    assert mm.root.size == 0x32
+
+    baz = mm.get_node('.text.bar.baz', create=True)
+    baz.osize = '0x4'
+    assert bar.size == 0x4
+    assert mm.root.size == 0x16
+
+    text.remove_child(foo)
+    assert mm.root.size == 0x4
+
+
+class _SizedNode(SizeNTreeNode):
+    __slots__ = ('name', '_leafsize')
+    _ident_property = 'name'
+
+    def __init__(self, parent=None, node_t=None, name=None):
+        super(_SizedNode, self).__init__(parent, node_t)
+        self.name = name
+        self._leafsize = None
+
+    @property
+    def leafsize(self):
+        return self._leafsize
+
+    @leafsize.setter
+    def leafsize(self, value):
+        self._leafsize = value
+        self.mark_size_dirty()
+
+
+_SizedNode.node_t = _SizedNode
+
+
+class _SizedTree(SizeNTree):
+    node_t = _SizedNode
+
+
+def test_cached_sizes_missing():
+    tree = _SizedTree()
+    tree.root.name = 'root'
+    a, b, c = [tree.root.add_child(_SizedNode(name=name))
+               for name in 'abc']
+    a.leafsize = 1
+    c.leafsize = 4
+    assert tree.size == 'Err'
+    # The error is not kept, while the sizes of the other children are.
+    assert tree.root._size_dirty
+    assert not c._size_dirty
+    b.leafsize = 2
+    assert tree.size == 7
+    a.leafsize = None
+    assert tree.size == 'Err'
+    a.leafsize = 1
+    c.leafsize = 8
+    assert tree.size == 11
+
+
+def test_compact_nodes(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    strings = {}
+    for node in mm.root.all_nodes():
+        assert not hasattr(node, '__dict__')
+        for value in (node.arfile, node.objfile, node.arfolder):
+            if value is not None:
+                assert strings.setdefault(value, value) is value
@@ -0,0 +1,80 @@
+
+
+import io
+import csv
+import json
+
+import pytest
+
+from fpvgcc.cli import run_report
+from fpvgcc.output import write_report
+from .vectors import example_map
+
+
+ROWS = [('a.o', [1, 2]), ('b.o', [0, 7]), ('c.o', [3, 0]), ('d.o', [0, 0])]
+
+
+def _write(fmt, top=None):
+    stream = io.StringIO()
+    write_report('FILE', ['RAM', 'ROM'], iter(ROWS), fmt, top, stream)
+    return stream.getvalue()
+
+
+def test_streaming_formats():
+    records = json.loads(_write('json'))
+    assert [r['FILE'] for r in records] == ['a.o', 'b.o', 'c.o']
+    assert records[1] == {'FILE': 'b.o', 'RAM': 0, 'ROM': 7, 'TOTAL': 7}
+    assert [json.loads(line) for line in _write('ndjson').splitlines()] \
+        == records
+    table = list(csv.reader(io.StringIO(_write('csv'))))
+    assert table[0] == ['FILE', 'RAM', 'ROM', 'TOTAL']
+    assert table[1:] == [[r['FILE'], str(r['RAM']), str(r['ROM']),
+                          str(r['TOTAL'])] for r in records]
+    assert json.loads(_write('json', top=0)) == []
+
+
+def test_top_rows():
+    assert [r['FILE'] for r in json.loads(_write('json', top=2))] == \
+        ['b.o', 'a.o']
+    table = _write('table', top=2)
+    assert 'b.o' in table and 'c.o' not in table
+    # Totals cover every row, not only the top ones.
+    assert '| TOTALS |   4 |   9 |' in table
+
+
+def test_unattributed_rows():
+    rows = [(None, [5, 1])] + ROWS
+    for fmt in ['json', 'ndjson', 'csv']:
+        stream = io.StringIO()
+        write_report('FILE', ['RAM', 'ROM'], iter(rows), fmt, None, stream)
+        output = stream.getvalue()
+        assert 'a.o' in output and 'd.o' not in output
+        assert 'None' not in output and 'null' not in output
+    stream = io.StringIO()
+    write_report('FILE', ['RAM', 'ROM'], iter(rows), 'table', None, stream)
+    assert 'None' in stream.getvalue() and 'd.o' in stream.getvalue()
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        _write('xml')
+
+
+@pytest.mark.parametrize('report', ['sar', 'ssec', 'ssym'])
+def test_report_formats(example_map, capsys, report):
+    sm, vectors = example_map
+    arg = 'all' if report == 'ssym' else None
+    run_report(sm, report, arg)
+    table = capsys.readouterr().out
+    run_report(sm, report, arg, fmt='ndjson')
+    records = [json.loads(l) for l in capsys.readouterr().out.splitlines()]
+    # Every row of the table, other than the totals and those without a
+    # name or a size, is in the records.
+    rows = [[cell.strip() for cell in line.split('|')[1:-1]]
+            for line in table.splitlines()[3:-2]]
+    assert len(records) == len([row for row in rows
+                                if row[0] != 'None' and row[-1] != '0'])
+    run_report(sm, report, arg, fmt='json', top=3)
+    top = json.loads(capsys.readouterr().out)
+    largest = sorted(records, key=lambda r: -r['TOTAL'])[:3]
+    assert [r['TOTAL'] for r in top] == [r['TOTAL'] for r in largest]
@@ -0,0 +1,78 @@
+
+
+import os
+import mmap
+
+import pytest
+
+from fpvgcc.parallel import parallel_jobs
+from fpvgcc.parallel import plan_block_ranges
+from fpvgcc.parallel import process_map_file_parallel
+from .vectors import example_map
+
+
+def _describe(sm):
+    mm = sm.memory_map
+    return (
+        [repr(node) for node in mm.root.all_nodes()],
+        [repr(region) for region in mm.memory_regions],
+        mm.aliases.items(),
+        mm.used_regions,
+        sm.loaded_files,
+        [repr(d) for d in sm.linker_defined_addresses],
+    )
+
+
+def _fname(request):
+    return request.node.callspec.params['example_map']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4096])
+def test_parallel_parse(example_map, request, chunk_size):
+    sm, vectors = example_map
+    psm = process_map_file_parallel(_fname(request), profile='auto',
+                                    jobs=1, chunk_size=chunk_size)
+    assert _describe(psm) == _describe(sm)
+
+
+def test_parallel_parse_workers(example_map, request):
+    sm, vectors = example_map
+    psm = process_map_file_parallel(_fname(request), profile='auto',
+                                    jobs=2, chunk_size=4096)
+    assert _describe(psm) == _describe(sm)
+
+
+def test_plan_block_ranges():
+    fname = 'tests/maps/example.arm-none-eabi.basic.0.map'
+    with open(fname, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start, ranges, end = plan_block_ranges(mapping, 4, chunk_size=1)
+            headings = [mapping[r.start:mapping.find(b'\n', r.start)]
+                        for r in ranges]
+        finally:
+            mapping.close()
+    assert ranges[0].start == start and ranges[-1].end == end
+    for previous, following in zip(ranges, ranges[1:]):
+        assert previous.end == following.start
+    # .ARM.exidx and .ARM.attributes add to the ARM node started by
+    # .ARM.extab, and so have to be parsed after it.
+    serial = [h for h, r in zip(headings, ranges) if not r.parallel]
+    assert serial and all(h.startswith(b'.ARM') for h in serial)
+
+
+def test_parallel_jobs(monkeypatch):
+    fname = 'tests/maps/example.arm-none-eabi.basic.0.map'
+    assert parallel_jobs(fname, 8) == 1
+    monkeypatch.setattr(os.path, 'getsize', lambda f: 64 << 20)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    assert parallel_jobs(fname, 8) == 1
+    monkeypatch.setattr(os, 'cpu_count', lambda: 16)
+    assert parallel_jobs(fname, 8) == 8
+    assert parallel_jobs(fname) == 16
+    assert parallel_jobs(fname, 2) == 1
+    # A megabyte of the map file for each process.
+    monkeypatch.setattr(os.path, 'getsize', lambda f: 6 << 20)
+    assert parallel_jobs(fname, 8) == 6
+    monkeypatch.setattr(os.path, 'getsize', lambda f: 3 << 20)
+    assert parallel_jobs(fname, 8) == 1
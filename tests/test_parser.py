@@ -0,0 +1,99 @@
+
+
+import glob
+
+from fpvgcc.fpv import re_linkermap
+from fpvgcc.fpv import re_headings
+from fpvgcc.fpv import check_line_for_heading
+from fpvgcc.fpv import classify_linkermap_line
+from fpvgcc.fpv import match_linkermap_line
+from fpvgcc.fpv import _linkermap_unexpected
+from fpvgcc.gccMemoryMap import LinkAliases
+
+
+def _sequential_match(l, state, symbol_pending):
+    # The order in which process_linkermap_line used to probe each of the
+    # expressions.
+    if state == 'NORMAL':
+        order = ['LOAD', 'DEFN_ADDR', 'SECTION_HEADINGS']
+    else:
+        order = ['SECTION_HEADINGS', 'FILL', 'LINKALIASES',
+                 'SYMBOL', 'SYMBOLONLY']
+        if symbol_pending:
+            order = ['SYMBOLDETAIL'] + order
+    for key in order:
+        if re_linkermap[key].match(l):
+            return key
+    return None
+
+
+def _map_lines():
+    for fname in sorted(glob.glob('tests/maps/*.map')):
+        with open(fname) as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def test_classify_linkermap_line():
+    assert classify_linkermap_line('.text 0x00004400 0x10\n') == 'NAME'
+    assert classify_linkermap_line('LOAD crt0.o\n') == 'LOAD'
+    assert classify_linkermap_line('OUTPUT(a.elf elf32-msp430)\n') == \
+        'OTHER'
+    assert classify_linkermap_line(
+        '                0x00004400        0x10 a.o\n') == 'DETAIL'
+    assert classify_linkermap_line(' *fill*  0x00004400  0x1\n') == 'STAR'
+    assert classify_linkermap_line(' .text.main\n') == 'SYMNAMEONLY'
+    assert classify_linkermap_line(
+        ' .text.main  0x00004400  0x10 a.o\n') == 'SYMNAME'
+    assert classify_linkermap_line(' 0x00004400 _x = 0x1\n') == 'ADDR'
+    assert classify_linkermap_line(' COMMON  0x00004400  0x10 a.o\n') == \
+        'INDENTED'
+
+
+def test_match_linkermap_line():
+    for line in _map_lines():
+        for state in ['NORMAL', 'IN_SECTION']:
+            for pending in [False, True]:
+                key, match = match_linkermap_line(line, state, pending)
+                assert key == _sequential_match(line, state, pending)
+                if key is not None:
+                    assert match.group(0) == \
+                        re_linkermap[key].match(line).group(0)
+
+
+def test_linkermap_unexpected():
+    # Every expression other than those handled outside of sections which
+    # matches a line is among those listed for its class.
+    handled = ['LOAD', 'DEFN_ADDR', 'SECTION_HEADINGS']
+    for line in _map_lines():
+        candidates = _linkermap_unexpected.get(
+            classify_linkermap_line(line), ()
+        )
+        for key, regex in re_linkermap.items():
+            if key not in handled and regex.match(line):
+                assert key in candidates
+
+
+def test_check_line_for_heading():
+    for line in _map_lines():
+        expected = None
+        for key, regex in re_headings.items():
+            if regex.match(line):
+                expected = key
+                break
+        assert check_line_for_heading(line) == expected
+
+
+def test_link_aliases_longest_match():
+    aliases = LinkAliases()
+    aliases.register_alias('.text', '.init')
+    aliases.register_alias('.data', '.init_array')
+    aliases.register_alias('.bss', 'COMMON')
+    assert aliases.encode('.init_array') == '.data.init_array'
+    assert aliases.encode('.init') == '.text.init'
+    assert aliases.encode('.initx') == '.text.initx'
+    assert aliases.encode('.ini') == '.ini'
+    assert aliases.encode('.text.foo') == '.text.foo'
+    assert aliases.match('COMMON') == ('COMMON', '.bss')
+    assert aliases.match('.fini') == (None, None)
@@ -1,7 +1,15 @@
+import os
+import threading
 
+import pytest
 
 from fpvgcc.fpv import GCCMemoryMapParserSM
+from fpvgcc.fpv import process_map_file
 from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.incremental import process_map_file_incremental
+from fpvgcc.parallel import process_map_file_parallel
+from .test_parallel import _describe
+from .test_parallel import _fname
 from .vectors import example_map
 
 
@@ -9,3 +17,37 @@ def test_process_map(example_map):
     mm, vectors = example_map
     assert isinstance(mm, GCCMemoryMapParserSM)
     assert isinstance(mm.memory_map, GCCMemoryMap)
+
+
+def _pipe(fname):
+    # The read end of a pipe through which the content of the file is
+    # written, as with a map file piped to /dev/stdin.
+    rfd, wfd = os.pipe()
+
+    def write():
+        with open(fname, 'rb') as src, os.fdopen(wfd, 'wb') as dst:
+            dst.write(src.read())
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    return rfd, writer
+
+
+@pytest.mark.parametrize('loader', ['serial', 'parallel', 'incremental'])
+def test_process_map_pipe(example_map, request, tmpdir, loader):
+    sm, vectors = example_map
+    rfd, writer = _pipe(_fname(request))
+    path = '/dev/fd/{0}'.format(rfd)
+    try:
+        if loader == 'serial':
+            psm = process_map_file(path, 'auto')
+        elif loader == 'parallel':
+            psm = process_map_file_parallel(path, 'auto', jobs=2)
+        else:
+            psm = process_map_file_incremental(path, 'auto',
+                                               cachedir=str(tmpdir))
+    finally:
+        # Closing the pipe first lets the writer finish if the parse fails.
+        os.close(rfd)
+        writer.join()
+    assert _describe(psm) == _describe(sm)
@@ -0,0 +1,108 @@
+import pytest
+
+from fpvgcc.diff import map_totals
+from fpvgcc.fpv import process_map_file
+from .vectors import example_map
+
+
+def test_query_regions(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    rows = {row.region: row.size for row in mm.query(group_by=['region'])}
+    for region, size in map_totals(mm, nodes=False)['regions'].items():
+        if region != 'VEC':
+            assert rows.get(region, 0) == size
+
+
+def test_query_where(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    totals = mm.footprints.region_totals('objfile')
+    for (objfile, region), size in totals.items():
+        if objfile is None or not size:
+            continue
+        q = mm.query(where={'objfile': objfile, 'region': region})
+        assert q.total == size
+        q = mm.query(group_by=['region'], where={'objfile': [objfile]})
+        assert dict((row.region, row.size) for row in q)[region] == size
+        q = mm.query(group_by=['objfile'],
+                     where={'objfile': lambda x: x == objfile})
+        assert [row.objfile for row in q] == [objfile]
+        break
+
+
+def test_query_order():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    rows = mm.query(group_by=['objfile', 'region']).rows
+    assert [row.size for row in rows] == \
+        sorted((row.size for row in rows), reverse=True)
+    assert mm.query(group_by=['objfile', 'region'], limit=5).rows == \
+        rows[:5]
+    smallest = mm.query(group_by=['objfile', 'region'], order_by='-size',
+                        limit=3).rows
+    assert [row.size for row in smallest] == \
+        sorted(row.size for row in rows)[:3]
+    names = [row.name for row in mm.query(group_by=['name'],
+                                          where={'region': 'RAM'},
+                                          order_by='name')]
+    assert names == sorted(names, key=lambda x: (x is not None, x))
+    sections = mm.query(group_by=['section'], where={'region': 'RAM'})
+    assert sorted(row.section for row in sections) == ['.bss', '.data']
+
+
+def test_query_memoized():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    rows = mm.query(group_by=['arfile']).rows
+    assert mm.query(group_by=['arfile']).rows is rows
+    mm.invalidate()
+    assert mm.query(group_by=['arfile']).rows is not rows
+    assert mm.query(group_by=['arfile']).rows == rows
+
+
+def test_query_mutation():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    q = mm.query(group_by=['objfile'], where={'region': 'RAM'})
+    sizes = dict(q)
+    node = [n for n in mm.objfile_nodes('usbcdc.c.obj')
+            if n.leafsize and n.region == 'RAM'][0]
+    node.osize = hex(node.osize + 1000)
+    sizes['usbcdc.c.obj'] += 1000
+    assert dict(mm.query(group_by=['objfile'],
+                         where={'region': 'RAM'})) == sizes
+    node.objfile = 'zzz.obj'
+    sizes['zzz.obj'] = node.leafsize
+    sizes['usbcdc.c.obj'] -= node.leafsize
+    if not sizes['usbcdc.c.obj']:
+        del sizes['usbcdc.c.obj']
+    assert dict(q) == sizes
+
+
+def test_query_callable_not_kept():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    for _ in range(3):
+        q = mm.query(group_by=['objfile'],
+                     where={'region': lambda r: r == 'RAM'})
+        rows = q.rows
+        assert q.rows is rows
+    assert not [key for key in mm.query_cache if key != 'sections']
+    assert rows == mm.query(group_by=['objfile'],
+                            where={'region': 'RAM'}).rows
+    node = [n for n in mm.objfile_nodes(rows[0].objfile)
+            if n.leafsize and n.region == 'RAM'][0]
+    node.osize = hex(node.osize + 1000)
+    assert q.rows[0].size == rows[0].size + 1000
+
+
+def test_query_errors():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map',
+                          'auto').memory_map
+    with pytest.raises(ValueError):
+        mm.query(group_by=['symbol'])
+    with pytest.raises(ValueError):
+        mm.query(where={'size': 10})
+    with pytest.raises(ValueError):
+        mm.query(group_by=['region'], order_by='objfile')
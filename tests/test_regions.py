@@ -0,0 +1,59 @@
+
+
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.gccMemoryMap import MemoryRegion
+from fpvgcc.gccMemoryMap import RegionResolver
+from fpvgcc.profiles import get_profile
+from .vectors import example_map
+
+
+def _naive_region(node, mm):
+    ctx = mm.ctx
+    if node is not mm.root and _naive_region(node.parent, mm) == 'DISCARDED':
+        return 'DISCARDED'
+    if node.name in ctx.suppressed_names:
+        return 'DISCARDED'
+    if node._address is None:
+        return 'UNDEF'
+    if node._address == 0:
+        return 'DISCARDED'
+    for region in mm.memory_regions:
+        if node._address in region:
+            if region.name in ctx.suppressed_regions:
+                return 'DISCARDED'
+            return region.name
+    raise ValueError(node._address)
+
+
+def test_assigned_regions(example_map):
+    sm, vectors = example_map
+    mm = sm.memory_map
+    for node in mm.root.all_nodes():
+        assert node.region == _naive_region(node, mm)
+
+
+def test_region_resolver_overlap():
+    ctx = get_profile('default')
+    regions = [MemoryRegion('RAM', '0x1000', '0x100', 'xw'),
+               MemoryRegion('ALIAS', '0x1080', '0x100', 'xw'),
+               MemoryRegion('*default*', '0x0', '0xffffffff', '')]
+    resolver = RegionResolver(regions, ctx)
+    assert resolver.region_at(0x1000) == 'RAM'
+    assert resolver.region_at(0x1080) == 'RAM'
+    assert resolver.region_at(0x1100) == 'ALIAS'
+    assert resolver.region_at(0x2000) == 'DISCARDED'
+
+
+def test_region_invalidation():
+    mm = GCCMemoryMap(get_profile('default'))
+    mm.add_memory_region(MemoryRegion('FLASH', '0x0', '0x1000', 'xr'))
+    mm.add_memory_region(MemoryRegion('RAM', '0x2000', '0x1000', 'xw'))
+    node = mm.get_node('.data.foo', create=True)
+    node.address = '0x100'
+    mm.assign_regions()
+    assert node.region == 'FLASH'
+    node.address = '0x2100'
+    assert node.region == 'RAM'
+    node.parent.address = '0x0'
+    assert node.parent.region == 'DISCARDED'
+    assert node.region == 'DISCARDED'
@@ -0,0 +1,84 @@
+from fpvgcc import fpv
+from fpvgcc.fpv import process_map_file
+from fpvgcc.fpv import GCCMemoryMapParser
+from fpvgcc.stats import ParseStats
+from fpvgcc.gccMemoryMap import GCCMemoryMapNode
+from .vectors import example_map
+
+
+def test_stats(example_map, request):
+    sm, vectors = example_map
+    fname = request.node.callspec.params['example_map']
+    regexes = dict(fpv.re_linkermap)
+    newnode = fpv.linkermap_get_newnode
+    push_to_leaf = GCCMemoryMapNode.push_to_leaf
+    stats = ParseStats()
+    ism = process_map_file(fname, 'auto', stats=stats)
+    # The parser is left as it was.
+    assert fpv.re_linkermap == regexes
+    assert fpv.linkermap_get_newnode is newnode
+    assert GCCMemoryMapNode.push_to_leaf is push_to_leaf
+    assert stats.active is False
+
+    assert list(stats.phases) == ['read', 'close']
+    assert stats.nodes == len(ism.memory_map.index.all_nodes)
+    assert stats.regions['IN_LINKER_SCRIPT_AND_MEMMAP'].count > 0
+    for regex in stats.regexes.values():
+        assert 0 <= regex.hits <= regex.attempts
+    symbols = stats.regexes['re_linkermap.SYMBOL']
+    assert symbols.hits > 0
+    assert stats.calls['linkermap_get_newnode'].count >= symbols.hits
+    assert stats.as_dict()['nodes'] == stats.nodes
+    assert 'linkermap_get_newnode' in stats.report()
+
+    # The same memory map is produced with or without statistics.
+    assert [(n.gident, n.size) for n in ism.memory_map.index.all_nodes] == \
+        [(n.gident, n.size) for n in sm.memory_map.index.all_nodes]
+
+
+def test_stats_stream():
+    fname = 'tests/maps/example.msp430-elf.0.map'
+    stats = ParseStats(trace_memory=True)
+    parser = GCCMemoryMapParser('auto', stats=stats)
+    with open(fname) as f:
+        parser.feed(f)
+    sm = parser.close()
+    lines = sum(region.count for region in stats.regions.values())
+    with open(fname) as f:
+        assert lines == sum(1 for _ in f)
+    assert stats.peak_traced > 0
+    assert stats.nodes == len(sm.memory_map.index.all_nodes)
+
+
+def test_stats_interleaved():
+    # Only the parse given the statistics is counted, even with another
+    # parse running alongside it.
+    fname = 'tests/maps/example.msp430-elf.0.map'
+    with open(fname) as f:
+        lines = f.readlines()
+    alone = ParseStats()
+    parser = GCCMemoryMapParser('auto', stats=alone)
+    parser.feed(lines)
+    parser.close()
+
+    stats = ParseStats()
+    parser = GCCMemoryMapParser('auto', stats=stats)
+    other = GCCMemoryMapParser('auto')
+
+    def interleaved():
+        # The other parse runs while this one is reading.
+        for line in lines:
+            other.feed((line,))
+            yield line
+    parser.feed(interleaved())
+    parser.close()
+    other.close()
+
+    def counts(stats):
+        return ([(name, regex.attempts, regex.hits)
+                 for name, regex in stats.regexes.items()],
+                [(name, region.count)
+                 for name, region in stats.regions.items()],
+                [(name, call.count) for name, call in stats.calls.items()])
+    assert counts(stats) == counts(alone)
+    assert stats.nodes == alone.nodes
@@ -0,0 +1,105 @@
+
+
+import io
+
+import pytest
+
+from fpvgcc.fpv import GCCMemoryMapParser
+from fpvgcc.fpv import iter_map_sections
+from fpvgcc.profiles.guess import guess_profile_from_buffer
+from .vectors import example_map
+
+
+def _describe(sm):
+    mm = sm.memory_map
+    return (
+        [repr(node) for node in mm.root.all_nodes()],
+        [repr(region) for region in mm.memory_regions],
+        mm.used_regions,
+        sm.loaded_files,
+    )
+
+
+def _fname(request):
+    return request.node.callspec.params['example_map']
+
+
+def _chunks(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_stream_lines(example_map, request):
+    sm, vectors = example_map
+    parser = GCCMemoryMapParser('auto')
+    with open(_fname(request)) as f:
+        parser.feed(f)
+    assert _describe(parser.close()) == _describe(sm)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_stream_chunks(example_map, request, binary):
+    sm, vectors = example_map
+    with open(_fname(request), 'rb' if binary else 'r') as f:
+        data = f.read()
+    parser = GCCMemoryMapParser('auto')
+    for chunk in _chunks(data, 997):
+        parser.feed(chunk)
+    assert _describe(parser.close()) == _describe(sm)
+
+
+def test_stream_sections(example_map, request):
+    sm, vectors = example_map
+    with open(_fname(request)) as f:
+        sections = list(iter_map_sections(f, profile=sm.ctx))
+    assert [s.gident for s in sections] == \
+        [s.gident for s in sm.memory_map.top_level_nodes]
+
+
+def test_stream_sections_detached(example_map, request):
+    sm, vectors = example_map
+    parser = GCCMemoryMapParser(sm.ctx, keep=False)
+    with open(_fname(request)) as f:
+        sections = list(parser.iter_sections(f))
+    assert len(sections)
+    for section in sections:
+        assert section.parent is None or \
+            section not in section.parent.children
+    assert parser.sm.memory_map.top_level_nodes == []
+
+
+def test_stream_closed():
+    parser = GCCMemoryMapParser()
+    parser.feed(io.StringIO(''))
+    parser.close()
+    with pytest.raises(ValueError):
+        parser.feed('')
+
+
+def test_stream_sections_unreferenced(example_map, request):
+    # Detached sections which are dropped by the caller must not be
+    # mistaken for sections which were already completed.
+    sm, vectors = example_map
+    gidents = set()
+    with open(_fname(request)) as f:
+        for section in iter_map_sections(f, profile=sm.ctx, keep=False):
+            gidents.add(section.gident)
+    assert gidents == set(sm.memory_map.top_level_gidents)
+
+
+def test_feed_mapping(example_map, request):
+    sm, vectors = example_map
+    with open(_fname(request), 'rb') as f:
+        data = f.read()
+    parser = GCCMemoryMapParser(sm.ctx)
+    parser.feed_mapping(data)
+    assert _describe(parser.close()) == _describe(sm)
+
+
+def test_guess_profile_from_buffer(request):
+    with open('tests/maps/example.msp430-elf.0.map', 'rb') as f:
+        data = f.read()
+    assert guess_profile_from_buffer(data) == 'elf32-msp430'
+    assert guess_profile_from_buffer(b'OUTPUT(a.elf elf32-msp430)') == \
+        'elf32-msp430'
+    assert guess_profile_from_buffer(b'Memory Configuration\n') is None
@@ -0,0 +1,80 @@
+
+
+import os
+import threading
+
+import pytest
+
+from fpvgcc.batch import MapSummary
+from fpvgcc.cli import print_summary_deltas
+from fpvgcc.watch import InotifyWatcher
+from fpvgcc.watch import PollingWatcher
+from fpvgcc.watch import watch_files
+
+
+def _touch(path, content, delay=0.0):
+    def write():
+        with open(path, 'w') as f:
+            f.write(content)
+        st = os.stat(path)
+        # Make sure the change is visible even with coarse timestamps.
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    if not delay:
+        write()
+        return None
+    timer = threading.Timer(delay, write)
+    timer.start()
+    return timer
+
+
+def test_polling_watcher(tmpdir):
+    path = str(tmpdir.join('a.map'))
+    _touch(path, 'one')
+    watcher = PollingWatcher([path], interval=0.01)
+    assert watcher.wait(0.05) == []
+    _touch(path, 'two')
+    assert watcher.wait(0.05) == [path]
+
+
+def test_inotify_watcher(tmpdir):
+    path = str(tmpdir.join('a.map'))
+    _touch(path, 'one')
+    try:
+        watcher = InotifyWatcher([path])
+    except (OSError, AttributeError, TypeError):
+        pytest.skip("inotify is not available")
+    try:
+        assert watcher.wait(0.05) == []
+        # Files replaced by a rename are followed as well.
+        _touch(path + '.tmp', 'two')
+        os.replace(path + '.tmp', path)
+        assert watcher.wait(1) == [path]
+    finally:
+        watcher.close()
+
+
+def test_watch_files(tmpdir):
+    path = str(tmpdir.join('a.map'))
+    other = str(tmpdir.join('b.map'))
+    _touch(path, 'one')
+    _touch(other, 'one')
+    watcher = PollingWatcher([path, other], interval=0.01)
+    changes = watch_files([path, other], settle=0.05, watcher=watcher)
+    timer = _touch(path, 'two', delay=0.05)
+    try:
+        assert next(changes) == [path]
+    finally:
+        timer.join()
+        changes.close()
+
+
+def test_print_summary_deltas(capsys):
+    before = MapSummary('a.map', regions=['RAM', 'ROM'],
+                        region_totals=[100, 200])
+    after = MapSummary('a.map', regions=['RAM', 'ROM'],
+                       region_totals=[108, 200])
+    print_summary_deltas({'a.map': before}, {'a.map': after})
+    out = capsys.readouterr().out
+    assert '+8' in out and 'ROM' not in out
+    print_summary_deltas({'a.map': after}, {'a.map': after})
+    assert capsys.readouterr().out.strip() == 'No change in footprint'